@@ -1,6 +1,7 @@
 import numpy as np
 import imageio
 import scipy.misc
+import scipy.ndimage
 
 class Map():
     def __init__(self, x_width, y_width, grid_cell_size, map_filename=None):
@@ -22,6 +23,9 @@ class Map():
 
         self.origin_coords = np.array([(self.x_width/2.)/self.grid_cell_size, (self.y_width/2.)/self.grid_cell_size])
         self.map = None # This will store the current static+dynamic map at each timestep
+        self.dirty_rects = [] # [i_low, i_high, j_low, j_high] of each agent stamped into self.map (restored from static_map next update)
+        self.agent_stencils = {} # radius -> (half_width, disc mask) so each agent only touches its own bounding box
+        self.distance_transform = None # dist (in cells) from each cell to the nearest occupied cell of self.map (computed lazily)
 
     def world_coordinates_to_map_indices(self, pos):
         # for a single [px, py] -> [gx, gy]
@@ -44,15 +48,76 @@ class Map():
         return gxs, gys, in_map
 
     def add_agents_to_map(self, agents):
-        self.map = self.static_map.copy()
+        """ Update self.map to static_map + the current disc of each agent (whose center is inside the map).
+
+        Instead of recopying static_map each time, only the bounding boxes of last call's agents are restored,
+        then each agent's cached disc stencil is stamped into its own bounding box.
+        Set :code:`self.map = None` after editing static_map to force a full refresh.
+
+        """
+        if self.map is None or self.map.shape != self.static_map.shape:
+            self.map = self.static_map.copy()
+        else:
+            for i_low, i_high, j_low, j_high in self.dirty_rects:
+                self.map[i_low:i_high, j_low:j_high] = self.static_map[i_low:i_high, j_low:j_high]
+        self.dirty_rects = []
+        self.distance_transform = None
         for agent in agents:
-            mask = self.get_agent_mask(agent.pos_global_frame, agent.radius)
-            self.map[mask] = 255
+            [gx, gy], in_map = self.world_coordinates_to_map_indices(agent.pos_global_frame)
+            if in_map:
+                self.dirty_rects.append(self.stamp_agent(self.map, [gx, gy], agent.radius))
+
+    def get_distance_transform(self):
+        """ Euclidean distance (in cells, center-to-center) from each cell of self.map to the nearest occupied cell.
+
+        Computed once per :meth:`add_agents_to_map` call, and used to skip free space when ray-casting.
+
+        Returns:
+            distance_transform (np array): same shape as self.map, 0 at occupied cells (np.inf everywhere if nothing is occupied)
+
+        """
+        if self.distance_transform is None:
+            if np.any(self.map):
+                self.distance_transform = scipy.ndimage.distance_transform_edt(np.invert(self.map))
+            else:
+                self.distance_transform = np.full(self.map.shape, np.inf)
+        return self.distance_transform
+
+    def get_agent_stencil(self, radius):
+        """ Disc of map cells covered by an agent of this radius, relative to the cell containing its center (cached per radius).
+
+        Returns:
+            - half_width (int): the stencil covers cells [-half_width, half_width] around the center cell
+            - stencil (np array): (2*half_width+1, 2*half_width+1) bool disc
+
+        """
+        if radius not in self.agent_stencils:
+            radius_in_cells = radius/self.grid_cell_size
+            half_width = int(np.ceil(radius_in_cells))
+            offsets = np.arange(-half_width, half_width+1)
+            stencil = offsets[np.newaxis,:]**2 + offsets[:,np.newaxis]**2 < radius_in_cells**2
+            self.agent_stencils[radius] = (half_width, stencil)
+        return self.agent_stencils[radius]
+
+    def stamp_agent(self, grid, pos, radius):
+        """ Set the cells of grid covered by an agent centered at map indices pos to True (only touches the agent's bounding box).
+
+        Returns:
+            rect (list): [i_low, i_high, j_low, j_high] slice bounds (clipped to the grid) that were touched
+
+        """
+        half_width, stencil = self.get_agent_stencil(radius)
+        gx, gy = pos
+        i_low, i_high = max(gx-half_width, 0), min(gx+half_width+1, grid.shape[0])
+        j_low, j_high = max(gy-half_width, 0), min(gy+half_width+1, grid.shape[1])
+        if i_low < i_high and j_low < j_high:
+            grid[i_low:i_high, j_low:j_high] |= stencil[i_low-(gx-half_width):i_high-(gx-half_width),
+                                                        j_low-(gy-half_width):j_high-(gy-half_width)]
+        return [i_low, i_high, j_low, j_high]
 
     def get_agent_map_indices(self, pos, radius):
-        x = np.arange(0, self.map.shape[1])
-        y = np.arange(0, self.map.shape[0])
-        mask = (x[np.newaxis,:]-pos[1])**2 + (y[:,np.newaxis]-pos[0])**2 < (radius/self.grid_cell_size)**2
+        mask = np.zeros(self.static_map.shape, dtype=bool)
+        self.stamp_agent(mask, pos, radius)
         return mask
 
     def get_agent_mask(self, global_pos, radius):
@@ -62,4 +127,3 @@ class Map():
             return mask
         else:
             return np.zeros_like(self.map)
-
@@ -1,6 +1,7 @@
 import numpy as np
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import wrap, find_nearest
+from gym_collision_avoidance.envs.agent_array import AgentArrayField, AGENT_ARRAY_FIELDS
 from gym_collision_avoidance.envs.policies.LearningCADRL.sim_utils.state import ObservableState, FullState
 import operator
 import math
@@ -26,10 +27,28 @@ class Agent(object):
     :param near_goal_threshold: (float) once within this distance to goal, say that agent has reached goal
     :param dt_nominal: (float) time in seconds of each simulation step
 
+    :param agent_array: (:class:`~gym_collision_avoidance.envs.agent_array.AgentArray`) if not None, the agent's core states
+        (:code:`AGENT_ARRAY_FIELDS`) live in row :code:`agent_array_index` of this store instead of on the agent itself
+
     """
+    # Core states are descriptors, so they can be backed by an AgentArray row (see agent_array.py)
+    pos_global_frame = AgentArrayField('pos_global_frame')
+    vel_global_frame = AgentArrayField('vel_global_frame')
+    goal_global_frame = AgentArrayField('goal_global_frame')
+    heading_global_frame = AgentArrayField('heading_global_frame')
+    delta_heading_global_frame = AgentArrayField('delta_heading_global_frame')
+    speed_global_frame = AgentArrayField('speed_global_frame')
+    turning_dir = AgentArrayField('turning_dir')
+    radius = AgentArrayField('radius')
+    pref_speed = AgentArrayField('pref_speed')
+
     def __init__(self, start_x, start_y, goal_x, goal_y, radius,
                  pref_speed, initial_heading, policy, dynamics_model, sensors, id ):
+        self.agent_array = None
+        self.agent_array_index = None
+
         self.policy = policy()
+        self.policy.get_calling_convention() # resolve once per policy class, so the env step doesn't need to introspect
         self.dynamics_model = dynamics_model(self)
         self.sensors = [sensor() for sensor in sensors]
 
@@ -140,11 +159,11 @@ class Agent(object):
         self.in_collision = False
         self.ran_out_of_time = False
 
-        #This variable governs the history length of this agent
-        self.history_len_multiplier = 3000 #1.2 
-        self.num_states_in_history = int(self.history_len_multiplier*self.time_remaining_to_reach_goal / self.dt_nominal)
-        self.global_state_history = np.empty((self.num_states_in_history, self.global_state_dim))
-        self.ego_state_history = np.empty((self.num_states_in_history, self.ego_state_dim))
+        # History rows are indexed by step_num (rows before start_step_num stay zero), and start out long enough
+        # for the agent to time out. Agents keep recording after they're done, so the arrays double in size when full.
+        self.num_states_in_history = self.start_step_num + int(self.time_remaining_to_reach_goal / self.dt_nominal) + 1
+        self.global_state_history = np.zeros((self.num_states_in_history, self.global_state_dim))
+        self.ego_state_history = np.zeros((self.num_states_in_history, self.ego_state_dim))
 
         # self.past_actions = np.zeros((self.num_actions_to_store,2))
         self.past_global_velocities = np.zeros((self.num_actions_to_store,2))
@@ -179,6 +198,12 @@ class Agent(object):
         for k, v in self.__dict__.items():
             if k != 'policy':
                 setattr(obj, k, v)
+        # Don't let the copy keep viewing the env's AgentArray (it would keep changing)
+        if self.agent_array is not None:
+            obj.agent_array = None
+            obj.agent_array_index = None
+            for name in AGENT_ARRAY_FIELDS:
+                setattr(obj, name, np.copy(getattr(self, name)))
         return obj
 
     def _check_if_at_goal(self):
@@ -282,29 +307,60 @@ class Agent(object):
 
         """
         # Agent is done if any of these conditions hold (at goal, out of time, out of bbox). Stop moving if so & ignore the action.
-        if self.is_at_goal or self.ran_out_of_time or self.is_out_of_bounds:
-            if self.is_at_goal:
-                self.was_at_goal_already = True
+        if self.is_stopped():
+            self.hold_position(dt)
+            return
 
-            #self.vel_global_frame = np.array([0.0, 0.0])
-            #self._store_past_velocities()
+        action = self.start_action(action)
 
+        # In the case of ExternalDynamics, this call does nothing,
+        # but set_state should have been called instead
+        self.dynamics_model.step(action, dt)
 
-            self.vel_global_frame = np.array([0.0, 0.0])
+        self.finish_action(dt)
 
+        self._check_if_at_goal()
+        self._check_if_out_of_bounds()
 
-            self.dynamics_model.update_ego_frame()
-            
-            #Added for output complete dataset
-            #Keep outputing position in history, otherwise in the dataset, once any conditions above were reached, this agent will just disappear in the output dataset
-            self._update_state_history()
-            
-            self._store_past_velocities()
+        return
 
-            self.t += dt
-            self.step_num += 1
-            return
+    def is_stopped(self):
+        """ Whether the agent is done moving (at goal, out of time, out of bbox), so its actions are ignored. """
+        return self.is_at_goal or self.ran_out_of_time or self.is_out_of_bounds
+
+    def hold_position(self, dt):
+        """ Stay put for dt seconds (agent is done), but keep recording its state in the history. """
+        if self.is_at_goal:
+            self.was_at_goal_already = True
+
+        #self.vel_global_frame = np.array([0.0, 0.0])
+        #self._store_past_velocities()
+
+
+        self.vel_global_frame = np.array([0.0, 0.0])
+
+
+        self.dynamics_model.update_ego_frame()
+        
+        #Added for output complete dataset
+        #Keep outputing position in history, otherwise in the dataset, once any conditions above were reached, this agent will just disappear in the output dataset
+        self._update_state_history()
+        
+        self._store_past_velocities()
 
+        self.t += dt
+        self.step_num += 1
+
+    def start_action(self, action):
+        """ Bookkeeping before the dynamics update: collision cooldown (may override the action), past actions, ego frame TF.
+
+        Args:
+            action (list): [speed, delta heading angle] command for this agent
+
+        Returns:
+            action (list): the command that should actually be passed to the dynamics model
+
+        """
         # if collided and cooldown is over, can count as new collision
         if self.in_collision and (self.time_since_collision >= self.collision_cooldown):
             self.was_in_collision_already = True
@@ -339,17 +395,21 @@ class Agent(object):
         self.T_global_ego = np.array([[np.cos(theta), -np.sin(theta), self.pos_global_frame[0]], [np.sin(theta), np.cos(theta), self.pos_global_frame[1]], [0,0,1]])
         self.ego_to_global_theta = theta
 
-        # In the case of ExternalDynamics, this call does nothing,
-        # but set_state should have been called instead
-        self.dynamics_model.step(action, dt)
+        return action
 
+    def finish_action(self, dt):
+        """ Bookkeeping after the dynamics update: ego frame, state history, past velocities and timers.
+
+        The at-goal/out-of-bounds checks aren't done here, so the env can batch them (see :meth:`take_action`).
+
+        Args:
+            dt (float): time in seconds the action was executed for
+
+        """
         self.dynamics_model.update_ego_frame()
 
         self._update_state_history()
 
-        self._check_if_at_goal()
-        self._check_if_out_of_bounds()
-
         self._store_past_velocities()
         
         # Update time left so agent does not run around forever
@@ -360,26 +420,53 @@ class Agent(object):
         if self.time_remaining_to_reach_goal <= 0.0:
             self.ran_out_of_time = True
 
-        return
-
-    def sense(self, agents, agent_index, top_down_map):
+    def sense(self, agents, agent_index, top_down_map, precomputed_sensor_data=None):
         """ Call the sense method of each Sensor in self.sensors, store in self.sensor_data dict keyed by sensor.name.
 
         Args:
             agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment
             agent_index (int): index of this agent (the one with this sensor) in :code:`agents`
             top_down_map (2D np array): binary image with 0 if that pixel is free space, 1 if occupied
+            precomputed_sensor_data (dict): {sensor.name: measurement} for sensors the env already computed in a batch (these are not re-sensed)
 
         """
         self.sensor_data = {}
         for sensor in self.sensors:
-            sensor_data = sensor.sense(agents, agent_index, top_down_map)
+            if precomputed_sensor_data is not None and sensor.name in precomputed_sensor_data:
+                sensor_data = precomputed_sensor_data[sensor.name]
+            else:
+                sensor_data = sensor.sense(agents, agent_index, top_down_map)
             self.sensor_data[sensor.name] = sensor_data
 
     def _update_state_history(self):
-        global_state, ego_state = self.to_vector()
-        self.global_state_history[self.step_num, :] = global_state
-        self.ego_state_history[self.step_num, :] = ego_state
+        """ Write the current state into row step_num of the history arrays (same layout as :meth:`to_vector`, but in place). """
+        if self.step_num >= self.num_states_in_history:
+            self._grow_state_history(self.step_num+1)
+
+        global_state = self.global_state_history[self.step_num]
+        global_state[0] = self.t
+        global_state[1:3] = self.pos_global_frame
+        global_state[3:5] = self.goal_global_frame
+        global_state[5] = self.radius
+        global_state[6] = self.pref_speed
+        global_state[7:9] = self.vel_global_frame
+        global_state[9] = self.speed_global_frame
+        global_state[10] = self.heading_global_frame
+
+        ego_state = self.ego_state_history[self.step_num]
+        ego_state[0] = self.t
+        ego_state[1] = self.dist_to_goal
+        ego_state[2] = self.heading_ego_frame
+
+    def _grow_state_history(self, min_num_states):
+        """ Double the length of the history arrays (at least to min_num_states rows), keeping what's been recorded """
+        num_states = max(2*self.num_states_in_history, min_num_states)
+        for name in ['global_state_history', 'ego_state_history']:
+            old = getattr(self, name)
+            new = np.zeros((num_states, old.shape[1]))
+            new[:self.num_states_in_history] = old[:self.num_states_in_history]
+            setattr(self, name, new)
+        self.num_states_in_history = num_states
 
     def print_agent_info(self):
         """ Print out a summary of the agent's current state. """
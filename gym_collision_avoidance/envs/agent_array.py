@@ -0,0 +1,126 @@
+import numpy as np
+
+# Agent attributes that can live in an AgentArray, with the number of columns each one uses (0 means scalar)
+AGENT_ARRAY_FIELDS = {
+    'pos_global_frame': 2,
+    'vel_global_frame': 2,
+    'goal_global_frame': 2,
+    'heading_global_frame': 0,
+    'delta_heading_global_frame': 0,
+    'speed_global_frame': 0,
+    'turning_dir': 0,
+    'radius': 0,
+    'pref_speed': 0,
+}
+
+class AgentArrayField(object):
+    """ Descriptor for an :class:`~gym_collision_avoidance.envs.agent.Agent` attribute that may be stored in an :class:`AgentArray`.
+
+    If the agent is attached to an AgentArray, reads return that agent's row (a view for vector fields),
+    and writes copy the value into the row. Otherwise, the value is kept on the agent itself, as a normal attribute.
+
+    :param name: (str) name of the Agent attribute (and of the AgentArray column)
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.private_name = '_' + name
+
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        agent_array = agent.__dict__.get('agent_array')
+        if agent_array is None:
+            try:
+                return agent.__dict__[self.private_name]
+            except KeyError:
+                raise AttributeError(self.name)
+        return getattr(agent_array, self.name)[agent.__dict__['agent_array_index']]
+
+    def __set__(self, agent, value):
+        agent_array = agent.__dict__.get('agent_array')
+        if agent_array is None:
+            agent.__dict__[self.private_name] = value
+        else:
+            getattr(agent_array, self.name)[agent.__dict__['agent_array_index']] = value
+
+class AgentArray(object):
+    """ Structure-of-arrays store for the states of every :class:`~gym_collision_avoidance.envs.agent.Agent` in an env.
+
+    Each field in :code:`AGENT_ARRAY_FIELDS` is one contiguous float64 array (one row per agent), so that the env can
+    compute things like goal/bounds checks and dynamics updates for all agents with a few numpy ops.
+    Each agent becomes a thin view into its row (see :class:`AgentArrayField`), so the rest of the code can keep using
+    :code:`agent.pos_global_frame` etc.
+
+    Rows are never removed (agents that are done keep their row), and the arrays double in size when full.
+    Don't keep references to a row across :meth:`add` calls, since growing reallocates the arrays.
+
+    :param agents: (list) of :class:`~gym_collision_avoidance.envs.agent.Agent` to attach, in order (row i <-> agents[i])
+
+    """
+    def __init__(self, agents=()):
+        self.num_agents = 0
+        self.capacity = max(len(agents), 1)
+        for name, size in AGENT_ARRAY_FIELDS.items():
+            shape = (self.capacity, size) if size > 0 else (self.capacity,)
+            setattr(self, name, np.zeros(shape, dtype=np.float64))
+        for agent in agents:
+            self.add(agent)
+
+    def add(self, agent):
+        """ Copy the agent's current state into a new row and make the agent a view of that row.
+
+        Args:
+            agent (:class:`~gym_collision_avoidance.envs.agent.Agent`): agent to attach (may already be attached to another AgentArray)
+
+        Returns:
+            row (int): index of the agent's row
+
+        """
+        if self.num_agents == self.capacity:
+            self._grow()
+        row = self.num_agents
+        for name in AGENT_ARRAY_FIELDS:
+            getattr(self, name)[row] = getattr(agent, name)
+        agent.agent_array = self
+        agent.agent_array_index = row
+        self.num_agents += 1
+        return row
+
+    def _grow(self):
+        """ Double the capacity of every field (amortized O(1) add) """
+        self.capacity *= 2
+        for name in AGENT_ARRAY_FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.num_agents] = old[:self.num_agents]
+            setattr(self, name, new)
+
+    def check_if_at_goal(self, rows, near_goal_threshold):
+        """ Vectorized :meth:`~gym_collision_avoidance.envs.agent.Agent._check_if_at_goal`
+
+        Args:
+            rows (np array): int indices of the agents to check
+            near_goal_threshold (float or np array): distance (per agent, if array) under which an agent is at its goal
+
+        Returns:
+            is_at_goal (np array): bool, one per row
+
+        """
+        diff = self.pos_global_frame[rows] - self.goal_global_frame[rows]
+        return diff[:, 0]**2 + diff[:, 1]**2 <= np.asarray(near_goal_threshold)**2
+
+    def check_if_out_of_bounds(self, rows, bbox):
+        """ Vectorized :meth:`~gym_collision_avoidance.envs.agent.Agent._check_if_out_of_bounds`
+
+        Args:
+            rows (np array): int indices of the agents to check
+            bbox (list): [[x_min, x_max], [y_min, y_max]]
+
+        Returns:
+            is_out_of_bounds (np array): bool, one per row
+
+        """
+        pos = self.pos_global_frame[rows]
+        (x_min, x_max), (y_min, y_max) = bbox
+        return (pos[:, 0] < x_min) | (pos[:, 0] > x_max) | (pos[:, 1] < y_min) | (pos[:, 1] > y_max)
@@ -0,0 +1,81 @@
+import itertools
+import numpy as np
+
+##################
+# Broadphase: find the pairs of agents that are close enough to possibly collide,
+# so the env doesn't have to test all N*(N-1)/2 pairs every step
+################
+
+def brute_force_pairs(positions, cutoff):
+    # every pair (ignores cutoff), kept for checking the other methods
+    n = len(positions)
+    if n < 2:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    pairs = np.array(list(itertools.combinations(range(n), 2)))
+    return pairs[:, 0], pairs[:, 1]
+
+def grid_pairs(positions, cutoff):
+    # hash each position into a uniform grid with cell size = cutoff,
+    # then only compare agents in the same or neighboring cells
+    n = len(positions)
+    if n < 2:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    cells = np.floor(positions / max(cutoff, 1e-6)).astype(np.int64)
+    buckets = {}
+    for index, cell in enumerate(map(tuple, cells)):
+        buckets.setdefault(cell, []).append(index)
+
+    # half of the 3x3 neighborhood, so each pair of cells is only visited once
+    neighbor_offsets = [(1, -1), (1, 0), (1, 1), (0, 1)]
+    pairs_i, pairs_j = [], []
+    for (cx, cy), members in buckets.items():
+        for a, b in itertools.combinations(members, 2):
+            pairs_i.append(a)
+            pairs_j.append(b)
+        for dx, dy in neighbor_offsets:
+            others = buckets.get((cx+dx, cy+dy))
+            if others is None:
+                continue
+            for a in members:
+                for b in others:
+                    pairs_i.append(a)
+                    pairs_j.append(b)
+    pairs_i = np.array(pairs_i, dtype=int)
+    pairs_j = np.array(pairs_j, dtype=int)
+
+    # only keep pairs within cutoff, ordered so that i < j
+    diff = positions[pairs_i] - positions[pairs_j]
+    keep = diff[:, 0]**2 + diff[:, 1]**2 <= cutoff**2
+    pairs_i, pairs_j = pairs_i[keep], pairs_j[keep]
+    return np.minimum(pairs_i, pairs_j), np.maximum(pairs_i, pairs_j)
+
+def kdtree_pairs(positions, cutoff):
+    # scipy kd-tree, rebuilt from scratch on every call
+    from scipy.spatial import cKDTree
+    if len(positions) < 2:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    pairs = cKDTree(positions).query_pairs(cutoff, output_type='ndarray')
+    if len(pairs) == 0:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    return pairs[:, 0], pairs[:, 1]
+
+broadphase_dict = {
+    'brute_force': brute_force_pairs,
+    'grid': grid_pairs,
+    'kdtree': kdtree_pairs,
+}
+
+def find_candidate_pairs(positions, cutoff, method="grid"):
+    """ Find every pair of positions that are within cutoff of each other (brute_force returns all pairs).
+
+    Args:
+        positions (np array): (n,2) positions
+        cutoff (float): max distance between two positions for the pair to be returned
+        method (str): key of broadphase_dict ('brute_force', 'grid' or 'kdtree')
+
+    Returns:
+        - pairs_i (np array): int indices into positions
+        - pairs_j (np array): int indices into positions, with pairs_i < pairs_j elementwise
+
+    """
+    return broadphase_dict[method](np.asarray(positions, dtype=np.float64), cutoff)
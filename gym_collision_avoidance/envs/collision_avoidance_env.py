@@ -14,8 +14,10 @@ import inspect
 
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import find_nearest, rgba2rgb, l2norm
-from gym_collision_avoidance.envs.visualize import plot_episode, animate_episode
+from gym_collision_avoidance.envs.visualize import plot_episode, animate_episode, EpisodeAnimator
 from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.agent_array import AgentArray
+from gym_collision_avoidance.envs.broadphase import find_candidate_pairs
 from gym_collision_avoidance.envs.Map import Map
 from gym_collision_avoidance.envs import test_cases as tc
 
@@ -46,6 +48,8 @@ from gym_collision_avoidance.envs.policies.SLSTMPolicy import SLSTMPolicy
 from gym_collision_avoidance.envs.policies.SOCIALGANPolicy import SOCIALGANPolicy
 # from gym_collision_avoidance.envs.policies.GROUPNAVIGANPolicy import GROUPNAVIGANPolicy
 from gym_collision_avoidance.envs.policies.CVMPolicy import CVMPolicy
+from gym_collision_avoidance.envs.policies.ScenePredictionCache import scene_prediction_cache
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
 
 # Dynamics
 from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
@@ -59,7 +63,7 @@ from gym_collision_avoidance.envs.sensors.OtherAgentsStatesSensor import OtherAg
 
 
 #for generate new agents to replace old agents (dynamic number of agents)
-from master_scenario_generator import Scenario_Generator, Seeded_Scenario_Generator, Seeded_Population_Scenario_Generator, Single_Seeded_Population_Scenario_Generator, real_dataset_traj
+from gym_collision_avoidance.experiments.src.master_scenario_generator import Scenario_Generator, Seeded_Scenario_Generator, Seeded_Population_Scenario_Generator, Single_Seeded_Population_Scenario_Generator, real_dataset_traj
 policy_dict = {
     'RVO': RVOPolicy,
     'LINEAR': NonCooperativePolicy,
@@ -133,6 +137,10 @@ class CollisionAvoidanceEnv(gym.Env):
         self.set_testcase(Config.TEST_CASE_FN, Config.TEST_CASE_ARGS)
 
         self.animation_period_steps = Config.ANIMATION_PERIOD_STEPS
+        if Config.ANIMATE_EPISODES and Config.ANIMATION_RENDERER == "incremental":
+            self.episode_animator = EpisodeAnimator(circles_along_traj=Config.PLOT_CIRCLES_ALONG_TRAJ, limits=self.plt_limits, fig_size=self.plt_fig_size)
+        else:
+            self.episode_animator = None
 
         # if Config.TRAIN_ON_MULTIPLE_AGENTS:
         #     self.low_state = np.zeros((Config.FULL_LABELED_STATE_LENGTH))
@@ -184,6 +192,7 @@ class CollisionAvoidanceEnv(gym.Env):
 
         self.agents = None
         self.default_agents = None
+        self.agent_array = None
         self.prev_episode_agents = None
 
         self.static_map_filename = None
@@ -262,7 +271,19 @@ class CollisionAvoidanceEnv(gym.Env):
         # Take observation
         next_observations = self._get_obs()
 
-        if (Config.ANIMATE_EPISODES and self.episode_step_number % self.animation_period_steps == 0) or np.any([agent.in_collision for agent in self.active_agents]):
+        any_collision = np.any([agent.in_collision for agent in self.active_agents])
+        frame_streamed = False
+        if Config.ANIMATE_EPISODES and self.episode_animator is not None and self.perturbed_obs is None \
+                and (self.episode_step_number % self.animation_period_steps == 0 or any_collision):
+            # collision frames go into the streamed gif too
+            self.episode_animator.add_frame(self.agents, self.active_agent_mask, self.episode_step_number,
+                plot_save_dir=self.plot_save_dir,
+                plot_policy_name=self.plot_policy_name,
+                test_case_index=self.test_case_index)
+            frame_streamed = True
+
+        if (Config.ANIMATE_EPISODES and self.episode_step_number % self.animation_period_steps == 0 and not frame_streamed) or any_collision:
+            # (after a streamed frame, this only saves the collision snapshot under collisions/)
             plot_episode(self.agents, True, self.map, self.test_case_index,
                 circles_along_traj=Config.PLOT_CIRCLES_ALONG_TRAJ,
                 plot_save_dir=self.plot_save_dir,
@@ -276,7 +297,7 @@ class CollisionAvoidanceEnv(gym.Env):
                 active_agent_mask= self.active_agent_mask,
                 episode_step_num=self.episode_step_number)
 
-        elif Config.SHOW_EPISODE_PLOTS and self.episode_step_number % self.animation_period_steps == 0:
+        elif Config.SHOW_EPISODE_PLOTS and self.episode_step_number % self.animation_period_steps == 0 and not frame_streamed:
             plot_episode(self.agents, False, self.map, self.test_case_index,
                 circles_along_traj=Config.PLOT_CIRCLES_ALONG_TRAJ,
                 plot_save_dir=self.plot_save_dir,
@@ -293,20 +314,18 @@ class CollisionAvoidanceEnv(gym.Env):
         # Check which agents' games are finished (at goal/collided/out of time)
         which_agents_done, game_over = self._check_which_agents_done()
 
-        which_agents_done_dict = {}
-        which_agents_learning_dict = {}
-        for i, agent in enumerate(self.agents):
-            which_agents_done_dict[agent.id] = which_agents_done[i]
-            which_agents_learning_dict[agent.id] = agent.policy.is_still_learning
+        agent_ids = [agent.id for agent in self.agents]
+        which_agents_done_dict = dict(zip(agent_ids, which_agents_done))
+        which_agents_learning_dict = dict(zip(agent_ids, [agent.policy.is_still_learning for agent in self.agents]))
 
         
 
         # Update active agent mask, only keep agents that is still running, and mask out any (at goal/collided/out of time) agents
-        agents_still_running = [not done for done in which_agents_done]
+        agents_still_running = ~which_agents_done
 
         # agents_inside_field = self._check_which_agents_inside_field()
-        for i in range(len(self.agents)):
-            print("agent "+str(i)+" at goal?", self.agents[i].is_at_goal)
+        # for i in range(len(self.agents)):
+        #     print("agent "+str(i)+" at goal?", self.agents[i].is_at_goal)
         
         # self.active_agent_mask = self.active_agent_mask & agents_still_running
   
@@ -332,11 +351,9 @@ class CollisionAvoidanceEnv(gym.Env):
                     x_min,x_max = bbox[0]
                     y_min,y_max = bbox[1]
 
-                    # Check which agents' games are finished (at goal/collided/out of time)
-                    temp_which_agents_done, temp_game_over = self._check_which_agents_done()
-                    # Update active agent mask, only keep agents that is still running, and mask out any (at goal/collided/out of time) agents
-                    temp_agents_still_running = [not done for done in temp_which_agents_done]
-                    temp_active_agent_mask = self.active_agent_mask & temp_agents_still_running
+                    # Which agents' games are finished was checked above (agents respawned since then are still running)
+                    num_respawned = len(self.agents) - len(agents_still_running)
+                    temp_active_agent_mask = self.active_agent_mask & np.append(agents_still_running, np.ones(num_respawned, dtype=bool))
 
 
                     global_timeout            = int(os.environ["global_timeout"])
@@ -401,6 +418,8 @@ class CollisionAvoidanceEnv(gym.Env):
                         if global_experiment_number ==1:  new_agent.past_traj = past_traj
                             
                         self.agents.append( new_agent )
+                        if self.agent_array is not None:
+                            self.agent_array.add( new_agent )
 
                         # since original agent's already handled by "&" case, no need to update agent's state from active to false,
                         # add the replaced agent as a new agent, add it to active agent mask list
@@ -495,11 +514,17 @@ class CollisionAvoidanceEnv(gym.Env):
         """
         if self.episode_step_number is not None and self.episode_step_number > 0 and self.plot_episodes and self.test_case_index >= 0:
             plot_episode(self.agents, self.evaluate, self.map, self.test_case_index, self.id, circles_along_traj=Config.PLOT_CIRCLES_ALONG_TRAJ, plot_save_dir=self.plot_save_dir, plot_policy_name=self.plot_policy_name, limits=self.plt_limits, fig_size=self.plt_fig_size, show=Config.SHOW_EPISODE_PLOTS, save=Config.SAVE_EPISODE_PLOTS)
-            if Config.ANIMATE_EPISODES:
+            if Config.ANIMATE_EPISODES and (self.episode_animator is None or self.episode_animator.num_frames == 0):
                 animate_episode(num_agents=len(self.agents), plot_save_dir=self.plot_save_dir, plot_policy_name=self.plot_policy_name, test_case_index=self.test_case_index, agents=self.agents)
             self.episode_number += 1
+        if self.episode_animator is not None:
+            # close the gif/mp4 that was streamed while the episode ran
+            self.episode_animator.finish()
         self.begin_episode = True
         self.episode_step_number = 0
+        # Timesteps restart each episode, so predictions cached last episode must not be reused
+        scene_prediction_cache.reset()
+        trajectory_history.reset()
         self._init_agents()
         if Config.USE_STATIC_MAP:
             self._init_static_map()
@@ -528,12 +553,16 @@ class CollisionAvoidanceEnv(gym.Env):
             dt (float): time in seconds to run the simulation (defaults to :code:`self.dt_nominal`)
 
         """
+        # History-based policies (e.g., STGCNN) read every agent's recent positions from here
+        trajectory_history.record(self.agents)
+
         num_actions_per_agent = 2  # speed, delta heading angle
         all_actions = np.zeros((len(self.agents), num_actions_per_agent), dtype=np.float32)
 
         # Agents set their action (either from external or w/ find_next_action)
         #print("self.active_agents[0].heading_ego_frame")
         #print(self.active_agents[0].heading_ego_frame)
+        batched_agent_indices = {} # policy class -> indices of agents whose actions come from one find_next_actions call
         for agent_index, agent in enumerate(self.agents):
             if agent.is_done:
                 continue
@@ -541,15 +570,58 @@ class CollisionAvoidanceEnv(gym.Env):
                 all_actions[agent_index, :] = agent.policy.external_action_to_action(agent, actions[agent_index])
             else:
                 dict_obs = self.observation[agent_index] # None
-                action_args = inspect.getfullargspec(agent.policy.find_next_action)[0]
-                if 'full_agent_list' in action_args and 'active_agent_mask' in action_args:
+                takes_full_agent_list, has_batched_actions = agent.policy.get_calling_convention()
+                if has_batched_actions:
+                    batched_agent_indices.setdefault(type(agent.policy), []).append(agent_index)
+                elif takes_full_agent_list:
                     all_actions[agent_index, :] = agent.policy.find_next_action(dict_obs, self.agents, agent_index,  full_agent_list = self.agents, active_agent_mask = self.active_agent_mask)
                 else:
                     all_actions[agent_index, :] = agent.policy.find_next_action(dict_obs, self.agents, agent_index)
+        for agent_indices in batched_agent_indices.values():
+            obs_list = [self.observation[i] for i in agent_indices]
+            all_actions[agent_indices, :] = self.agents[agent_indices[0]].policy.find_next_actions(obs_list, self.agents, agent_indices, self.active_agent_mask)
         # After all agents have selected actions, run one dynamics update
-        for i, agent in enumerate(self.agents):
-            agent.take_action(all_actions[i,:], dt)
+        if self.agent_array is None:
+            for i, agent in enumerate(self.agents):
+                agent.take_action(all_actions[i,:], dt)
+        else:
+            self._take_action_batched(all_actions, dt)
+
+    def _take_action_batched(self, all_actions, dt):
+        """ Same as each agent calling :code:`take_action`, but the unicycle dynamics and the at-goal/out-of-bounds checks
+        run as a few numpy ops over self.agent_array instead of once per agent.
+
+        Args:
+            all_actions (np array): (len(self.agents), 2) [speed, delta heading angle] command per agent
+            dt (float): time in seconds to run the simulation
 
+        """
+        moving_inds = []
+        for i, agent in enumerate(self.agents):
+            if agent.is_stopped():
+                agent.hold_position(dt)
+            else:
+                all_actions[i,:] = agent.start_action(all_actions[i,:])
+                moving_inds.append(i)
+        if len(moving_inds) == 0:
+            return
+        moving_inds = np.array(moving_inds)
+        rows = np.array([self.agents[i].agent_array_index for i in moving_inds])
+
+        is_unicycle = np.array([type(self.agents[i].dynamics_model) is UnicycleDynamics for i in moving_inds])
+        UnicycleDynamics.step_batch(self.agent_array, rows[is_unicycle], all_actions[moving_inds[is_unicycle]], dt)
+        for i in moving_inds[~is_unicycle]:
+            self.agents[i].dynamics_model.step(all_actions[i,:], dt)
+
+        for i in moving_inds:
+            self.agents[i].finish_action(dt)
+
+        near_goal_thresholds = np.array([self.agents[i].near_goal_threshold for i in moving_inds])
+        is_at_goal = self.agent_array.check_if_at_goal(rows, near_goal_thresholds)
+        is_out_of_bounds = self.agent_array.check_if_out_of_bounds(rows, Config.PLT_LIMITS)
+        for i, at_goal, out_of_bounds in zip(moving_inds, is_at_goal, is_out_of_bounds):
+            self.agents[i].is_at_goal = bool(at_goal)
+            self.agents[i].is_out_of_bounds = bool(out_of_bounds)
 
     #####Original#########
     # def _take_action(self, actions, dt):
@@ -629,6 +701,12 @@ class CollisionAvoidanceEnv(gym.Env):
             agent.max_heading_change = self.max_heading_change
             agent.max_speed = self.max_speed
 
+        # Optionally, move the agents' core states into one structure-of-arrays store (row i <-> self.agents[i])
+        if Config.USE_AGENT_ARRAY:
+            self.agent_array = AgentArray(self.agents)
+        else:
+            self.agent_array = None
+
     def set_static_map(self, map_filename):
         """ If you want to have static obstacles, provide the path to the map image file that should be loaded.
         
@@ -666,57 +744,35 @@ class CollisionAvoidanceEnv(gym.Env):
         rewards = self.reward_time_step*np.ones(len(self.active_agents))
         collision_with_agent, collision_with_wall, entered_norm_zone, dist_btwn_nearest_agent = \
             self._check_for_collisions()
+        collision_with_agent = np.array(collision_with_agent, dtype=bool)
+        collision_with_wall = np.array(collision_with_wall, dtype=bool)
+        dist_btwn_nearest_agent = np.array(dist_btwn_nearest_agent, dtype=np.float64)
+
+        # per-agent flags, so each case below is a mask over the active agents
+        is_at_goal = np.array([agent.is_at_goal for agent in self.active_agents], dtype=bool)
+        first_time_at_goal = np.array([agent.was_at_goal_already is False for agent in self.active_agents], dtype=bool)
+        not_in_collision_already = np.array([agent.was_in_collision_already is False for agent in self.active_agents], dtype=bool)
+        cooldown_expired = np.array([agent.time_since_collision >= agent.collision_cooldown for agent in self.active_agents], dtype=bool)
+        is_wiggly = np.array([abs(agent.past_actions[0, 1]) > self.wiggly_behavior_threshold for agent in self.active_agents], dtype=bool)
+
+        # agents should only receive the goal reward once
+        arrived = is_at_goal & first_time_at_goal
+        hit_agent = not_in_collision_already & cooldown_expired & collision_with_agent
+        # agents at their goal shouldn't be penalized if someone else bumps into them (except by the agent collision above)
+        hit_wall = not_in_collision_already & cooldown_expired & ~is_at_goal & ~hit_agent & collision_with_wall
+        # There was no collision
+        no_collision = not_in_collision_already & ~is_at_goal & ~hit_agent & ~hit_wall
+        getting_close = no_collision & (dist_btwn_nearest_agent <= Config.GETTING_CLOSE_RANGE)
+
+        rewards[arrived] = self.reward_at_goal
+        rewards[getting_close] = -0.1 - dist_btwn_nearest_agent[getting_close]/2.
+        # Slightly penalize wiggly behavior
+        rewards[no_collision & is_wiggly] += self.reward_wiggly_behavior
+        rewards[hit_agent] = self.reward_collision_with_agent
+        rewards[hit_wall] = self.reward_collision_with_wall
+        for i in np.flatnonzero(hit_agent | hit_wall):
+            self.active_agents[i].in_collision = True
 
-        for i, agent in enumerate(self.active_agents):
-            if agent.is_at_goal:
-                if agent.was_at_goal_already is False:
-                    # agents should only receive the goal reward once
-                    rewards[i] = self.reward_at_goal
-                    # #print("Agent %i: Arrived at goal!"
-                          # % agent.id)
-
-                if agent.was_in_collision_already is False:
-                    if collision_with_agent[i] and (agent.time_since_collision >= agent.collision_cooldown):
-                        rewards[i] = self.reward_collision_with_agent                 
-                        agent.in_collision = True
-
-
-                        #other agent is also collided now:
-                        #self.agents[i].in_collision = True
-
-                        #agent.collision_timestep = np.array( [agent.step_num] )
-                        # agent.arrival_timestep = -1
-                        # agent.timeout_timestep = []
-                          
-            else:
-                # agents at their goal shouldn't be penalized if someone else
-                # bumps into them
-                if agent.was_in_collision_already is False:
-                    if collision_with_agent[i] and (agent.time_since_collision >= agent.collision_cooldown):
-                        rewards[i] = self.reward_collision_with_agent
-                        agent.in_collision = True
-
-                        # #print("Agent %i: Collision with another agent!"
-                        #       % agent.id)
-
-                        
-                    elif collision_with_wall[i] and (agent.time_since_collision >= agent.collision_cooldown):
-                        rewards[i] = self.reward_collision_with_wall
-                        agent.in_collision = True
-
-                        # #print("Agent %i: Collision with wall!"
-                              # % agent.id)
-                    else:
-                        # There was no collision
-                        if dist_btwn_nearest_agent[i] <= Config.GETTING_CLOSE_RANGE:
-                            rewards[i] = -0.1 - dist_btwn_nearest_agent[i]/2.
-                            # #print("Agent %i: Got close to another agent!"
-                            #       % agent.id)
-                        if abs(agent.past_actions[0, 1]) > self.wiggly_behavior_threshold:
-                            # Slightly penalize wiggly behavior
-                            rewards[i] += self.reward_wiggly_behavior
-                        # elif entered_norm_zone[i]:
-                        #     rewards[i] = self.reward_entered_norm_zone
         rewards = np.clip(rewards, self.min_possible_reward,
                           self.max_possible_reward)
         if Config.TRAIN_SINGLE_AGENT:
@@ -728,6 +784,10 @@ class CollisionAvoidanceEnv(gym.Env):
         
         This method doesn't compute social zones currently!!!!!
 
+        Agent pairs come from the broadphase in :code:`Config.COLLISION_BROADPHASE`. With 'grid' or 'kdtree', only pairs within
+        GETTING_CLOSE_RANGE of touching are checked, so dist_btwn_nearest_agent is exact whenever it is <= GETTING_CLOSE_RANGE
+        (the only case the reward uses) and np.inf otherwise. 'brute_force' checks every pair, as before.
+
         Returns:
             - collision_with_agent (list): for each agent, bool True if that agent is in collision with another agent
             - collision_with_wall (list): for each agent, bool True if that agent is in collision with object in map
@@ -745,15 +805,36 @@ class CollisionAvoidanceEnv(gym.Env):
         agent_shapes = []
         agent_front_zones = []
         agent_inds = list(range(len(self.active_agents))) #always takes 0-7
-        agent_pairs = list(itertools.combinations(agent_inds, 2))
-        for i, j in agent_pairs:
-            dist_btwn = l2norm(self.active_agents[i].pos_global_frame, self.active_agents[j].pos_global_frame)
-            combined_radius = self.active_agents[i].radius + self.active_agents[j].radius
-            dist_btwn_nearest_agent[i] = min(dist_btwn_nearest_agent[i], dist_btwn - combined_radius)
-            if dist_btwn <= combined_radius:
-                # Collision with another agent!
-                collision_with_agent[i] = True
-                collision_with_agent[j] = True
+        if Config.COLLISION_BROADPHASE == 'brute_force':
+            agent_pairs = list(itertools.combinations(agent_inds, 2))
+            for i, j in agent_pairs:
+                dist_btwn = l2norm(self.active_agents[i].pos_global_frame, self.active_agents[j].pos_global_frame)
+                combined_radius = self.active_agents[i].radius + self.active_agents[j].radius
+                dist_btwn_nearest_agent[i] = min(dist_btwn_nearest_agent[i], dist_btwn - combined_radius)
+                if dist_btwn <= combined_radius:
+                    # Collision with another agent!
+                    collision_with_agent[i] = True
+                    collision_with_agent[j] = True
+        elif len(agent_inds) > 1:
+            positions = np.array([agent.pos_global_frame for agent in self.active_agents], dtype=np.float64)
+            radii = np.array([agent.radius for agent in self.active_agents], dtype=np.float64)
+            # pairs further apart than this can't collide or get close
+            cutoff = 2*np.max(radii) + Config.GETTING_CLOSE_RANGE
+            pairs_i, pairs_j = find_candidate_pairs(positions, cutoff, method=Config.COLLISION_BROADPHASE)
+            diff = positions[pairs_i] - positions[pairs_j]
+            dist_btwn = np.sqrt(diff[:, 0]**2 + diff[:, 1]**2)
+            combined_radius = radii[pairs_i] + radii[pairs_j]
+
+            # same as the brute force loop: only the lower index of each pair gets its nearest dist updated
+            dist_btwn_nearest = np.array(dist_btwn_nearest_agent)
+            np.minimum.at(dist_btwn_nearest, pairs_i, dist_btwn - combined_radius)
+            dist_btwn_nearest_agent = dist_btwn_nearest.tolist()
+
+            in_collision = dist_btwn <= combined_radius
+            collided = np.zeros(len(agent_inds), dtype=bool)
+            collided[pairs_i[in_collision]] = True
+            collided[pairs_j[in_collision]] = True
+            collision_with_agent = collided.tolist()
         if Config.USE_STATIC_MAP:
             for i in agent_inds:
                 agent = self.active_agents[i]
@@ -775,45 +856,44 @@ class CollisionAvoidanceEnv(gym.Env):
             - game_over (bool): depending on mode, True if all agents done, True if 1st agent done, True if all learning agents done
         """
 
-        for agent in self.agents:
-            if (agent.arrival_timestep is None) and (agent.timeout_timestep is None) and (agent.out_of_bounds_timestep is None):
-
-                if agent.ran_out_of_time:
-
-                   agent.timeout_timestep = agent.step_num
-                   agent.arrival_timestep = -1
-                   agent.out_of_bounds_timestep = -1
-                    
-                elif agent.is_at_goal:
-
-                   agent.timeout_timestep = []
-                   agent.arrival_timestep = agent.step_num
-                   agent.out_of_bounds_timestep = -1
-
-                elif agent.is_out_of_bounds:
-
-                    agent.timeout_timestep = []
-                    agent.arrival_timestep = -1
-                    agent.out_of_bounds_timestep = agent.step_num
-
-
-            # Only add collisions if the agent is not done and cooldown has expired.
-            # Prevents multiple counts when agent is in collision exactly at arrival timestep
-            if (agent.in_collision and (agent.time_since_collision >= agent.collision_cooldown) and not agent.is_done):
-                agent.collision_timestep.append(self.episode_step_number)
-
-
-            #if now in collision, but previously already reached goal, then collision will override arrival
-
         at_goal_condition = np.array(
-                [a.is_at_goal for a in self.agents])
+                [a.is_at_goal for a in self.agents], dtype=bool)
         ran_out_of_time_condition = np.array(
-                [a.ran_out_of_time for a in self.agents])
+                [a.ran_out_of_time for a in self.agents], dtype=bool)
         out_of_bounds_condition = np.array(
-            [a.is_out_of_bounds for a in self.agents])
+            [a.is_out_of_bounds for a in self.agents], dtype=bool)
+        was_done = np.array([a.is_done for a in self.agents], dtype=bool)
+        not_yet_recorded = np.array(
+            [(a.arrival_timestep is None) and (a.timeout_timestep is None) and (a.out_of_bounds_timestep is None) for a in self.agents], dtype=bool)
+        in_collision = np.array(
+            [a.in_collision and (a.time_since_collision >= a.collision_cooldown) for a in self.agents], dtype=bool)
         which_agents_done = np.logical_or.reduce((at_goal_condition, ran_out_of_time_condition, out_of_bounds_condition))
-        for agent_index, agent in enumerate(self.agents):
-            agent.is_done = which_agents_done[agent_index]
+
+        # Record when (and why) each agent just finished: timeout, else arrival, else out of bounds
+        for agent_index in np.flatnonzero(not_yet_recorded & which_agents_done):
+            agent = self.agents[agent_index]
+            if ran_out_of_time_condition[agent_index]:
+                agent.timeout_timestep = agent.step_num
+                agent.arrival_timestep = -1
+                agent.out_of_bounds_timestep = -1
+            elif at_goal_condition[agent_index]:
+                agent.timeout_timestep = []
+                agent.arrival_timestep = agent.step_num
+                agent.out_of_bounds_timestep = -1
+            else:
+                agent.timeout_timestep = []
+                agent.arrival_timestep = -1
+                agent.out_of_bounds_timestep = agent.step_num
+
+        # Only add collisions if the agent is not done and cooldown has expired.
+        # Prevents multiple counts when agent is in collision exactly at arrival timestep
+        for agent_index in np.flatnonzero(in_collision & ~was_done):
+            self.agents[agent_index].collision_timestep.append(self.episode_step_number)
+
+        #if now in collision, but previously already reached goal, then collision will override arrival
+
+        for agent_index in np.flatnonzero(which_agents_done != was_done):
+            self.agents[agent_index].is_done = which_agents_done[agent_index]
         
         if Config.EVALUATE_MODE:
             # Episode ends when every agent is done
@@ -859,9 +939,25 @@ class CollisionAvoidanceEnv(gym.Env):
             # Agents have moved (states have changed), so update the map view
             self._update_top_down_map()
 
+        # Sensors that support it (e.g., OtherAgentsStatesSensor, LaserScanSensor) are computed for all agents at once
+        # (one batch per sensor type & setting, in case agents' sensors are configured differently)
+        precomputed_sensor_data = [{} for _ in self.agents]
+        sense_all_groups = {}
+        for i, agent in enumerate(self.agents):
+            for sensor in agent.sensors:
+                batch_key = sensor.get_batch_key()
+                if batch_key is not None:
+                    host_inds, host_sensors = sense_all_groups.setdefault((type(sensor), batch_key), ([], []))
+                    host_inds.append(i)
+                    host_sensors.append(sensor)
+        for host_inds, host_sensors in sense_all_groups.values():
+            measurements = host_sensors[0].sense_all(self.agents, host_inds, self.map, host_sensors)
+            for k, i in enumerate(host_inds):
+                precomputed_sensor_data[i][host_sensors[k].name] = measurements[k]
+
         # Agents collect a reading from their map-based sensors
         for i, agent in enumerate(self.agents):
-            agent.sense(self.agents, i, self.map)
+            agent.sense(self.agents, i, self.map, precomputed_sensor_data[i])
 
         # Agents fill in their element of the multiagent observation vector
         for i, agent in enumerate(self.agents):
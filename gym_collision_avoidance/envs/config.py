@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from gym_collision_avoidance.experiments.src.master_config import Master_Config
 # from gym_collision_avoidance.experiments.src.master_config_deploy import Master_Config
@@ -18,6 +19,8 @@ class Config(object):
         if not hasattr(self, "PLOT_CIRCLES_ALONG_TRAJ"):
             self.PLOT_CIRCLES_ALONG_TRAJ = True
         self.ANIMATION_PERIOD_STEPS = 2 # plot every n-th DT step (if animate mode on)
+        if not hasattr(self, "ANIMATION_RENDERER"):
+            self.ANIMATION_RENDERER = "incremental" # 'incremental': stream frames into the gif/mp4 as the episode runs (see visualize.EpisodeAnimator), 'png': save a png per frame and assemble them when the episode ends
         self.PLT_LIMITS = None
         self.PLT_FIG_SIZE = (10, 8)
 
@@ -48,6 +51,22 @@ class Config(object):
         self.DT             = 0.25 # seconds between simulation time steps
         self.NEAR_GOAL_THRESHOLD = 0.3
         self.MAX_TIME_RATIO = 2. # agent has this number times the straight-line-time to reach its goal before "timing out"
+        if not hasattr(self, "USE_AGENT_ARRAY"):
+            self.USE_AGENT_ARRAY = False # store agent states in one AgentArray so dynamics/goal/bounds checks are batched each step
+        if not hasattr(self, "NUM_EXPERIMENT_WORKERS"):
+            self.NUM_EXPERIMENT_WORKERS = 1 # processes that experiment scripts (e.g., run_full_test_suite) spread test cases across (None: one per cpu)
+        if not hasattr(self, "COLLISION_BROADPHASE"):
+            self.COLLISION_BROADPHASE = "grid" # how to find nearby agent pairs for collision checks: 'grid', 'kdtree', or 'brute_force' (check every pair)
+        if not hasattr(self, "TRAJECTORY_HISTORY_WINDOW"):
+            self.TRAJECTORY_HISTORY_WINDOW = 32 # timesteps of agent positions the env keeps for history-based policies (8 observations every 4 steps need 29)
+        if not hasattr(self, "SLSTM_ONLINE_INFERENCE"):
+            self.SLSTM_ONLINE_INFERENCE = False # SLSTM keeps its LSTM states between timesteps and feeds only the newest observation (instead of re-encoding the whole observation window each step)
+        if not hasattr(self, "TORCH_DEVICE"):
+            self.TORCH_DEVICE = os.environ.get("GYM_TORCH_DEVICE", "cpu") # device of the learned predictor policies (STGCNN, SOCIALGAN, NAVIGAN, ...): 'cpu', 'cuda', 'cuda:1', ..., or 'auto' (cuda if available)
+        if not hasattr(self, "TORCH_INFERENCE_GRAPH"):
+            self.TORCH_INFERENCE_GRAPH = None # run their networks as 'trace'd (torch.jit.trace, one graph per input shape) or 'compile'd (torch.compile) graphs, None: eagerly
+        if not hasattr(self, "QUANTIZED_POLICIES"):
+            self.QUANTIZED_POLICIES = [] # policies (only 'SOCIALGAN' so far) whose Linear/LSTM layers run dynamically quantized to int8 (cpu only). Opt-in: int8 ran slower than fp32 on all but one test split, and costs accuracy (see SOCIALGAN/QUANTIZATION.md)
         
         ### TEST CASE SETTINGS
         self.TEST_CASE_FN = "get_testcase_random"
@@ -1,6 +1,6 @@
 import numpy as np
 from gym_collision_avoidance.envs.dynamics.Dynamics import Dynamics
-from gym_collision_avoidance.envs.util import wrap, find_nearest
+from gym_collision_avoidance.envs.util import wrap, wrap_array, find_nearest
 import math
 
 class UnicycleDynamics(Dynamics):
@@ -44,4 +44,38 @@ class UnicycleDynamics(Dynamics):
         elif self.agent.turning_dir * selected_heading < 0:
             self.agent.turning_dir = max(-np.pi, min(np.pi, -self.agent.turning_dir + selected_heading))
         else:
-            self.agent.turning_dir = np.sign(self.agent.turning_dir) * max(0.0, abs(self.agent.turning_dir)-0.1)
\ No newline at end of file
+            self.agent.turning_dir = np.sign(self.agent.turning_dir) * max(0.0, abs(self.agent.turning_dir)-0.1)
+
+    @staticmethod
+    def step_batch(agent_array, rows, actions, dt):
+        """ Vectorized version of :code:`step` for many agents whose states live in the same AgentArray.
+
+        Args:
+            agent_array (:class:`~gym_collision_avoidance.envs.agent_array.AgentArray`): store holding the agents' states
+            rows (np array): int indices (into agent_array) of the agents to move
+            actions (np array): (len(rows), 2) [speed, delta heading angle] commands
+            dt (float): time in seconds to execute :code:`actions`
+
+        """
+        heading_global_frame = agent_array.heading_global_frame[rows]
+        selected_speed = actions[:, 0]
+        selected_heading = wrap_array(actions[:, 1] + heading_global_frame)
+
+        vx = selected_speed * np.cos(selected_heading)
+        vy = selected_speed * np.sin(selected_heading)
+        agent_array.pos_global_frame[rows, 0] += vx * dt
+        agent_array.pos_global_frame[rows, 1] += vy * dt
+
+        agent_array.vel_global_frame[rows, 0] = vx
+        agent_array.vel_global_frame[rows, 1] = vy
+        agent_array.speed_global_frame[rows] = selected_speed
+        agent_array.delta_heading_global_frame[rows] = wrap_array(selected_heading - heading_global_frame)
+        agent_array.heading_global_frame[rows] = selected_heading
+
+        # turning dir: needed for cadrl value fn
+        turning_dir = agent_array.turning_dir[rows]
+        agent_array.turning_dir[rows] = np.where(np.abs(turning_dir) < 1e-5,
+            0.11 * np.sign(selected_heading),
+            np.where(turning_dir * selected_heading < 0,
+                np.clip(-turning_dir + selected_heading, -np.pi, np.pi),
+                np.sign(turning_dir) * np.maximum(0.0, np.abs(turning_dir)-0.1)))
@@ -49,6 +49,8 @@ def find_dist_between_segs(x1, x2, y1, y2):
 # x2.shape = (num_actions,2)
 # y1.shape = (2,)
 # y2.shape = (num_actions,2)
+# (or any shapes that broadcast together, e.g., x2.shape = (num_actions,1,2),
+# y1.shape = (num_other_agents,2), y2.shape = (num_actions,num_other_agents,2))
 	if_one_pt = False
 	if x2.shape == (2,):
 		x2 = x2.reshape((1,2))
@@ -56,23 +58,20 @@ def find_dist_between_segs(x1, x2, y1, y2):
 		if_one_pt = True
 
 
-	start_dist = np.linalg.norm(x1 - y1)
-	end_dist = np.linalg.norm(x2 - y2, axis=1)
-	critical_dist = end_dist.copy() 
-	# start_dist * np.ones((num_pts,))   # initialize
+	end_dist = np.linalg.norm(x2 - y2, axis=-1)
 	# critical points (where d/dt = 0)
 	z_bar = (x2 - x1) - (y2 - y1)             # shape = (num_actions, 2)
-	inds = np.where((np.linalg.norm(z_bar,axis=1)>0))[0]
-	t_bar = - np.sum((x1-y1) * z_bar[inds,:], axis=1) \
-			/ np.sum(z_bar[inds,:] * z_bar[inds,:], axis=1)
-	t_bar_rep = np.matlib.repmat(t_bar, 2, 1).transpose()
-	dist_bar = np.linalg.norm(x1 + (x2[inds,:]-x1) * t_bar_rep \
-			  - y1 - (y2[inds,:]-y1) * t_bar_rep, axis=1)
-	inds_2 = np.where((t_bar > 0) & (t_bar < 1.0))
-	critical_dist[inds[inds_2]] = dist_bar[inds_2] 
+	with np.errstate(divide='ignore', invalid='ignore'):
+		t_bar = - np.sum((x1-y1) * z_bar, axis=-1) \
+				/ np.sum(z_bar * z_bar, axis=-1)
+	t_bar_rep = t_bar[..., np.newaxis]
+	dist_bar = np.linalg.norm(x1 + (x2-x1) * t_bar_rep \
+			  - y1 - (y2-y1) * t_bar_rep, axis=-1)
+	if_critical = (np.linalg.norm(z_bar,axis=-1)>0) & (t_bar > 0) & (t_bar < 1.0)
+	critical_dist = np.where(if_critical, dist_bar, end_dist)
 
 	# end_dist = end_dist.clip(min=0, max=start_dist)
-	min_dist = np.amin(np.vstack((end_dist, critical_dist)), axis=0)
+	min_dist = np.minimum(end_dist, critical_dist)
 	# print 'min_dist', min_dist
 
 	if if_one_pt:
@@ -745,8 +745,8 @@ class NN_navigation_value:
 
     def check_collisions_and_get_action_rewards(self, agent_state, actions_theta, \
                             other_agents_state_in, other_agents_action=None, dt_forward=None):
-        actions_theta_copy = actions_theta.copy()
-        other_agents_state = copy.deepcopy(other_agents_state_in)
+        # (one row per other agent, a copy since their velocities are replaced by their actions below)
+        other_agents_state = np.array(other_agents_state_in, dtype=np.float64)
 
         # ref_prll, ref_orth, state_nn = \
         #   pedData.rawState_2_agentCentricState( \
@@ -760,10 +760,10 @@ class NN_navigation_value:
                 other_agent_speed = np.linalg.norm(other_agents_state_in[tt][2:4])
                 other_agent_angle = np.arctan2(other_agents_state_in[tt][3], other_agents_state_in[tt][2])
                 other_agents_action.append(np.array([other_agent_speed, other_agent_angle]))
+        other_agents_action = np.reshape(np.array(other_agents_action, dtype=np.float64), (num_other_agents, 2))
         # update other agents' velocity
-        for tt in range(num_other_agents):
-            other_agents_state[tt][2] = other_agents_action[tt][0] * np.cos(other_agents_action[tt][1])
-            other_agents_state[tt][3] = other_agents_action[tt][0] * np.sin(other_agents_action[tt][1])
+        other_agents_state[:,2] = other_agents_action[:,0] * np.cos(other_agents_action[:,1])
+        other_agents_state[:,3] = other_agents_action[:,0] * np.sin(other_agents_action[:,1])
 
         # assume other agent is heading toward the vehicle
         # rel_pos = agent_state[0:2] - other_agent_state[0:2]
@@ -783,16 +783,11 @@ class NN_navigation_value:
         # compute values for each state
 
 
-        # collide (not just getting close)
-        min_dists_mat = np.zeros((num_actions, num_other_agents))
-        if_collide_mat = np.zeros((num_actions, num_other_agents))
-        cur_dist_vec = np.zeros((num_other_agents,))
-        for tt in range(num_other_agents):
-            min_dists_mat[:,tt], if_collide_mat[:,tt] = self.if_actions_collide(agent_state, 
-                        actions_theta, other_agents_state[tt], other_agents_action[tt], dt_forward)
-        
-            radius = agent_state[8] + other_agents_state[tt][8] + self.radius_buffer
-            cur_dist_vec[tt] = np.linalg.norm(agent_state[0:2]-other_agents_state[tt][0:2]) - radius
+        # collide (not just getting close), every action against every other agent at once
+        min_dists_mat, if_collide_mat = self.if_actions_collide_with_agents(agent_state, \
+                        actions_theta, other_agents_state, other_agents_action, dt_forward)
+        radius = agent_state[8] + other_agents_state[:,8] + self.radius_buffer
+        cur_dist_vec = np.linalg.norm(agent_state[0:2]-other_agents_state[:,0:2], axis=1) - radius
 
         min_dists = np.min(min_dists_mat, axis=1)
         if_collide = np.max(if_collide_mat, axis=1)
@@ -815,10 +810,22 @@ class NN_navigation_value:
 
     def find_values_and_action_rewards(self, agent_state, actions_theta, \
                             other_agents_state_in, other_agents_action=None, dt_forward=None):
+        values_query = self.find_values_query(agent_state, actions_theta, \
+                            other_agents_state_in, other_agents_action, dt_forward)
+        return self.find_values_from_query(values_query, self.find_states_nn_values(values_query[0]))
+
+    # first half of find_values_and_action_rewards: everything but the value network query,
+    # returns the (agent-centric) states to query first, so several agents' queries can go
+    # through the network in one batch (see find_next_actions)
+    def find_values_query(self, agent_state, actions_theta, \
+                            other_agents_state_in, other_agents_action=None, dt_forward=None):
         if_collide, action_rewards, min_dists, other_agents_next_state, num_actions, other_agents_state = self.check_collisions_and_get_action_rewards(agent_state, actions_theta, \
                             other_agents_state_in, other_agents_action, dt_forward)
         state_values = np.zeros((num_actions,))
         non_collision_inds = np.where(if_collide==False)[0]
+        # states (and their indices in actions_theta) whose values come from the network
+        states_nn = np.zeros((0, 7 + 8 * (self.num_agents-1)))
+        query_inds = np.zeros((0,), dtype=int)
 
         # find states_values in batch
         gamma = GAMMA
@@ -838,8 +845,10 @@ class NN_navigation_value:
             non_collision_reached_goals_inds = non_collision_inds[reached_goals_inds]
             non_collision_not_reached_goals_inds = non_collision_inds[not_reached_goals_inds]
             
-            state_values[non_collision_not_reached_goals_inds] = \
-                self.find_states_values(agent_next_states[not_reached_goals_inds], other_agents_next_state)
+            ref_prll_vec, ref_orth_vec, states_nn = \
+                pedData.rawStates_2_agentCentricStates(\
+                    agent_next_states[not_reached_goals_inds], other_agents_next_state, self.num_agents)
+            query_inds = non_collision_not_reached_goals_inds
 
 
             # state_values[non_collision_reached_goals_inds] = gamma ** (dists_to_goal / dt_normal)
@@ -850,19 +859,30 @@ class NN_navigation_value:
             state_values[non_collision_reached_goals_inds] = \
                 gamma ** (dists_to_goal[reached_goals_inds] / dt_normal)
 
+        # smoothness_cost = self.find_state_action_cost(agent_state, actions_theta, dt_forward)
+        passing_side_cost = self.find_passing_side_cost(agent_state, actions_theta,\
+            other_agents_state, other_agents_action, dt_forward)
+        # print passing_side_cost
+        # raw_input()
+
+        return states_nn, query_inds, state_values, action_rewards, passing_side_cost, \
+            agent_state, actions_theta, dt_forward
+
+    # second half of find_values_and_action_rewards, given the values of the queried states
+    # (find_states_nn_values of values_query[0])
+    def find_values_from_query(self, values_query, states_nn_values):
+        states_nn, query_inds, state_values, action_rewards, passing_side_cost, \
+            agent_state, actions_theta, dt_forward = values_query
+        state_values[query_inds] = states_nn_values
+
         try:
             assert(np.all(action_rewards + state_values < 1.0001))
         except:
             print('agent_state', agent_state)
             print('actions_theta', actions_theta)
-            print('other_agent_state', other_agent_state)
-            print('other_agent_action', other_agent_action)
             print('dt_forward', dt_forward)
-            print('dists_to_goal', dists_to_goal)
             print('actions_rewerds', action_rewards)
             print('state_values', state_values)
-            print('values', action_rewards + gamma ** (dt_forward * \
-                agent_desired_speed / dt_normal) * state_values)
             assert(0)       
         
         # np.set_printoptions(precision=4,formatter={'float': '{: 0.3f}'.format})
@@ -909,11 +929,6 @@ class NN_navigation_value:
         # #     raw_input()
 
         # assert(np.sum(actions_theta_copy - actions_theta) < 0.0001)
-        # smoothness_cost = self.find_state_action_cost(agent_state, actions_theta, dt_forward)
-        passing_side_cost = self.find_passing_side_cost(agent_state, actions_theta,\
-            other_agents_state, other_agents_action, dt_forward)
-        # print passing_side_cost
-        # raw_input()
         # return state_values, action_rewards + smoothness_cost + passing_side_cost
         # if len(state_values)>5:
         #   print 'state_values', state_values
@@ -951,20 +966,30 @@ class NN_navigation_value:
 
     def find_next_states_values_and_components(self, agent_state, actions_theta, \
                             other_agents_state, other_agents_action=None, dt_forward=None):
-        # making sure look ahead time is not too long (reaching goal)
-        # or too short (if agent's desired speed is too slow)
         if dt_forward is None:
-            agent_speed = agent_state[5]
-            dt_forward_max = max(self.dt_forward, 0.5/agent_speed)
-            # dt_forward_max = self.dt_forward
-            dist_to_goal = np.linalg.norm(agent_state[6:8]- agent_state[0:2])
-            time_to_goal = dist_to_goal / agent_speed
-            dt_forward = min(dt_forward_max, time_to_goal) #1.0
+            dt_forward = self.find_dt_forward(agent_state)
 
         state_values, action_rewards = \
             self.find_values_and_action_rewards(agent_state, actions_theta, \
                             other_agents_state, other_agents_action, dt_forward)
 
+        values = self.find_discounted_values(agent_state, actions_theta, \
+                            state_values, action_rewards, dt_forward)
+        return values, state_values, action_rewards, dt_forward
+
+    # making sure look ahead time is not too long (reaching goal)
+    # or too short (if agent's desired speed is too slow)
+    def find_dt_forward(self, agent_state):
+        agent_speed = agent_state[5]
+        dt_forward_max = max(self.dt_forward, 0.5/agent_speed)
+        # dt_forward_max = self.dt_forward
+        dist_to_goal = np.linalg.norm(agent_state[6:8]- agent_state[0:2])
+        time_to_goal = dist_to_goal / agent_speed
+        dt_forward = min(dt_forward_max, time_to_goal) #1.0
+        return dt_forward
+
+    # value of each action: its reward + the discounted value of the state it leads to
+    def find_discounted_values(self, agent_state, actions_theta, state_values, action_rewards, dt_forward):
         gamma = GAMMA
         dt_normal = DT_NORMAL
         agent_desired_speed = agent_state[5]
@@ -981,8 +1006,7 @@ class NN_navigation_value:
         # raw_input()
         values =  action_rewards + gamma ** (dt_forward_vec * \
             agent_desired_speed / dt_normal) * state_values
-
-        return values, state_values, action_rewards, dt_forward
+        return values
 
     def find_feasible_actions(self, agent_state, static_constraints=None):
         # print 'agent_state', agent_state
@@ -1087,6 +1111,38 @@ class NN_navigation_value:
         # print("actions_theta:", actions_theta)
         # print("state_values:", state_values)
 
+        return self.find_best_action(agent_state, other_agents_state, actions_theta, state_values)
+
+    # same as find_next_action for several agents (agents_state[i], agents_other_agents_state[i],
+    # agents_other_agents_action[i] for the ith agent), but the next states of every agent's
+    # feasible actions go through the value network in one batch
+    def find_next_actions(self, agents_state, agents_other_agents_state, agents_other_agents_action):
+        if len(agents_state) == 0:
+            return []
+        agents_actions_theta = []
+        values_queries = []
+        for agent_state, other_agents_state, other_agents_action in \
+            zip(agents_state, agents_other_agents_state, agents_other_agents_action):
+            actions_theta = self.find_feasible_actions(agent_state)
+            dt_forward = self.find_dt_forward(agent_state)
+            agents_actions_theta.append(actions_theta)
+            values_queries.append(self.find_values_query(agent_state, actions_theta, \
+                            other_agents_state, other_agents_action, dt_forward))
+
+        states_nn_values = np.reshape(self.find_states_nn_values(
+            np.vstack([values_query[0] for values_query in values_queries])), (-1,))
+        split_inds = np.cumsum([len(values_query[0]) for values_query in values_queries])[:-1]
+
+        best_actions = []
+        for i, agent_states_nn_values in enumerate(np.split(states_nn_values, split_inds)):
+            state_values, action_rewards = self.find_values_from_query(values_queries[i], agent_states_nn_values)
+            values = self.find_discounted_values(agents_state[i], agents_actions_theta[i], \
+                            state_values, action_rewards, values_queries[i][-1])
+            best_actions.append(self.find_best_action(agents_state[i], agents_other_agents_state[i], \
+                            agents_actions_theta[i], values))
+        return best_actions
+
+    def find_best_action(self, agent_state, other_agents_state, actions_theta, state_values):
         best_action_ind = np.argmax(state_values)
         best_action = actions_theta[best_action_ind]
         # print '------'
@@ -1457,75 +1513,62 @@ class NN_navigation_value:
     # check collision 
     def if_actions_collide(self, agent_state, agent_actions, other_agent_state, \
                             other_agent_action, delta_t):
+        min_dists, if_collide = self.if_actions_collide_with_agents(agent_state, agent_actions, \
+            other_agent_state[np.newaxis,:], np.asarray(other_agent_action)[np.newaxis,:], delta_t)
+        return min_dists[:,0], if_collide[:,0]
+
+    # check collision of each action with each other agent
+    # (other_agents_state[j], other_agents_action[j] for the jth other agent)
+    # returns min_dists, if_collide, shape = (num_actions, num_other_agents)
+    def if_actions_collide_with_agents(self, agent_state, agent_actions, other_agents_state, \
+                            other_agents_action, delta_t):
         # bnd
         agent_pref_speed = agent_state[5]
-        other_agent_speed = other_agent_action[0]
-        radius = agent_state[8] + other_agent_state[8] + self.radius_buffer
+        other_agents_speed = other_agents_action[:,0]
+        radius = agent_state[8] + other_agents_state[:,8] + self.radius_buffer  # shape = (num_others,)
         num_actions = agent_actions.shape[0]
-        if_collide = np.zeros((num_actions), dtype=bool)
-        min_dists = (radius + GETTING_CLOSE_RANGE + EPS) * np.ones((num_actions), dtype=bool)
+        cur_dists = np.linalg.norm(agent_state[0:2] - other_agents_state[:,0:2], axis=1)
         # two agents are too far away for collision
-        if np.linalg.norm(agent_state[0:2] - other_agent_state[0:2]) > \
-            (agent_pref_speed+other_agent_speed) * delta_t + radius:
-            return min_dists, if_collide # default to no collision
+        if_far = cur_dists > (agent_pref_speed+other_agents_speed) * delta_t + radius
 
         # check for each action individually 
         agent_vels = np.zeros((num_actions,2))
         agent_vels[:,0] = agent_actions[:,0] * np.cos(agent_actions[:,1])
         agent_vels[:,1] = agent_actions[:,0] * np.sin(agent_actions[:,1])
-        other_agent_v = np.zeros((2,))
-        other_agent_v[0] = other_agent_action[0] * np.cos(other_agent_action[1])
-        other_agent_v[1] = other_agent_action[0] * np.sin(other_agent_action[1])
+        other_agents_v = np.zeros((len(other_agents_state),2))
+        other_agents_v[:,0] = other_agents_speed * np.cos(other_agents_action[:,1])
+        other_agents_v[:,1] = other_agents_speed * np.sin(other_agents_action[:,1])
         # other_agent_v[0] = other_agent_action[0] * np.cos(other_agent_action[1] + np.random.randn()*np.pi/36)
         # other_agent_v[1] = other_agent_action[0] * np.sin(other_agent_action[1] + np.random.randn()*np.pi/36)
-        other_agent_vels = np.matlib.repmat(other_agent_v, num_actions, 1)
+        other_agents_vels = np.tile(other_agents_v, (num_actions,1,1))  # shape = (num_actions, num_others, 2)
 
         # modifying distance calculation
-        p_oa_angle = np.arctan2(other_agent_state[1] - agent_state[1], \
-                        other_agent_state[0] - agent_state[0])
+        p_oa_angles = np.arctan2(other_agents_state[:,1] - agent_state[1], \
+                        other_agents_state[:,0] - agent_state[0])
         agent_speed_angles = np.arctan2(agent_vels[:,1], agent_vels[:,0])
-        other_speed_angle = np.arctan2(other_agent_v[1], other_agent_v[0])
-        heading_diff = find_angle_diff(agent_speed_angles, other_speed_angle)
-        agent_heading_2_other = find_angle_diff(agent_speed_angles, p_oa_angle)
-        r = agent_state[8] + other_agent_state[8] + GETTING_CLOSE_RANGE
-        coll_angle = abs(np.arcsin(min(0.95, r / np.linalg.norm(\
-                        agent_state[0:2]-other_agent_state[0:2]))))
+        other_speed_angles = np.arctan2(other_agents_v[:,1], other_agents_v[:,0])
+        heading_diff = find_angle_diff(agent_speed_angles[:,np.newaxis], other_speed_angles)
+        agent_heading_2_other = find_angle_diff(agent_speed_angles[:,np.newaxis], p_oa_angles)
+        r = agent_state[8] + other_agents_state[:,8] + GETTING_CLOSE_RANGE
+        with np.errstate(divide='ignore'):
+            coll_angles = abs(np.arcsin(np.minimum(0.95, r / cur_dists)))
         
         # other agent in front, zero out other agent's speed in the same direction
-        front_inds = np.where( (abs(agent_heading_2_other)<coll_angle) & \
-            (abs(heading_diff) < np.pi/2.0))[0]
-        if len(front_inds)>0:
-            # print other_agent_vels[front_inds,:].shape
-            # print other_agent_vels[front_inds,:].shape
-            # print np.matlib.repmat(np.linalg.norm(agent_vels[front_inds,:], axis=1),2,1).transpose().shape
-            # print agent_vels[front_inds,:].shape
-            dot_product = np.sum(agent_vels * other_agent_vels, axis=1)
+        if_front = (abs(agent_heading_2_other)<coll_angles) & \
+            (abs(heading_diff) < np.pi/2.0)
+        if np.any(if_front):
+            dot_product = np.sum(agent_vels[:,np.newaxis,:] * other_agents_vels, axis=2)
             valid_inds = np.where(agent_vels[:,0]>EPS)[0]
-            dot_product[valid_inds] /= np.linalg.norm(agent_vels[valid_inds,:], axis=1)
-            other_agent_vels[front_inds,:] = other_agent_vels[front_inds,:] -  \
-                np.matlib.repmat(dot_product[front_inds], 2, 1).transpose()\
-                * agent_vels[front_inds,:] / 2.0
+            dot_product[valid_inds,:] /= np.linalg.norm(agent_vels[valid_inds,:], axis=1)[:,np.newaxis]
+            agent_vels_rep = np.broadcast_to(agent_vels[:,np.newaxis,:], other_agents_vels.shape)
+            other_agents_vels[if_front,:] = other_agents_vels[if_front,:] -  \
+                dot_product[if_front][:,np.newaxis] * agent_vels_rep[if_front,:] / 2.0
 
         # analytical version
-        x1 = agent_state[0:2]                      # shape = (2,)
-        x2 = x1 + min(1.0, delta_t) * agent_vels             # shape = (num_actions, 2)
-        y1 = other_agent_state[0:2]                # shape = (2,)
-        y2 = y1 + min(1.0, delta_t) * other_agent_vels     # shape = (num_actions, 2)
-        # end points
-        # if np.linalg.norm(x1-y1) < radius:
-        #   return np.ones((num_actions,), dtype=bool)
-        # if_collide = np.linalg.norm(x2-y2, axis=1) < radius
-
-        # # critical points (where d/dt = 0)
-        # z_bar = (x2 - x1) - (y2 - y1)             # shape = (num_actions, 2)
-        # inds = np.where((np.linalg.norm(z_bar,axis=1)>0) & (if_collide == False))[0]
-        # t_bar = - np.sum((x1-y1) * z_bar[inds,:], axis=1) \
-        #       / np.sum(z_bar[inds,:] * z_bar[inds,:], axis=1)
-        # t_bar_rep = np.matlib.repmat(t_bar, 2, 1).transpose()
-        # dist_bar = np.linalg.norm(x1 + (x2[inds,:]-x1) * t_bar_rep \
-        #         - y1 - (y2-y1) * t_bar_rep, axis=1)
-        # if_collide[inds] = np.logical_and(np.logical_and(dist_bar < radius,  t_bar > 0), t_bar < 1.0) 
-
+        x1 = agent_state[0:2]                                                   # shape = (2,)
+        x2 = x1 + min(1.0, delta_t) * agent_vels[:,np.newaxis,:]                # shape = (num_actions, 1, 2)
+        y1 = other_agents_state[:,0:2]                                          # shape = (num_others, 2)
+        y2 = y1 + min(1.0, delta_t) * other_agents_vels                         # shape = (num_actions, num_others, 2)
         min_dists = gen_tc.find_dist_between_segs(x1, x2, y1, y2)
 
         # min_dists = min_dists - 0.03 * np.random.random(min_dists.shape)
@@ -1539,23 +1582,14 @@ class NN_navigation_value:
         # back_inds = np.setdiff1d(back_inds, front_inds)
         # min_dists[back_inds] += GETTING_CLOSE_RANGE
 
-
-
-        # print find_dist_between_segs(x1, x2, y1, y2)
-        # print if_collide_2
-        # print radius
-        # print if_collide
-        # print if_collide - if_collide_2
-        # assert(np.all(if_collide == if_collide_2))
-        cur_dist = np.linalg.norm(x1-y1)
-        if cur_dist < radius:
-            if_collide[:] = True
-        else:
-            if_collide = min_dists < radius
+        if_collide = (cur_dists < radius) | (min_dists < radius)
         # dist_future = x2 - (0.75 * y1 + 0.25 * y2)
         # dist_future = np.linalg.norm(dist_future, axis=1)
         # min_dists = np.minimum(dist_future, min_dists)
         min_dists = min_dists - radius
+        # default to no collision with the agents that are too far away
+        min_dists[:,if_far] = radius[if_far] + GETTING_CLOSE_RANGE + EPS
+        if_collide[:,if_far] = False
         return min_dists, if_collide
 
         # sampling vector version
@@ -1631,17 +1665,21 @@ class NN_navigation_value:
                 agent_states, other_agents_state, self.num_agents)
 
             # print 'states_nn[0,:]', states_nn[0,:]
-            values = np.squeeze(self.nn.make_prediction_raw(states_nn).clip(min=-0.25, max=1.0))
-            # print 'states_nn', states_nn
-            # print 'before, values', values
-            upper_bnd = GAMMA ** (states_nn[:,0] / DT_NORMAL)
-            # print 'upper_bnd', upper_bnd
-            # print 'values', values
-            values = np.minimum(upper_bnd, values)
-            # print 'values[-1]', values
-            # raw_input()
-
-            return values
+            return self.find_states_nn_values(states_nn)
+
+    # values of states already in the network's (agent-centric) form, one per row
+    def find_states_nn_values(self, states_nn):
+        values = np.squeeze(self.nn.make_prediction_raw(states_nn).clip(min=-0.25, max=1.0))
+        # print 'states_nn', states_nn
+        # print 'before, values', values
+        upper_bnd = GAMMA ** (states_nn[:,0] / DT_NORMAL)
+        # print 'upper_bnd', upper_bnd
+        # print 'values', values
+        values = np.minimum(upper_bnd, values)
+        # print 'values[-1]', values
+        # raw_input()
+
+        return values
 
 
     def find_agent_next_state(self, agent_state, other_agents_state, \
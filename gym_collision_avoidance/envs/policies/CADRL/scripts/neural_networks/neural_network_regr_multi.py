@@ -20,6 +20,7 @@ class Neural_network_regr_multi:
 		self.set_training_param(nn_training_param)
 		self.plotting_func = plotting_func
 		self.X_vis = X_vis
+		self.max_pool_indices = None
 
 
 	# layer_info = [[num_types, nodes_per_type], [num_types, nodes_per_type]]
@@ -49,6 +50,7 @@ class Neural_network_regr_multi:
 		self.output_dim_weights = np.ones((self.output_dim,))
 		self.output_avg_vec = np.zeros((self.output_dim,))
 		self.output_std_vec = np.zeros((self.output_dim,))
+		self.max_pool_indices = None
 		# self.print_nn()
 
 
@@ -106,6 +108,7 @@ class Neural_network_regr_multi:
 		# self.print_nn()
 		self.output_dim_weights = np.ones((self.output_dim,))
 		self.load_symBlocks()
+		self.max_pool_indices = None
 		return
 
 	def set_plotting_func(self, func, X_vis):
@@ -431,33 +434,25 @@ class Neural_network_regr_multi:
 		# raw_input()
 
 	# scale X (xRaw_2_x)
+	# (one example per row, or any (..., input_dim) array)
 	def xRaw_2_x(self, X_raw):
-		if len(X_raw.shape) > 1:
-			nb_examples = X_raw.shape[0]
-		else:
-			nb_examples = 1
-		X = (X_raw - np.matlib.repmat(self.avg_vec, nb_examples, 1)) \
-			/ np.matlib.repmat(self.std_vec, nb_examples, 1)
+		if len(X_raw.shape) == 1:
+			X_raw = X_raw[np.newaxis,:]
+		X = (X_raw - self.avg_vec) / self.std_vec
 		return X
 
 	# scale Y (yRaw_2_y)
 	def yRaw_2_y(self, Y_raw):
-		if len(Y_raw.shape) > 1:
-			nb_examples = Y_raw.shape[0]
-		else:
-			nb_examples = 1
-		Y = (Y_raw - np.matlib.repmat(self.output_avg_vec, nb_examples, 1)) \
-			/ np.matlib.repmat(self.output_std_vec, nb_examples, 1)
+		if len(Y_raw.shape) == 1:
+			Y_raw = Y_raw[np.newaxis,:]
+		Y = (Y_raw - self.output_avg_vec) / self.output_std_vec
 		return Y
 
 	# scale Y (y_2_yraw)
 	def y_2_yRaw(self, Y):
-		if len(Y.shape) > 1:
-			nb_examples = Y.shape[0]
-		else:
-			nb_examples = 1
-		Y_raw = Y * np.matlib.repmat(self.output_std_vec, nb_examples, 1) \
-			+ np.matlib.repmat(self.output_avg_vec, nb_examples, 1)
+		if len(Y.shape) == 1:
+			Y = Y[np.newaxis,:]
+		Y_raw = Y * self.output_std_vec + self.output_avg_vec
 		return Y_raw
 
 	# back propagation
@@ -717,12 +712,36 @@ class Neural_network_regr_multi:
 		discrete_loss = (Y.squeeze() > 0.25).sum() / float(Y.shape[0])
 		return discrete_loss, sqloss
 
+	# columns pooled by each 'max' layer: np.max(out[:,self.max_pool_indices[layer]], axis=2)
+	# is the max over the agents of each type (computed once per network)
+	def compute_max_pool_indices(self):
+		self.max_pool_indices = dict()
+		for layer, layer_type in enumerate(self.multiagent_net_param.layers_type):
+			if layer_type != 'max':
+				continue
+			layer_info = self.multiagent_net_param.layers_info[layer]
+			max_num_agents = np.max(layer_info[:,0])
+			indices = []
+			cur_s_ind = 0
+			for ii in range(layer_info.shape[0]):
+				num_agents = layer_info[ii,0]
+				stride = layer_info[ii,1]
+				# block[j,k] = column of node j of the kth agent of this type
+				block = cur_s_ind + np.reshape(np.arange(num_agents * stride), (num_agents, stride)).transpose()
+				# types with fewer agents repeat their first agent (which doesn't change the max)
+				block = np.hstack((block, np.repeat(block[:,0:1], max_num_agents - num_agents, axis=1)))
+				indices.append(block)
+				cur_s_ind += num_agents * stride
+			self.max_pool_indices[layer] = np.vstack(indices).astype(int)
+
+	# X: one example per row, a single example, or any (..., input_dim) array
+	# (e.g., num_agents x num_actions x input_dim), predicted in one pass
 	def make_prediction(self, X):
 		if len(X.shape) > 1:
-			nb_examples = X.shape[0]
+			batch_shape = X.shape[:-1]
 		else:
-			nb_examples = 1
-			X = X[np.newaxis,:]
+			batch_shape = (1,)
+		X = np.reshape(X, (-1, X.shape[-1]))
 
 		if_nn_nav = False
 		# if X.shape[1] >= 7 + 8 and (X.shape[1] - 7 ) % 8 == 0:
@@ -739,61 +758,20 @@ class Neural_network_regr_multi:
 		# 			print X[inds, 7+8*(i-1):7+(8*i)]
 		# 			assert(0)
 
+		if self.max_pool_indices is None:
+			self.compute_max_pool_indices()
+
 		nb_layers = self.num_hidden_layers + 1
 		out = X
 		for layer in range(nb_layers-1):
 			if self.multiagent_net_param.layers_type[layer] == 'conn':
-				tmp = np.dot(out, self.W[layer]) \
-					+ np.matlib.repmat(self.b[layer], nb_examples, 1)
+				tmp = np.dot(out, self.W[layer]) + self.b[layer]
 				out = tmp * (tmp>0)
 			elif self.multiagent_net_param.layers_type[layer] == 'max':
-				num_pts = out.shape[0]
-				next_layer_size = np.sum(self.multiagent_net_param.layers_info[layer][:,1])
-				out_next = np.zeros((num_pts, np.sum(next_layer_size)))
-				if num_pts == 0:
-					out = out_next
-					continue
-				cur_s_ind = 0
-				next_s_ind = 0
-				for ii in range(self.multiagent_net_param.layers_info[layer].shape[0]):
-					num_agents = self.multiagent_net_param.layers_info[layer][ii,0]
-					stride = self.multiagent_net_param.layers_info[layer][ii,1]
-					cur_e_ind = cur_s_ind + num_agents * stride
-					next_e_ind = next_s_ind + stride
-					# print '---'
-					# print out[:,cur_s_ind:cur_e_ind].shape
-					# # print block_form.shape
-					# print 'num_pts,', num_pts
-					# print out_next[:,next_s_ind:next_e_ind].shape
-					block_form = np.reshape(out[:,cur_s_ind:cur_e_ind], (num_pts,-1,stride))
-					# print out[:,cur_s_ind:cur_e_ind].shape
-					# print block_form.shape
-					# print 'num_pts,', num_pts
-					# print forward_prop_o[layer][:,next_s_ind:next_e_ind].shape
-					out_next[:,next_s_ind:next_e_ind] = \
-						np.max(block_form, axis=1)
-					cur_s_ind = cur_e_ind
-					next_s_ind = next_e_ind
-
-					# print 'layer', layer
-					# print 'out', out
-					# print 'out_next', out_next
-
-				out = out_next
-				# raw_input()
-
-			# if if_nn_nav == True and self.multiagent_net_param.layers_info[layer+1].shape[0] == 2:
-			# 	stride = self.multiagent_net_param.layers_info[layer+1][1,1]
-			# 	start_ind = self.multiagent_net_param.layers_info[layer+1][0,1]
-			# 	for tt in range(num_other_agents):
-			# 		out[agent_off_indices[tt],start_ind:start_ind+stride] = 0
-			# 		start_ind += stride
-
-
+				out = np.max(out[:,self.max_pool_indices[layer]], axis=2)
 
-		y_hat = np.dot(out, self.W[nb_layers-1]) + \
-					 np.matlib.repmat(self.b[nb_layers-1], nb_examples, 1)
-		return y_hat
+		y_hat = np.dot(out, self.W[nb_layers-1]) + self.b[nb_layers-1]
+		return np.reshape(y_hat, batch_shape + (y_hat.shape[-1],))
 
 	def compute_sqloss(self, Y_hat, Y):	
 		# print Y_hat
@@ -2,6 +2,7 @@ import numpy as np
 import os
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs.policies.CADRL.scripts.multi import nn_navigation_value_multi as nn_nav
+from gym_collision_avoidance.envs.policies.ModelRegistry import model_registry
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs import util
 
@@ -27,7 +28,10 @@ class CADRLPolicy(InternalPolicy):
         # mode = 'rotate_constr'; passing_side = 'right'; iteration = 1300
         mode = 'no_constr'; passing_side = 'none'; iteration = 1000
         filename="%d_agents_policy_iter_"%num_agents + str(iteration) + ".p"
-        self.value_net = nn_nav.load_NN_navigation_value(file_dir, num_agents, mode, passing_side, filename=filename, ifPrint=False)
+        # (loaded once, shared by every CADRLPolicy)
+        nn_filename = file_dir + "/../../pickle_files/multi/" + mode + "_" + passing_side + "/RL_selfplay/" + filename
+        self.value_net = model_registry.acquire(self, nn_filename, 'cpu',
+            lambda: nn_nav.load_NN_navigation_value(file_dir, num_agents, mode, passing_side, filename=filename, ifPrint=False))
 
     def find_next_action(self, obs, agents, agent_index, full_agent_list = None, active_agent_mask = None):
         """ Converts environment's agents representation to CADRL format, then queries NN
@@ -54,6 +58,44 @@ class CADRLPolicy(InternalPolicy):
         action = self.query_and_rescale_action(host_agent, agent_state, other_agents_state, other_agents_actions)
         return action
 
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Same as :code:`find_next_action` for each of agent_indices, but the next states of every agent's feasible actions
+        go through the value network in one query per network, instead of one per agent.
+
+        Args:
+            obs_list (list): [unused]
+            agents (list): of :class:`~gym_collision_avoidance.envs.agent.Agent` objects
+            agent_indices (list): indices (in agents) of the agents with a CADRLPolicy
+            active_agent_mask (list): whether each agent in agents is active
+
+        Returns:
+            np array of shape (len(agent_indices), 2)... [spd, heading change] per agent
+
+        """
+        active_agent_inds = np.cumsum(active_agent_mask) - 1 # index of each agent within the active agents
+        active_agents = list(compress(agents, active_agent_mask))
+
+        # agents usually share one value_net (through the model registry), but could have loaded different checkpoints
+        parsed_agents_per_net = {}
+        actions = np.zeros((len(agent_indices), 2))
+        for row, i in enumerate(agent_indices):
+            host_agent, agent_state, other_agents_state, other_agents_actions = self.parse_agents(active_agents, active_agent_inds[i])
+            if len(other_agents_state) == 0:
+                actions[row, :] = self.query_and_rescale_action(host_agent, agent_state, other_agents_state, other_agents_actions)
+                continue
+            parsed_agents_per_net.setdefault(id(agents[i].policy.value_net), []).append(
+                (row, host_agent, agent_state, other_agents_state, other_agents_actions))
+
+        for parsed_agents in parsed_agents_per_net.values():
+            host_agents = [parsed[1] for parsed in parsed_agents]
+            value_net = host_agents[0].policy.value_net
+            net_actions = value_net.find_next_actions([parsed[2] for parsed in parsed_agents],
+                [parsed[3] for parsed in parsed_agents], [parsed[4] for parsed in parsed_agents])
+            for parsed, host_agent, action in zip(parsed_agents, host_agents, net_actions):
+                actions[parsed[0], 0] = action[0]
+                actions[parsed[0], 1] = util.wrap(action[1]-host_agent.heading_global_frame)
+        return actions
+
     def find_next_action_and_value(self, obs, agents, i):
         """ Same as find_next_action but also queries value fn """
         host_agent, agent_state, other_agents_state, other_agents_actions = self.parse_agents(agents, i)
@@ -12,6 +12,8 @@ import torch.distributions.multivariate_normal as torchdist
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.ScenePredictionCache import scene_prediction_cache
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
 
 
 import copy
@@ -83,8 +85,6 @@ class CVMPolicy(InternalPolicy):
     def init(self,agents):
  
         self.total_agents_num = [None]*self.n_agents
-        self.agent_pos_x = [None]*self.n_agents
-        self.agent_pos_y = [None]*self.n_agents
 
         self.near_goal_threshold = 0.5
 
@@ -116,35 +116,7 @@ class CVMPolicy(InternalPolicy):
 
         #if agents[0].step_num % 4 != 0: return [ agents[agent_index].speed_global_frame , 0 ] #agents[agent_index].delta_heading_global_frame ]
 
-        #print("self.agent_pos_x")
-        #print(self.agent_pos_x)
-
-        #handle new agents due to dynamic number of agents, append length to make room for new agent, (use None for placeholder for newly added)
-        if len(self.agent_pos_x)< self.n_agents:
-            length_diff  = self.n_agents - len(self.agent_pos_x)
-            #print("proceed to add "+str(length_diff))
-            for add in range(length_diff):
-                #print("add "+str(1+add))
-                self.agent_pos_x.append( None )
-                self.agent_pos_y.append( None )
-
-        #print("AFTER self.agent_pos_x")
-        #print(self.agent_pos_x)
-       
-
-        for i in range(self.n_agents):
-            # Copy current agent positions, goal and preferred speeds into np array
-
-            if self.agent_pos_x[i] is None:
-                self.agent_pos_x[i] =   [ agents[i].pos_global_frame[0] ]
-            else:
-                self.agent_pos_x[i] +=  [ agents[i].pos_global_frame[0] ]
-            
-            if self.agent_pos_y[i] is None:
-                self.agent_pos_y[i] =   [ agents[i].pos_global_frame[1] ]
-            else:
-                self.agent_pos_y[i] +=  [ agents[i].pos_global_frame[1] ]
-
+        #positions of every agent are recorded by the env each timestep (see TrajectoryHistory)
 
         if ( agents[agent_index].step_num - agents[agent_index].start_step_num ) <= 3:
 
@@ -176,63 +148,79 @@ class CVMPolicy(InternalPolicy):
             #print(action)
             return action
   
-        #New agent history appended, but since the dimension might be less than already existed agent, add nan to make dimension regular.
-        self.fill_agent_pos_x = self.agent_pos_x
-        self.fill_agent_pos_y = self.agent_pos_y
+        #The prediction only depends on the scene history (not on which agent is asking),
+        #so it is computed once per timestep and shared by every agent running this policy
+        prediction = scene_prediction_cache.get_prediction(self, full_agent_list, active_agent_mask, self.predict_scene)
 
-        #print("self.fill_agent_pos_x")
-        #print(self.fill_agent_pos_x)
+        #if only target agent present, no other agent exist in observation
+        if prediction is None: return np.array([0,0])
 
-        #print("number ",self.n_agents)
-        for i in range(self.n_agents):
-           
-            #print("FIRST is ",len(self.fill_agent_pos_x[0]))
-            #print(self.fill_agent_pos_x[0])
-            #print("THIS  is ",len(self.fill_agent_pos_x[i]))
-            #print(self.fill_agent_pos_x[i])
+        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
+        before_index = np.array(active_agent_mask)[:agent_index]
 
-            
-            #here we assume the existed (oldest, first) agent history array is the longest  #this assumption will lead to problem
-            #if len(self.fill_agent_pos_x[0]) > len(self.fill_agent_pos_x[i]):
-            if len(max(self.fill_agent_pos_x, key=len)) > len(self.fill_agent_pos_x[i]):
-                
-                #length_diff  = len(self.fill_agent_pos_x[0]) - len(self.fill_agent_pos_x[i])
-                length_diff  = len(max(self.fill_agent_pos_x, key=len)) - len(self.fill_agent_pos_x[i])
-                for add in range(length_diff):
-                    #print("INSERT "+str(add+1))
-                    self.fill_agent_pos_x[i].insert( 0 , np.nan )
-                    self.fill_agent_pos_y[i].insert( 0 , np.nan ) 
+        #see how many non active agents are before index,  minus them calculate index shift
+        agent_index = agent_index - len( before_index[ before_index==False ] )
+
+        agents = list(compress(agents, active_agent_mask))
 
+        prediction_index = 0 #3 better in 10x10 #2 original test
+        self.next_waypoint = prediction[agent_index][prediction_index]
         
-            
-        #Only take the latest 8 observation #test[:,-8:]
-        #select every 4 element from the end,    reverse it, and select the latest 8 entry
-        #if agents[0].step_num % 2 != 0: return [ agents[agent_index].speed_global_frame , 0 ]
+        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
+        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
+        if self.dist_to_goal > 1e-8:
+            ref_prll = goal_direction / agents[agent_index].dist_to_goal
+        else:
+            ref_prll = goal_direction
+        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
 
+        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
+                                                 ref_prll[0])
+        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
+                                      ref_prll_angle_global_frame)
 
-        
-        
-        #observation_x_input = np.array( self.agent_pos_x )[:,::-4][:,::-1][:,-8:]
-        #observation_y_input = np.array( self.agent_pos_y )[:,::-4][:,::-1][:,-8:]
+    
 
-        #print("active agent mask")
-        #print(active_agent_mask)
+        vel_global_frame = (( self.next_waypoint - agents[agent_index].pos_global_frame)/4) / agents[agent_index].dt_nominal
 
-        #print("before mask")
-        #print(np.array( self.fill_agent_pos_x )[:,::-4][:,::-1][:,-8:])
+        speed_global_frame = np.linalg.norm(vel_global_frame) 
+        #print("calc speed")
+        #print(speed_global_frame)
+        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
 
-        observation_x_input = np.array( self.fill_agent_pos_x )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
-        observation_y_input = np.array( self.fill_agent_pos_y )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
+        if speed_global_frame > 1.5: speed_global_frame = 1.5
+        if speed_global_frame < 0.5: speed_global_frame = 0.5
 
-        #print("after mask")
-        #print(observation_x_input)
+        #But in reality, the format of action is [speed, heading_delta]
 
+        #CVM
+        action = np.array([agents[agent_index].pref_speed, -heading_ego_frame])
 
-        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
-        before_index = np.array(active_agent_mask)[:agent_index]
+        #action = np.array([speed_global_frame, -heading_ego_frame])
+        #print("action")
+        #print(action)
+       
+        return action
 
-        #see how many non active agents are before index,  minus them calculate index shift
-        agent_index = agent_index - len( before_index[ before_index==False ] )
+    def predict_scene(self, agents, active_agent_mask):
+        """ Predict the future trajectory of every active agent from the recorded scene history.
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment (incl. inactive ones)
+            active_agent_mask (np array): (len(agents),) bool, True for agents that are still in the scene
+
+        Returns:
+            prediction (np array): (num_active_agents, obs_pred_len, 2) predicted positions, or None if there is only one active agent
+        """
+        self.n_agents = len(agents)
+
+        #Only take the latest 8 observation, one every 4 steps (NaN before an agent entered the scene)
+        recent_positions = trajectory_history.get_recent(np.flatnonzero(active_agent_mask), self.obs_seq_len, 4)
+        observation_x_input = recent_positions[:,:,0]
+        observation_y_input = recent_positions[:,:,1]
+
+        #print("after mask")
+        #print(observation_x_input)
 
         #assign new number of agents because of active_agent_mask
         self.n_agents = len(observation_x_input)
@@ -266,8 +254,8 @@ class CVMPolicy(InternalPolicy):
             #temp_x = np.where( ~np.isnan(observation_x_input[agent_ind]) , observation_x_input[agent_ind] , 0)
             #temp_y = np.where( ~np.isnan(observation_y_input[agent_ind]) , observation_y_input[agent_ind] , 0)
 
-            temp_x = np.array(  [x for x in observation_x_input[agent_ind] if str(x) != 'nan']   )
-            temp_y = np.array(  [x for x in observation_y_input[agent_ind] if str(x) != 'nan']   )            
+            temp_x = observation_x_input[agent_ind][ ~np.isnan(observation_x_input[agent_ind]) ]
+            temp_y = observation_y_input[agent_ind][ ~np.isnan(observation_y_input[agent_ind]) ]            
 
                 
             observation_len = len(temp_x)
@@ -340,7 +328,7 @@ class CVMPolicy(InternalPolicy):
         #observation_x_input = combined_history_x  #observation_x_input[:,0][:,None]
         #observation_y_input = combined_history_y  #observation_y_input[:,0][:,None]
         
-        if observation_x_input.shape[0]==1: return np.array([0,0])
+        if observation_x_input.shape[0]==1: return None
 
 
 
@@ -374,43 +362,5 @@ class CVMPolicy(InternalPolicy):
 ##        print(prediction.shape)
 ##
 ##        print(prediction)
-        
 
-        prediction_index = 0 #3 better in 10x10 #2 original test
-        self.next_waypoint = prediction[agent_index][prediction_index]
-        
-        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
-        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
-        if self.dist_to_goal > 1e-8:
-            ref_prll = goal_direction / agents[agent_index].dist_to_goal
-        else:
-            ref_prll = goal_direction
-        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
-
-        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
-                                                 ref_prll[0])
-        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
-                                      ref_prll_angle_global_frame)
-
-    
-
-        vel_global_frame = (( self.next_waypoint - agents[agent_index].pos_global_frame)/4) / agents[agent_index].dt_nominal
-
-        speed_global_frame = np.linalg.norm(vel_global_frame) 
-        #print("calc speed")
-        #print(speed_global_frame)
-        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
-
-        if speed_global_frame > 1.5: speed_global_frame = 1.5
-        if speed_global_frame < 0.5: speed_global_frame = 0.5
-
-        #But in reality, the format of action is [speed, heading_delta]
-
-        #CVM
-        action = np.array([agents[agent_index].pref_speed, -heading_ego_frame])
-
-        #action = np.array([speed_global_frame, -heading_ego_frame])
-        #print("action")
-        #print(action)
-       
-        return action
+        return prediction
@@ -4,6 +4,7 @@ import operator
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import util
 from gym_collision_avoidance.envs.policies.GA3C_CADRL import network
+from gym_collision_avoidance.envs.policies.ModelRegistry import model_registry
 from gym_collision_avoidance.envs import Config
 
 class GA3CCADRLPolicy(InternalPolicy):
@@ -23,6 +24,8 @@ class GA3CCADRLPolicy(InternalPolicy):
     def initialize_network(self, **kwargs):
         """ Load the model parameters of either a default file, or if provided through kwargs, a specific path and/or tensorflow checkpoint.
 
+        The loaded network (tf graph & session) is shared with every other GA3CCADRLPolicy using the same checkpoint (see :class:`~gym_collision_avoidance.envs.policies.ModelRegistry.ModelRegistry`).
+
         Args:
             kwargs['checkpt_name'] (str): name of checkpoint file to load (without file extension)
             kwargs['checkpt_dir'] (str): path to checkpoint
@@ -44,7 +47,13 @@ class GA3CCADRLPolicy(InternalPolicy):
         else:
             checkpt_dir = os.path.dirname(os.path.realpath(__file__)) + '/GA3C_CADRL/checkpoints/IROS18/'
 
-        self.nn.simple_load(checkpt_dir + checkpt_name)
+        self.nn = model_registry.acquire(self, checkpt_dir + checkpt_name + '.meta', self.device,
+                                         lambda: self.load_network(checkpt_dir + checkpt_name))
+
+    def load_network(self, filename):
+        nn = network.NetworkVP_rnn(self.device, 'network', self.possible_actions.num_actions)
+        nn.simple_load(filename)
+        return nn
 
     def find_next_action(self, obs, agents, i):
         """ Using only the dictionary obs, convert this to the vector needed for the GA3C-CADRL network, query the network, adjust the actions for this env.
@@ -67,11 +76,7 @@ class GA3CCADRLPolicy(InternalPolicy):
 
         if type(obs) == dict:
             # Turn the dict observation into a flattened vector
-            vec_obs = np.array([])
-            for state in Config.STATES_IN_OBS:
-                if state not in Config.STATES_NOT_USED_IN_POLICY:
-                    vec_obs = np.hstack([vec_obs, obs[state].flatten()])
-            vec_obs = np.expand_dims(vec_obs, axis=0)
+            vec_obs = np.expand_dims(self.obs_to_vec(obs), axis=0)
 
         # print(obs)
         # print(vec_obs)
@@ -83,6 +88,41 @@ class GA3CCADRLPolicy(InternalPolicy):
         action = np.array([pref_speed*raw_action[0], raw_action[1]])
         return action
 
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Same as :code:`find_next_action` for each of agent_indices, but with one network query (sess.run) per network
+        for the whole batch of observations, instead of one per agent.
+
+        Args:
+            obs_list (list): each agent's dict observation (same order as agent_indices)
+            agents (list): of :class:`~gym_collision_avoidance.envs.agent.Agent` objects
+            agent_indices (list): indices (in agents) of the agents with a GA3CCADRLPolicy
+            active_agent_mask (list): [unused]
+
+        Returns:
+            np array of shape (len(agent_indices), 2)... [spd, heading change] per agent
+
+        """
+        # agents usually share one network (through the model registry), but could have loaded different checkpoints
+        rows_per_nn = {}
+        for row, i in enumerate(agent_indices):
+            rows_per_nn.setdefault(id(agents[i].policy.nn), []).append(row)
+
+        actions = np.zeros((len(agent_indices), 2))
+        for rows in rows_per_nn.values():
+            policy = agents[agent_indices[rows[0]]].policy
+            vec_obs = np.array([self.obs_to_vec(obs_list[row]) for row in rows])
+            action_indices = np.argmax(policy.nn.predict_p(vec_obs), axis=1)
+            raw_actions = policy.possible_actions.actions[action_indices]
+            pref_speeds = np.array([obs_list[row]['pref_speed'] for row in rows]).reshape(-1)
+            actions[rows, 0] = pref_speeds*raw_actions[:, 0]
+            actions[rows, 1] = raw_actions[:, 1]
+        return actions
+
+    def obs_to_vec(self, obs):
+        """ Flatten the dict observation (:code:`Config.STATES_IN_OBS`, minus :code:`Config.STATES_NOT_USED_IN_POLICY`) into one vector """
+        return np.concatenate([np.asarray(obs[state], dtype=np.float64).flatten() for state in Config.STATES_IN_OBS
+                               if state not in Config.STATES_NOT_USED_IN_POLICY])
+
     # def agents_to_ga3c_cadrl_state(self, host_agent, other_agents):
 
     #     obs = np.zeros((network.Config.FULL_LABELED_STATE_LENGTH))
@@ -71,6 +71,10 @@ class NetworkVPCore(object):
                 self.x = g.get_tensor_by_name('X:0')
                 self.v = g.get_tensor_by_name('Squeeze:0')
 
+    def close(self):
+        if hasattr(self, 'sess'):
+            self.sess.close()
+
 class NetworkVP_rnn(NetworkVPCore):
     def __init__(self, device, model_name, num_actions):
         super(self.__class__, self).__init__(device, model_name, num_actions)
@@ -16,6 +16,7 @@ torch.backends.cudnn.benchmark = True
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_checkpoint, inference_mode, inference_graph
 
 # ! pip install libsvm
 from libsvm.svmutil import *
@@ -42,9 +43,10 @@ class GROUPNAVIGANPolicy(InternalPolicy):
         
         self.is_init = False
 
-        self.checkpoint = torch.load('../envs/policies/Group_Navi_GAN/models/trackedgroup_zara1_batch64_epoch500_poolnet_with_model.pt', map_location='cuda:0')
+        self.device = get_torch_device()
+        self.checkpoint = load_checkpoint('../envs/policies/Group_Navi_GAN/models/trackedgroup_zara1_batch64_epoch500_poolnet_with_model.pt')
         self.model=svm_load_model('../envs/policies/Group_Navi_GAN/spencer/group/social_relationships/groups_probabilistic_small.model')
-        self.attention_generator = self.get_attention_generator(self.checkpoint)
+        self.attention_generator = inference_graph(self.get_attention_generator(self.checkpoint))
         self.discriminator = self.get_discriminator(self.checkpoint)
         self._args = AttrDict(self.checkpoint['args'])
         try:
@@ -84,7 +86,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
             discriminator.load_state_dict(checkpoint['d_best_state'])
         else:
             discriminator.load_state_dict(checkpoint['d_state'])
-        discriminator.cuda()
+        discriminator.to(self.device)
         discriminator.train()
         return discriminator
 
@@ -124,7 +126,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
             generator.load_state_dict(checkpoint['g_best_state'])
         else:
             generator.load_state_dict(checkpoint['g_state'])
-        generator.cuda()
+        generator.to(self.device)
         generator.train()
         return generator
 
@@ -149,7 +151,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
         count = 1
         guid = 0
         attention_generator.eval()
-        with torch.no_grad():
+        with inference_mode():
             D_real, D_fake = [], []
             #ade, fde = [], []
         
@@ -213,9 +215,9 @@ class GROUPNAVIGANPolicy(InternalPolicy):
         ############################
         # goal for predictive agent#
         ############################
-        goals = torch.ones([1, num_ped, 2], dtype=torch.float32).cuda()
-        goals_rel = torch.ones([1, num_ped, 2], dtype=torch.float32).cuda()
-        obs_delta = torch.zeros([4, num_ped, num_ped], dtype=torch.float32).cuda()
+        goals = torch.ones([1, num_ped, 2], dtype=torch.float32, device=self.device)
+        goals_rel = torch.ones([1, num_ped, 2], dtype=torch.float32, device=self.device)
+        obs_delta = torch.zeros([4, num_ped, num_ped], dtype=torch.float32, device=self.device)
 
         #################Calculate intermediate waypoints if the goal is too far#################
         goal = agents[agent_index].goal_global_frame#[20, 0]
@@ -306,7 +308,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
         ############################
 
 
-        obs_traj_rel = torch.ones([len_obs, num_ped, 2], dtype=torch.float32).cuda()
+        obs_traj_rel = torch.ones([len_obs, num_ped, 2], dtype=torch.float32, device=self.device)
 
         #================================================================#
         #agents_history = np.empty((num_ped, 999999, 2 ))
@@ -321,7 +323,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
 
         #============================================================#
             
-        obs_traj = torch.from_numpy( np.array( observation_input ).astype(np.float32) ).cuda()
+        obs_traj = torch.from_numpy( np.array( observation_input ).astype(np.float32) ).to(self.device)
         #obs_traj = torch.ones([len_obs, num_ped, 2], dtype=torch.float32).cuda()
 
         obs_traj_rel = obs_traj - obs_traj[0,:,:]
@@ -330,7 +332,7 @@ class GROUPNAVIGANPolicy(InternalPolicy):
 
 
         goals_rel = goals - obs_traj[0,:,:]
-        seq_start_end = torch.Tensor([[0,num_ped]]).to(torch.int64).cuda()
+        seq_start_end = torch.Tensor([[0,num_ped]]).to(torch.int64).to(self.device)
         if self._args.delta is True:
             
 
@@ -43,6 +43,7 @@ class CADRL(Policy):
         self.rotation_samples = None
         self.query_env = None
         self.action_space = None
+        self.action_array = None
         self.speeds = None
         self.rotations = None
         self.action_values = None
@@ -103,6 +104,8 @@ class CADRL(Policy):
         self.speeds = speeds
         self.rotations = rotations
         self.action_space = action_space
+        # (vx, vy) or (v, r) of each action, for propagating/evaluating all actions at once
+        self.action_array = np.array([(action.vx, action.vy) if holonomic else (action.v, action.r) for action in action_space])
 
     def point_to_segment_dist(self,x1, y1, x2, y2, x3, y3):
         """
@@ -128,6 +131,26 @@ class CADRL(Policy):
 
         return np.linalg.norm((x - x3, y-y3))
 
+    def point_to_segment_dist_batch(self, x1, y1, x2, y2, x3, y3):
+        """
+        Elementwise point_to_segment_dist, for arrays of segments/points (broadcast together)
+
+        """
+        px = x2 - x1
+        py = y2 - y1
+        norm_sq = px * px + py * py
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = np.clip(((x3 - x1) * px + (y3 - y1) * py) / norm_sq, 0, 1)
+        # zero-length segments: distance to the endpoint
+        u = np.where(norm_sq == 0, 0, u)
+
+        # (x, y) is the closest point to (x3, y3) on the line segment
+        x = x1 + u * px
+        y = y1 + u * py
+
+        return np.hypot(x - x3, y - y3)
+
     def propagate(self, state, action):
         if self.time_step == None:
             self.time_step = 0.2
@@ -159,6 +182,59 @@ class CADRL(Policy):
 
         return next_state
 
+    def propagate_actions(self, state):
+        """
+        Batched version of propagate, for the current agent's FullState and every action in action_space
+
+        :return: (# actions, 9) array of next FullState fields (px, py, vx, vy, radius, gx, gy, v_pref, theta)
+        """
+        if self.time_step == None:
+            self.time_step = 0.2
+        num_actions = len(self.action_array)
+        next_states = np.empty((num_actions, 9))
+        if self.kinematics == 'holonomic':
+            next_vx, next_vy = self.action_array[:, 0], self.action_array[:, 1]
+            next_theta = state.theta
+        else:
+            next_theta = state.theta + self.action_array[:, 1]
+            next_vx = self.action_array[:, 0] * np.cos(next_theta)
+            next_vy = self.action_array[:, 0] * np.sin(next_theta)
+        next_states[:, 0] = state.px + next_vx * self.time_step
+        next_states[:, 1] = state.py + next_vy * self.time_step
+        next_states[:, 2] = next_vx
+        next_states[:, 3] = next_vy
+        next_states[:, 4] = state.radius
+        next_states[:, 5] = state.gx
+        next_states[:, 6] = state.gy
+        next_states[:, 7] = state.v_pref
+        next_states[:, 8] = next_theta
+        return next_states
+
+    def build_batch_next_states(self, next_self_states, next_human_states):
+        """
+        Joint state of every (action, human) pair, as one tensor
+
+        :param next_self_states: (# actions, 9) array from propagate_actions
+        :param next_human_states: list of ObservableState (same for every action)
+        :return: tensor of shape (# actions, # humans, 14)
+        """
+        humans = np.array([(human.px, human.py, human.vx, human.vy, human.radius) for human in next_human_states]).reshape((-1, 5))
+        num_actions, num_humans = len(next_self_states), len(humans)
+        batch_next_states = np.concatenate([np.repeat(next_self_states[:, np.newaxis, :], num_humans, axis=1),
+                                            np.repeat(humans[np.newaxis, :, :], num_actions, axis=0)], axis=2)
+        return torch.Tensor(batch_next_states).to(self.device)
+
+    def reward_action_velocities(self, next_self_states):
+        """
+        Velocity of the agent under each action, as used by predict_reward
+
+        """
+        if self.kinematics == 'holonomic':
+            return self.action_array
+        # predict_reward rotates by action.r on top of the already propagated theta
+        heading = self.action_array[:, 1] + next_self_states[:, 8]
+        return self.action_array[:, 0:1] * np.stack([np.cos(heading), np.sin(heading)], axis=1)
+
     def predict(self, state):
         """
         Input state is the joint state of robot concatenated by the observable state of other agents
@@ -167,7 +243,7 @@ class CADRL(Policy):
         thus the reward function is needed
 
         """
-        print("predict")
+        logging.debug("predict")
         if self.phase is None or self.device is None:
             raise AttributeError('Phase, device attributes have to be set!')
         if self.phase == 'train' and self.epsilon is None:
@@ -180,33 +256,27 @@ class CADRL(Policy):
 
         probability = np.random.random()
         if self.phase == 'train' and probability < self.epsilon:
-            print("random action, eps: ", self.epsilon)
+            logging.debug("random action, eps: %s", self.epsilon)
             max_action = self.action_space[np.random.choice(len(self.action_space))]
         else:
-            print("predicted action")
-            self.action_values = list()
-            max_min_value = float('-inf')
-            max_action = None
-            for action in self.action_space:
-                next_self_state = self.propagate(state.self_state, action)
-                ob = self.next_step_lookahead
-                # print("ob: ", ob)
-                reward = self.predict_reward(next_self_state, ob[0], action)
-
-                batch_next_states = torch.cat([torch.Tensor([next_self_state + next_human_state]).to(self.device)
-                                              for next_human_state in ob[0]], dim=0)
-                # VALUE UPDATE
-                outputs = self.model(self.rotate(batch_next_states))
-                min_output, min_index = torch.min(outputs, 0)
-                min_value = reward + pow(self.gamma, self.time_step * state.self_state.v_pref) * min_output.data.item()
-                self.action_values.append(min_value)
-                if min_value > max_min_value:
-                    max_min_value = min_value
-                    max_action = action
+            logging.debug("predicted action")
+            # evaluate every action in one forward pass: (# actions x # humans) joint states
+            next_self_states = self.propagate_actions(state.self_state)
+            ob = self.next_step_lookahead
+            rewards = self.predict_rewards(next_self_states, ob[0], self.reward_action_velocities(next_self_states))
+
+            batch_next_states = self.build_batch_next_states(next_self_states, ob[0])
+            num_actions, num_humans = batch_next_states.shape[:2]
+            # VALUE UPDATE
+            outputs = self.model(self.rotate(batch_next_states.view(num_actions * num_humans, -1)))
+            min_outputs = torch.min(outputs.view(num_actions, num_humans), 1)[0].data.cpu().numpy()
+            values = rewards + pow(self.gamma, self.time_step * state.self_state.v_pref) * min_outputs
+            self.action_values = values.tolist()
+            max_action = self.action_space[int(np.argmax(values))]
 
         if self.phase == 'train':
             self.last_state = self.transform(state)
-        print("selected action", max_action)
+        logging.debug("selected action %s", max_action)
         return max_action
 
     def transform(self, state):
@@ -216,7 +286,7 @@ class CADRL(Policy):
         :param state:
         :return: tensor of shape (len(state), )
         """
-        print("len state: ", state.human_states)
+        logging.debug("len state: %s", state.human_states)
         # assert len(state.human_states) == 1 
         state = torch.Tensor(state.self_state + state.human_states[0]).to(self.device)
         state = self.rotate(state.unsqueeze(0)).squeeze(dim=0)
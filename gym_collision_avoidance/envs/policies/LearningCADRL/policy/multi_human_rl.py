@@ -24,38 +24,34 @@ class MultiHumanRL(CADRL):
         if self.action_space is None:
             self.build_action_space(state.self_state.v_pref)
 
-        occupancy_maps = None
         probability = np.random.random()
         if self.phase == 'train' and probability < self.epsilon:
             max_action = self.action_space[np.random.choice(len(self.action_space))]
         else:
-            self.action_values = list()
-            max_value = float('-inf')
+            # evaluate every action in one forward pass: (# actions, # humans, rotated joint state length)
+            next_self_states = self.propagate_actions(state.self_state)
+            if self.query_env:
+                next_human_states = self.next_step_lookahead[0]
+                rewards = self.predict_rewards(next_self_states, next_human_states,
+                                               self.reward_action_velocities(next_self_states))
+            else:
+                next_human_states = [self.propagate(human_state, ActionXY(human_state.vx, human_state.vy))
+                                   for human_state in state.human_states]
+                rewards = self.compute_rewards(next_self_states, next_human_states)
+            batch_next_states = self.build_batch_next_states(next_self_states, next_human_states)
+            num_actions, num_humans = batch_next_states.shape[:2]
+            rotated_batch_input = self.rotate(batch_next_states.view(num_actions * num_humans, -1)).view(num_actions, num_humans, -1)
+            if self.with_om:
+                occupancy_maps = self.build_occupancy_maps(next_human_states).unsqueeze(0)
+                rotated_batch_input = torch.cat([rotated_batch_input,
+                                                 occupancy_maps.to(self.device).expand(num_actions, -1, -1)], dim=2)
+            # VALUE UPDATE
+            next_state_values = self.model(rotated_batch_input).data.cpu().numpy()[:, 0]
+            values = rewards + pow(self.gamma, self.time_step * state.self_state.v_pref) * next_state_values
+            self.action_values = values.tolist()
             max_action = None
-            for action in self.action_space:
-                next_self_state = self.propagate(state.self_state, action)
-                if self.query_env:
-                    next_human_states = self.next_step_lookahead[0]
-                    # print("next_human_states: ", next_human_states)
-                    reward = self.predict_reward(next_self_state, next_human_states, action)
-                else:
-                    next_human_states = [self.propagate(human_state, ActionXY(human_state.vx, human_state.vy))
-                                       for human_state in state.human_states]
-                    reward = self.compute_reward(next_self_state, next_human_states)
-                batch_next_states = torch.cat([torch.Tensor([next_self_state + next_human_state]).to(self.device)
-                                              for next_human_state in next_human_states], dim=0)
-                rotated_batch_input = self.rotate(batch_next_states).unsqueeze(0)
-                if self.with_om:
-                    if occupancy_maps is None:
-                        occupancy_maps = self.build_occupancy_maps(next_human_states).unsqueeze(0)
-                    rotated_batch_input = torch.cat([rotated_batch_input, occupancy_maps.to(self.device)], dim=2)
-                # VALUE UPDATE
-                next_state_value = self.model(rotated_batch_input).data.item()
-                value = reward + pow(self.gamma, self.time_step * state.self_state.v_pref) * next_state_value
-                self.action_values.append(value)
-                if value > max_value:
-                    max_value = value
-                    max_action = action
+            if np.any(values > float('-inf')):
+                max_action = self.action_space[int(np.argmax(values))]
             if max_action is None:
                 raise ValueError('Value network is not well trained. ')
 
@@ -89,6 +85,28 @@ class MultiHumanRL(CADRL):
 
         return reward
 
+    def compute_rewards(self, nav_states, humans):
+        """
+        Batched version of compute_reward, for every candidate action at once
+
+        :param nav_states: (# actions, 9) array of propagated FullState fields (px, py, vx, vy, radius, gx, gy, v_pref, theta)
+        :param humans: list of ObservableState (same for every action)
+        :return: (# actions,) array of rewards
+        """
+        humans = np.array([(human.px, human.py, human.radius) for human in humans]).reshape((-1, 3))
+        dist = np.hypot(nav_states[:, 0:1] - humans[np.newaxis, :, 0], nav_states[:, 1:2] - humans[np.newaxis, :, 1]) \
+            - nav_states[:, 4:5] - humans[np.newaxis, :, 2]
+        collision = np.any(dist < 0, axis=1)
+        dmin = np.min(dist, axis=1, initial=float('inf'))
+
+        # check if reaching the goal
+        reaching_goal = np.hypot(nav_states[:, 0] - nav_states[:, 5], nav_states[:, 1] - nav_states[:, 6]) < nav_states[:, 4]
+        rewards = np.where(dmin < 0.2, (dmin - 0.2) * 0.5 * self.time_step, 0.)
+        rewards = np.where(reaching_goal, 1., rewards)
+        rewards = np.where(collision, -0.25, rewards)
+
+        return rewards
+
     def transform(self, state):
         """
         Take the state passed from agent and transform it to the input of value network
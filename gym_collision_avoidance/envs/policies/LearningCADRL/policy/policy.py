@@ -1,4 +1,5 @@
 import abc
+import logging
 import numpy as np
 
 
@@ -44,7 +45,7 @@ class Policy(object):
         collision = False
         discomfort_dist = state_agent.radius/2
         dmin = float('inf')
-        print("predict: ",state_other[0])
+        logging.debug("predict: %s", state_other[0])
         for i in range(len(state_other)):
             px = state_other[i].px - state_agent.px
             py = state_other[i].py - state_agent.py
@@ -63,7 +64,7 @@ class Policy(object):
                 dmin = closest_dist
 
 
-        reaching_goal = np.linalg.norm(np.array(state_agent.px,state_agent.py) - np.array(state_agent.gx,state_agent.gy)) < 0.3
+        reaching_goal = np.linalg.norm(np.array([state_agent.px,state_agent.py]) - np.array([state_agent.gx,state_agent.gy])) < 0.3
 
         if collision:
             reward = -0.25
@@ -76,16 +77,46 @@ class Policy(object):
         else:
             reward = 0
         
-        print("preidicted reward: ", reward)
+        logging.debug("predicted reward: %s", reward)
 
         return reward
 
+    def predict_rewards(self, next_self_states, state_other, action_velocities):
+        """
+        Batched version of predict_reward, for every candidate action at once
+
+        :param next_self_states: (# actions, 9) array of propagated FullState fields (px, py, vx, vy, radius, gx, gy, v_pref, theta)
+        :param state_other: list of ObservableState of the other agents
+        :param action_velocities: (# actions, 2) array of the agent's velocity under each action
+            (predict_reward uses action.v * (cos, sin)(action.r + state_agent.theta))
+        :return: (# actions,) array of rewards
+        """
+        others = np.array([(other.px, other.py, other.vx, other.vy) for other in state_other]).reshape((-1, 4))
+        agent_px, agent_py, agent_radius = next_self_states[:, 0:1], next_self_states[:, 1:2], next_self_states[:, 4:5]
+
+        px = others[np.newaxis, :, 0] - agent_px
+        py = others[np.newaxis, :, 1] - agent_py
+        vx = others[np.newaxis, :, 2] - action_velocities[:, 0:1]
+        vy = others[np.newaxis, :, 3] - action_velocities[:, 1:2]
+        ex = px + vx * self.time_step
+        ey = py + vy * self.time_step
+        # closest distance between boundaries of two agents
+        closest_dist = self.point_to_segment_dist_batch(px, py, ex, ey, 0, 0) - 2*agent_radius
+        collision = np.any(closest_dist < 0, axis=1)
+
+        reaching_goal = np.linalg.norm(next_self_states[:, 0:2] - next_self_states[:, 5:7], axis=1) < 0.3
+
+        rewards = np.where(collision, -0.25, np.where(reaching_goal, 1.0, 0.))
+        logging.debug("predicted rewards: %s", rewards)
+
+        return rewards
+
 
     @staticmethod
     def reach_destination(state):
         self_state = state.self_state
         if np.linalg.norm((self_state.py - self_state.gy, self_state.px - self_state.gx)) < self_state.radius/2:
-            print("dist2 goal: ",np.linalg.norm((self_state.py - self_state.gy, self_state.px - self_state.gx)))
+            logging.debug("dist2 goal: %s", np.linalg.norm((self_state.py - self_state.gy, self_state.px - self_state.gx)))
             return True
         else:
             return False
@@ -93,9 +93,10 @@ def main():
     epsilon_end = train_config.getfloat('train', 'epsilon_end')
     epsilon_decay = train_config.getfloat('train', 'epsilon_decay')
     checkpoint_interval = train_config.getint('train', 'checkpoint_interval')
+    prioritized_replay = train_config.getboolean('train', 'prioritized_replay', fallback=False)
 
     # configure trainer and explorer
-    memory = ReplayMemory(capacity)
+    memory = ReplayMemory(capacity, prioritized=prioritized_replay)
     model = policy.get_model()
     batch_size = train_config.getint('trainer', 'batch_size')
     trainer = Trainer(model, memory, device, batch_size)
@@ -1,28 +1,133 @@
+import numpy as np
+import torch
 from torch.utils.data import Dataset
 
 
-class ReplayMemory(Dataset):
+class SumTree(object):
     def __init__(self, capacity):
+        """
+        Binary tree (stored in a flat array) whose leaves are the priorities of the memory slots,
+        and each inner node is the sum of its children, so proportional sampling is O(log capacity)
+        """
+        self.num_leaves = 1
+        while self.num_leaves < capacity:
+            self.num_leaves *= 2
+        # node 1 is the root, the children of node i are 2i and 2i+1, leaves start at num_leaves
+        self.tree = np.zeros(2 * self.num_leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.num_leaves
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def get_priorities(self, indices):
+        return self.tree[np.asarray(indices) + self.num_leaves]
+
+    def find(self, values):
+        """
+        Index of the leaf where the cumulative sum of priorities passes each value (all values walk down the tree together)
+        """
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        while nodes[0] < self.num_leaves:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = np.where(go_right, values - self.tree[left], values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.num_leaves
+
+    def clear(self):
+        self.tree[:] = 0
+
+
+class ReplayMemory(Dataset):
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, priority_eps=1e-3):
+        """
+        Circular buffer of (state, value) experience, stored in tensors preallocated on the first push
+
+        :param capacity: max number of experiences (the oldest is replaced once full)
+        :param prioritized: sample proportionally to priority**alpha (through a sum-tree) instead of uniformly
+        :param alpha: how much prioritization is used (0: uniform)
+        :param beta: importance-sampling correction of the sampled batch (1: full correction)
+        :param priority_eps: added to every priority, so no experience becomes impossible to sample
+        """
         self.capacity = capacity
-        self.memory = list()
+        self.storage = None
+        self.size = 0
         self.position = 0
 
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.priority_eps = priority_eps
+        self.sum_tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
     def push(self, item):
         # replace old experience with new experience
-        if len(self.memory) < self.position + 1:
-            self.memory.append(item)
-        else:
-            self.memory[self.position] = item
+        if self.storage is None:
+            self.storage = [torch.zeros((self.capacity,) + tuple(element.shape), dtype=element.dtype, device=element.device)
+                            for element in item]
+        for storage, element in zip(self.storage, item):
+            storage[self.position] = element
+        if self.prioritized:
+            # new experience gets the largest priority so far, so it's likely to be trained on at least once
+            self.sum_tree.update([self.position], [self.max_priority ** self.alpha])
+        self.size = min(self.size + 1, self.capacity)
         self.position = (self.position + 1) % self.capacity
 
     def is_full(self):
-        return len(self.memory) == self.capacity
+        return self.size == self.capacity
+
+    def sample(self, batch_size):
+        """
+        Draw a random batch (with replacement)
+
+        :return: (tuple of batched tensors, indices of the sampled experience, importance-sampling weights (None if not prioritized))
+        """
+        if self.size == 0:
+            raise ValueError('Cannot sample from an empty memory!')
+        if not self.prioritized:
+            indices = np.random.randint(0, self.size, size=batch_size)
+            weights = None
+        else:
+            # one value per equal-sized segment of the total priority, so the batch is spread over the memory
+            total = self.sum_tree.total()
+            segment = total / batch_size
+            values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+            indices = np.minimum(self.sum_tree.find(np.minimum(values, total * (1 - 1e-12))), self.size - 1)
+            probabilities = self.sum_tree.get_priorities(indices) / total
+            weights = (self.size * probabilities) ** -self.beta
+            weights = torch.Tensor(weights / weights.max()).to(self.storage[0].device)
+        index_tensor = torch.from_numpy(indices).to(self.storage[0].device)
+        batch = tuple(storage[:self.size].index_select(0, index_tensor) for storage in self.storage)
+        return batch, indices, weights
+
+    def update_priorities(self, indices, errors):
+        """
+        Set the priority of the sampled experience from its latest error (e.g. |predicted value - target value|)
+        """
+        if not self.prioritized:
+            return
+        priorities = np.abs(np.asarray(errors, dtype=np.float64)).reshape(-1) + self.priority_eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.sum_tree.update(indices, priorities ** self.alpha)
 
     def __getitem__(self, item):
-        return self.memory[item]
+        return tuple(storage[item] for storage in self.storage)
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
 
     def clear(self):
-        self.memory = list()
+        self.size = 0
+        self.position = 0
+        self.max_priority = 1.0
+        if self.prioritized:
+            self.sum_tree.clear()
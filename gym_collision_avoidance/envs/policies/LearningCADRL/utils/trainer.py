@@ -1,4 +1,5 @@
 import logging
+import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.autograd import Variable
@@ -54,21 +55,23 @@ class Trainer(object):
         if self.optimizer is None:
             print("optimizer is none")
             raise ValueError('Learning rate is not set!')
-        if self.data_loader is None:
-            print(len(self.memory), self.batch_size)
-            print("no data")
-            self.data_loader = DataLoader(self.memory, self.batch_size, shuffle=True)
         losses = 0
         print("doing backprop, num_batches: ", num_batches)
 
+        # batches are drawn straight from the memory's preallocated tensors (no DataLoader/collate per batch)
+        batch_size = min(self.batch_size, len(self.memory))
         for _ in range(num_batches):
-            inputs, values = next(iter(self.data_loader))
-            inputs = Variable(inputs)
-            values = Variable(values)
+            (inputs, values), indices, weights = self.memory.sample(batch_size)
 
             self.optimizer.zero_grad()
             outputs = self.model(inputs)
-            loss = self.criterion(outputs, values)
+            if weights is None:
+                loss = self.criterion(outputs, values)
+            else:
+                # prioritized replay: correct for the non-uniform sampling, and re-prioritize by the new errors
+                errors = outputs - values
+                loss = torch.mean(weights.view(-1, 1) * errors ** 2)
+                self.memory.update_priorities(indices, errors.detach().abs().cpu().numpy())
             loss.backward()
             self.optimizer.step()
             losses += loss.data.item()
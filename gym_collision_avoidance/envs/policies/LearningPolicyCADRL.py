@@ -76,9 +76,10 @@ class LearningPolicyCADRL(LearningPolicy):
         self.epsilon_end = train_config.getfloat('train', 'epsilon_end')
         self.epsilon_decay = train_config.getfloat('train', 'epsilon_decay')
         self.checkpoint_interval = train_config.getint('train', 'checkpoint_interval')
+        self.prioritized_replay = train_config.getboolean('train', 'prioritized_replay', fallback=False)
 
         # configure trainer and explorer
-        self.memory = ReplayMemory(self.capacity)
+        self.memory = ReplayMemory(self.capacity, prioritized=self.prioritized_replay)
         self.model = self.policy.get_model()
         self.batch_size = train_config.getint('trainer', 'batch_size')
         self.trainer = Trainer(self.model, self.memory, self.device, self.batch_size)
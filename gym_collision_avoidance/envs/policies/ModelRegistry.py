@@ -0,0 +1,79 @@
+import os
+import weakref
+
+class ModelRegistry(object):
+    """ Share one loaded network between every policy instance that uses the same checkpoint on the same device.
+
+    Every :class:`~gym_collision_avoidance.envs.agent.Agent` instantiates its own policy, so without this, a scene with
+    100 :class:`~gym_collision_avoidance.envs.policies.GA3CCADRLPolicy.GA3CCADRLPolicy` agents would hold 100 copies
+    of the same network (and agents that respawn mid-episode would load it again).
+
+    Entries are keyed by (checkpoint path, device) and loaded lazily on the first :meth:`acquire`.
+    Each owner (policy instance) holds one reference, which is dropped when the owner is garbage collected
+    (or by :meth:`release`); once no owner is left, the network is dropped (and closed, if it has a :code:`close` method).
+
+    The shared networks must be treated as read-only by the policies (no training, no per-agent state).
+
+    """
+    def __init__(self):
+        self.entries = {}
+        self.finalizers = {}
+
+    def get_key(self, path, device):
+        return (os.path.realpath(path), str(device))
+
+    def acquire(self, owner, path, device, load_fn):
+        """ Return the network loaded from :code:`path` onto :code:`device`, loading it with :code:`load_fn` if nobody holds it yet.
+
+        Args:
+            owner (object): the policy that will use the network (holds one reference until it's garbage collected or released)
+            path (str): checkpoint file the network is loaded from
+            device (str): device the network is loaded onto (e.g., 'cpu', 'cuda', '/cpu:0')
+            load_fn (function): called with no arguments on a miss, returns the loaded network
+
+        Returns:
+            the shared network (whatever :code:`load_fn` returned)
+
+        """
+        key = self.get_key(path, device)
+        if (id(owner), key) in self.finalizers:
+            return self.entries[key][0]
+
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [load_fn(), 0]
+        entry[1] += 1
+        self.finalizers[(id(owner), key)] = weakref.finalize(owner, self._drop_reference, id(owner), key)
+        return entry[0]
+
+    def release(self, owner, path, device):
+        """ Drop :code:`owner`'s reference to a network before it's garbage collected """
+        finalizer = self.finalizers.get((id(owner), self.get_key(path, device)))
+        if finalizer is not None:
+            finalizer()
+
+    def _drop_reference(self, owner_id, key):
+        self.finalizers.pop((owner_id, key), None)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self.entries[key]
+            close = getattr(entry[0], 'close', None)
+            if callable(close):
+                close()
+
+    def num_references(self, path, device):
+        entry = self.entries.get(self.get_key(path, device))
+        return 0 if entry is None else entry[1]
+
+    def clear(self):
+        """ Forget every network (policies that already hold one keep using it) """
+        for finalizer in list(self.finalizers.values()):
+            finalizer.detach()
+        self.finalizers = {}
+        self.entries = {}
+
+# One registry per process, shared by every policy instance
+model_registry = ModelRegistry()
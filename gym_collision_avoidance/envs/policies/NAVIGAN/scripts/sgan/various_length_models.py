@@ -17,14 +17,14 @@ def make_mlp(dim_list, activation='relu', batch_norm=True, dropout=0):
     return nn.Sequential(*layers)
 
 
-def get_noise(shape, noise_type, aux_input=None):
+def get_noise(shape, noise_type, device, aux_input=None):
     if noise_type == 'gaussian':
-        return torch.randn(*shape).cuda()
+        return torch.randn(*shape).to(device)
     elif noise_type == 'uniform':
-        return torch.rand(*shape).sub_(0.5).mul_(2.0).cuda()
+        return torch.rand(*shape).sub_(0.5).mul_(2.0).to(device)
     elif noise_type == 'inject_goal':
         # Specify 'noise_mix_type' to 'individual' to enable goal injection
-        return aux_input.view(shape).cuda()
+        return aux_input.view(shape).to(device)
 
         
     raise ValueError('Unrecognized noise type "%s"' % noise_type)
@@ -51,10 +51,10 @@ class Encoder(nn.Module):
 
         self.spatial_embedding = nn.Linear(2, embedding_dim)
 
-    def init_hidden(self, batch):
+    def init_hidden(self, batch, device):
         return (
-            torch.zeros(self.num_layers, batch, self.h_dim).cuda(),
-            torch.zeros(self.num_layers, batch, self.h_dim).cuda()
+            torch.zeros(self.num_layers, batch, self.h_dim, device=device),
+            torch.zeros(self.num_layers, batch, self.h_dim, device=device)
         )
 
     def forward(self, obs_traj):
@@ -70,7 +70,7 @@ class Encoder(nn.Module):
         obs_traj_embedding = obs_traj_embedding.view(
             -1, batch, self.embedding_dim
         )
-        state_tuple = self.init_hidden(batch)
+        state_tuple = self.init_hidden(batch, obs_traj.device)
         output, state = self.encoder(obs_traj_embedding, state_tuple)  #out, hidden = lstm(inputs, hidden)
         final_h = state[0]
         return final_h
@@ -647,7 +647,7 @@ class TrajectoryGenerator(nn.Module):
         if user_noise is not None:
             z_decoder = user_noise
         else:
-            z_decoder = get_noise(noise_shape, self.noise_type, aux_input=aux_input)
+            z_decoder = get_noise(noise_shape, self.noise_type, _input.device, aux_input=aux_input)
 
         if self.noise_mix_type == 'global':
             _list = []
@@ -708,8 +708,8 @@ class TrajectoryGenerator(nn.Module):
         decoder_h = torch.unsqueeze(decoder_h, 0)
 
         decoder_c = torch.zeros(
-            self.num_layers, batch, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch, self.decoder_h_dim, device=obs_traj.device
+        )
 
         state_tuple = (decoder_h, decoder_c)
         last_pos = obs_traj[-1]
@@ -719,8 +719,8 @@ class TrajectoryGenerator(nn.Module):
         decoder_out = self.decoder(
             #last_pos,
             #last_pos_rel,
-            torch.zeros(last_pos.size()).cuda(),   # Start with zero social force
-            torch.zeros(last_pos_rel.size()).cuda(),
+            torch.zeros(last_pos.size(), device=last_pos.device),   # Start with zero social force
+            torch.zeros(last_pos_rel.size(), device=last_pos_rel.device),
             state_tuple,
             seq_start_end,
             seq_len=seq_len
@@ -764,8 +764,8 @@ class TrajectoryGenerator(nn.Module):
         decoder_h = torch.unsqueeze(decoder_h, 0)
 
         decoder_c = torch.zeros(
-            self.num_layers, batch, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch, self.decoder_h_dim, device=obs_traj.device
+        )
 
         state_tuple = (decoder_h, decoder_c)
         last_pos = obs_traj[-1]
@@ -786,8 +786,8 @@ class TrajectoryGenerator(nn.Module):
         rel_pos, state_tuple = self.decoder.step_forward(
             #last_pos,
             #last_pos_rel,
-            torch.zeros(last_pos.size()).cuda(),   # Start with zero social force
-            torch.zeros(last_pos_rel.size()).cuda(),
+            torch.zeros(last_pos.size(), device=last_pos.device),   # Start with zero social force
+            torch.zeros(last_pos_rel.size(), device=last_pos_rel.device),
             state_tuple,
             seq_start_end,
         )
@@ -930,7 +930,7 @@ class TrajectoryIntention(nn.Module):
 
         goal_shape = (_input.size(0), ) + self.goal_dim
 
-        z_decoder = get_noise(goal_shape, 'inject_goal', aux_input=goal_input)
+        z_decoder = get_noise(goal_shape, 'inject_goal', _input.device, aux_input=goal_input)
 
         decoder_h = torch.cat([_input, z_decoder], dim=1)
 
@@ -964,8 +964,8 @@ class TrajectoryIntention(nn.Module):
         decoder_h = torch.unsqueeze(decoder_h, 0)
 
         decoder_c = torch.zeros(
-            self.num_layers, batch, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch, self.decoder_h_dim, device=obs_traj.device
+        )
 
         state_tuple = (decoder_h, decoder_c)
         last_pos = obs_traj[-1]
@@ -1010,8 +1010,8 @@ class TrajectoryIntention(nn.Module):
         decoder_h = torch.unsqueeze(decoder_h, 0)
 
         decoder_c = torch.zeros(
-            self.num_layers, batch, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch, self.decoder_h_dim, device=obs_traj.device
+        )
 
         state_tuple = (decoder_h, decoder_c)
         last_pos = obs_traj[-1]
@@ -1032,8 +1032,8 @@ class TrajectoryIntention(nn.Module):
         rel_pos, state_tuple = self.decoder.step_forward(
             #last_pos,
             #last_pos_rel,
-            torch.zeros(last_pos.size()).cuda(),   # Start with zero social force
-            torch.zeros(last_pos_rel.size()).cuda(),
+            torch.zeros(last_pos.size(), device=last_pos.device),   # Start with zero social force
+            torch.zeros(last_pos_rel.size(), device=last_pos_rel.device),
             state_tuple,
             seq_start_end,
         )
@@ -1199,7 +1199,7 @@ class LateAttentionGenerator(nn.Module):
         if user_noise is not None:
             z_decoder = user_noise
         else:
-            z_decoder = get_noise(noise_shape, self.noise_type, aux_input=aux_input)
+            z_decoder = get_noise(noise_shape, self.noise_type, _input.device, aux_input=aux_input)
 
         if self.noise_mix_type == 'global':
             _list = []
@@ -1231,7 +1231,7 @@ class LateAttentionGenerator(nn.Module):
 
         goal_shape = (_input.size(0), ) + self.goal_dim
 
-        z_decoder = get_noise(goal_shape, 'inject_goal', aux_input=goal_input)
+        z_decoder = get_noise(goal_shape, 'inject_goal', _input.device, aux_input=goal_input)
 
         decoder_h = torch.cat([_input, z_decoder], dim=1)
 
@@ -1293,8 +1293,8 @@ class LateAttentionGenerator(nn.Module):
         force_decoder_h = torch.unsqueeze(force_decoder_h, 0)
 
         force_decoder_c = torch.zeros(
-            self.num_layers, batch_size, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch_size, self.decoder_h_dim, device=obs_traj.device
+        )
 
         if self.intention_mlp_decoder_needed():
             noise_input = self.intention_mlp_decoder_context(intention_mlp_decoder_context_input)
@@ -1306,8 +1306,8 @@ class LateAttentionGenerator(nn.Module):
         intention_decoder_h = torch.unsqueeze(intention_decoder_h, 0)
 
         intention_decoder_c = torch.zeros(
-            self.num_layers, batch_size, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch_size, self.decoder_h_dim, device=obs_traj.device
+        )
 
             
 
@@ -1522,7 +1522,7 @@ class LateAttentionFullGenerator(nn.Module):
         if user_noise is not None:
             z_decoder = user_noise
         else:
-            z_decoder = get_noise(noise_shape, self.noise_type, aux_input=aux_input)
+            z_decoder = get_noise(noise_shape, self.noise_type, _input.device, aux_input=aux_input)
 
         if self.noise_mix_type == 'global':
             _list = []
@@ -1554,7 +1554,7 @@ class LateAttentionFullGenerator(nn.Module):
 
         goal_shape = (_input.size(0), ) + self.goal_dim
 
-        z_decoder = get_noise(goal_shape, 'inject_goal', aux_input=goal_input)
+        z_decoder = get_noise(goal_shape, 'inject_goal', _input.device, aux_input=goal_input)
 
         decoder_h = torch.cat([_input, z_decoder], dim=1)
 
@@ -1616,8 +1616,8 @@ class LateAttentionFullGenerator(nn.Module):
         force_decoder_h = torch.unsqueeze(force_decoder_h, 0)
 
         force_decoder_c = torch.zeros(
-            self.num_layers, batch_size, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch_size, self.decoder_h_dim, device=obs_traj.device
+        )
 
         if self.intention_mlp_decoder_needed():
             noise_input = self.intention_mlp_decoder_context(intention_mlp_decoder_context_input)
@@ -1629,8 +1629,8 @@ class LateAttentionFullGenerator(nn.Module):
         intention_decoder_h = torch.unsqueeze(intention_decoder_h, 0)
 
         intention_decoder_c = torch.zeros(
-            self.num_layers, batch_size, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch_size, self.decoder_h_dim, device=obs_traj.device
+        )
 
             
 
@@ -1827,7 +1827,7 @@ class LateAttentionFullLineGenerator(nn.Module):
         if user_noise is not None:
             z_decoder = user_noise
         else:
-            z_decoder = get_noise(noise_shape, self.noise_type, aux_input=aux_input)
+            z_decoder = get_noise(noise_shape, self.noise_type, _input.device, aux_input=aux_input)
 
         if self.noise_mix_type == 'global':
             _list = []
@@ -1889,8 +1889,8 @@ class LateAttentionFullLineGenerator(nn.Module):
         force_decoder_h = torch.unsqueeze(force_decoder_h, 0)
 
         force_decoder_c = torch.zeros(
-            self.num_layers, batch_size, self.decoder_h_dim
-        ).cuda()
+            self.num_layers, batch_size, self.decoder_h_dim, device=obs_traj.device
+        )
 
 
         force_state_tuple = (force_decoder_h, force_decoder_c)
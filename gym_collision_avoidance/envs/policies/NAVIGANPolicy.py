@@ -15,6 +15,7 @@ from threading import Lock
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_checkpoint, inference_mode, inference_graph
 
 from gym_collision_avoidance.envs.policies.NAVIGAN.scripts.sgan.models import TrajectoryGenerator, TrajectoryIntention
 from gym_collision_avoidance.envs.policies.NAVIGAN.scripts.sgan.various_length_models import LateAttentionFullGenerator
@@ -60,7 +61,8 @@ class NAVIGANPolicy(InternalPolicy):
         
         if VERBOSE:
             print('Loading Attention Generator...')
-        self.intention_generator = self.get_attention_generator(torch.load(CHECKPOINT))
+        self.device = get_torch_device()
+        self.intention_generator = inference_graph(self.get_attention_generator(load_checkpoint(CHECKPOINT)))
         if VERBOSE:
             print('Done.')
 
@@ -294,11 +296,11 @@ class NAVIGANPolicy(InternalPolicy):
         goals_rel = goals_rel.repeat(1,obs_traj.shape[1],1)
 
 
-        # move everything to GPU
-        obs_traj = obs_traj.cuda()
-        obs_traj_rel = obs_traj_rel.cuda()
-        seq_start_end = seq_start_end.cuda()
-        goals_rel = goals_rel.cuda()
+        # move everything to the generator's device
+        obs_traj = obs_traj.to(self.device)
+        obs_traj_rel = obs_traj_rel.to(self.device)
+        seq_start_end = seq_start_end.to(self.device)
+        goals_rel = goals_rel.to(self.device)
 
         pred_traj_fake = self.feedforward(obs_traj, obs_traj_rel, seq_start_end, goals_rel)
         # print(pred_traj_fake.size())
@@ -395,7 +397,7 @@ class NAVIGANPolicy(InternalPolicy):
             generator.load_state_dict(checkpoint['g_waypointbest_state'])
         else:
             generator.load_state_dict(checkpoint['g_state'])
-        generator.cuda()
+        generator.to(self.device)
         generator.train()
         return generator
 
@@ -417,7 +419,7 @@ class NAVIGANPolicy(InternalPolicy):
         goals_rel: torch.Tensor([1, num_agents, 2])
         """
 
-        with torch.no_grad():
+        with inference_mode():
             pred_traj_fake_rel, _ = self.intention_generator(obs_traj, obs_traj_rel, seq_start_end, goal_input=goals_rel)
             pred_traj_fake = relative_to_abs(pred_traj_fake_rel, obs_traj[0])
         return pred_traj_fake
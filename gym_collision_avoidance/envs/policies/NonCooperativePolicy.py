@@ -33,3 +33,12 @@ class NonCooperativePolicy(InternalPolicy):
 
         action = np.array([agents[agent_index].pref_speed, -agents[agent_index].heading_ego_frame])
         return action
+
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Same as :code:`find_next_action` for each of agent_indices, in one shot
+
+        Returns:
+            np array of shape (len(agent_indices), 2)... [spd, delta_heading] per agent
+
+        """
+        return np.array([[agents[i].pref_speed, -agents[i].heading_ego_frame] for i in agent_indices])
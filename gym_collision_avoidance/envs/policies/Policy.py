@@ -1,4 +1,5 @@
 import numpy as np
+import inspect
 from gym_collision_avoidance.envs.util import wrap
 
 class Policy(object):
@@ -13,6 +14,41 @@ class Policy(object):
         self.is_still_learning = False
         self.is_external = False
 
+    @classmethod
+    def get_calling_convention(cls):
+        """ Look up (once per policy class) how the env should call this policy.
+
+        Returns:
+            - takes_full_agent_list (bool): whether :code:`find_next_action` accepts :code:`full_agent_list` & :code:`active_agent_mask` kwargs
+            - has_batched_actions (bool): whether this class overrides :meth:`find_next_actions`
+
+        """
+        if '_calling_convention' not in cls.__dict__:
+            find_next_action = getattr(cls, 'find_next_action', None)
+            action_args = inspect.getfullargspec(find_next_action)[0] if find_next_action is not None else []
+            takes_full_agent_list = 'full_agent_list' in action_args and 'active_agent_mask' in action_args
+            has_batched_actions = cls.find_next_actions is not Policy.find_next_actions
+            cls._calling_convention = (takes_full_agent_list, has_batched_actions)
+        return cls._calling_convention
+
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Optional batched version of :code:`find_next_action`, for every (not done) agent that uses this policy class.
+
+        If a policy class overrides this, the env calls it once per step (on the first of those agents' policy objects)
+        instead of calling :code:`find_next_action` once per agent. Each agent's own policy object is still :code:`agents[i].policy`.
+
+        Args:
+            obs_list (list): each agent's observation dict, in the same order as agent_indices
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment (incl. inactive ones)
+            agent_indices (list): indices (in :code:`agents`) of the agents to compute actions for
+            active_agent_mask (np array): (len(agents),) bool, True for agents that are still in the scene
+
+        Returns:
+            actions (np array): (len(agent_indices), 2) [spd, delta_heading] for each agent
+
+        """
+        raise NotImplementedError
+
     def near_goal_smoother(self, dist_to_goal, pref_speed, heading, raw_action):
         """ Linearly ramp down speed/turning if agent is near goal, stop if close enough.
 
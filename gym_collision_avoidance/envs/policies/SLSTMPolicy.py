@@ -15,6 +15,8 @@ import numpy as np
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_checkpoint
 
 from gym_collision_avoidance.envs.policies.social_lstm.utilsv2 import DataLoader
 from gym_collision_avoidance.envs.policies.social_lstm.helper import getCoef, sample_gaussian_2d, get_mean_error, get_final_error
@@ -71,7 +73,6 @@ class SLSTMPolicy(InternalPolicy):
         self.obs_length = 8    #Observed length of the trajectory
         self.pred_length = 12  #Predicted length of the trajectory
         self.epoch = 29      #Epoch of model to be loaded
-        self.use_cuda = False #False
         self.drive = False   #Use Google drive or not
         self.iteration = 1   #Number of iteration to create test file (smallest test errror will be selected)
         self.gru = False     #True : GRU cell, False: LSTM cell
@@ -130,16 +131,14 @@ class SLSTMPolicy(InternalPolicy):
 
 
     # Initialize net
-        self.net = get_model(self.method, self.saved_args, True)
-
-        if self.use_cuda:        
-            self.net = self.net.cuda()
+        self.device = get_torch_device()
+        self.net = get_model(self.method, self.saved_args, True).to(self.device)
 
         # Get the checkpoint path
         checkpoint_path = os.path.join(save_directory, save_tar_name+str(self.epoch)+'.tar')
         if os.path.isfile(checkpoint_path):
             print('Loading checkpoint')
-            checkpoint = torch.load(checkpoint_path)
+            checkpoint = load_checkpoint(checkpoint_path)
             model_epoch = checkpoint['epoch']
             self.net.load_state_dict(checkpoint['state_dict'])
             print('Loaded checkpoint at epoch', model_epoch)
@@ -147,17 +146,14 @@ class SLSTMPolicy(InternalPolicy):
 
     def init(self,agents):
         net = None
-        self.net = get_model(self.method, self.saved_args, True)
-
-        if self.use_cuda:        
-            self.net = self.net.cuda()
+        self.net = get_model(self.method, self.saved_args, True).to(self.device)
 
         self.total_agents_num = [None]*self.n_agents
-        self.agent_pos_x = [None]*self.n_agents
-        self.agent_pos_y = [None]*self.n_agents
 
         self.near_goal_threshold = 0.5       
 
+        self.online_states = {} #LSTM states kept between timesteps by predict_online, per timestep % 4
+
         self.is_init = True
 
 
@@ -188,35 +184,7 @@ class SLSTMPolicy(InternalPolicy):
 
         #if agents[0].step_num % 4 != 0: return [ agents[agent_index].speed_global_frame , 0 ] #agents[agent_index].delta_heading_global_frame ]
 
-        #print("self.agent_pos_x")
-        #print(self.agent_pos_x)
-
-        #handle new agents due to dynamic number of agents, append length to make room for new agent, (use None for placeholder for newly added)
-        if len(self.agent_pos_x)< self.n_agents:
-            length_diff  = self.n_agents - len(self.agent_pos_x)
-            #print("proceed to add "+str(length_diff))
-            for add in range(length_diff):
-                #print("add "+str(1+add))
-                self.agent_pos_x.append( None )
-                self.agent_pos_y.append( None )
-
-        #print("AFTER self.agent_pos_x")
-        #print(self.agent_pos_x)
-       
-
-        for i in range(self.n_agents):
-            # Copy current agent positions, goal and preferred speeds into np array
-
-            if self.agent_pos_x[i] is None:
-                self.agent_pos_x[i] =   [ agents[i].pos_global_frame[0] ]
-            else:
-                self.agent_pos_x[i] +=  [ agents[i].pos_global_frame[0] ]
-            
-            if self.agent_pos_y[i] is None:
-                self.agent_pos_y[i] =   [ agents[i].pos_global_frame[1] ]
-            else:
-                self.agent_pos_y[i] +=  [ agents[i].pos_global_frame[1] ]
-
+        #positions of every agent are recorded by the env each timestep (see TrajectoryHistory)
 
         if ( agents[agent_index].step_num - agents[agent_index].start_step_num ) <= 3:
 
@@ -248,53 +216,10 @@ class SLSTMPolicy(InternalPolicy):
             #print(action)
             return action
   
-        #New agent history appended, but since the dimension might be less than already existed agent, add nan to make dimension regular.
-        self.fill_agent_pos_x = self.agent_pos_x
-        self.fill_agent_pos_y = self.agent_pos_y
-
-        #print("self.fill_agent_pos_x")
-        #print(self.fill_agent_pos_x)
-
-        #print("number ",self.n_agents)
-        for i in range(self.n_agents):
-           
-            #print("FIRST is ",len(self.fill_agent_pos_x[0]))
-            #print(self.fill_agent_pos_x[0])
-            #print("THIS  is ",len(self.fill_agent_pos_x[i]))
-            #print(self.fill_agent_pos_x[i])
-
-            
-            #here we assume the existed (oldest, first) agent history array is the longest  #this assumption will lead to problem
-            #if len(self.fill_agent_pos_x[0]) > len(self.fill_agent_pos_x[i]):
-            if len(max(self.fill_agent_pos_x, key=len)) > len(self.fill_agent_pos_x[i]):
-                
-                #length_diff  = len(self.fill_agent_pos_x[0]) - len(self.fill_agent_pos_x[i])
-                length_diff  = len(max(self.fill_agent_pos_x, key=len)) - len(self.fill_agent_pos_x[i])
-                for add in range(length_diff):
-                    #print("INSERT "+str(add+1))
-                    self.fill_agent_pos_x[i].insert( 0 , np.nan )
-                    self.fill_agent_pos_y[i].insert( 0 , np.nan ) 
-
-        
-            
-        #Only take the latest 8 observation #test[:,-8:]
-        #select every 4 element from the end,    reverse it, and select the latest 8 entry
-        #if agents[0].step_num % 2 != 0: return [ agents[agent_index].speed_global_frame , 0 ]
-
-
-        
-        
-        #observation_x_input = np.array( self.agent_pos_x )[:,::-4][:,::-1][:,-8:]
-        #observation_y_input = np.array( self.agent_pos_y )[:,::-4][:,::-1][:,-8:]
-
-        #print("active agent mask")
-        #print(active_agent_mask)
-
-        #print("before mask")
-        #print(np.array( self.fill_agent_pos_x )[:,::-4][:,::-1][:,-8:])
-
-        observation_x_input = np.array( self.fill_agent_pos_x )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
-        observation_y_input = np.array( self.fill_agent_pos_y )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
+        #Only take the latest 8 observation, one every 4 steps (NaN before an agent entered the scene)
+        recent_positions = trajectory_history.get_recent(np.flatnonzero(active_agent_mask), self.obs_seq_len, 4)
+        observation_x_input = recent_positions[:,:,0]
+        observation_y_input = recent_positions[:,:,1]
 
         #print("after mask")
         #print(observation_x_input)
@@ -338,8 +263,8 @@ class SLSTMPolicy(InternalPolicy):
             #temp_x = np.where( ~np.isnan(observation_x_input[agent_ind]) , observation_x_input[agent_ind] , 0)
             #temp_y = np.where( ~np.isnan(observation_y_input[agent_ind]) , observation_y_input[agent_ind] , 0)
 
-            temp_x = np.array(  [x for x in observation_x_input[agent_ind] if str(x) != 'nan']   )
-            temp_y = np.array(  [x for x in observation_y_input[agent_ind] if str(x) != 'nan']   )            
+            temp_x = observation_x_input[agent_ind][ ~np.isnan(observation_x_input[agent_ind]) ]
+            temp_y = observation_y_input[agent_ind][ ~np.isnan(observation_y_input[agent_ind]) ]            
 
                 
             observation_len = len(temp_x)
@@ -405,6 +330,64 @@ class SLSTMPolicy(InternalPolicy):
 ##            print("after observation_x_input")
 ##            print(combined_history_x)        
 
+        if combined_history_x.shape[0]==1: return np.array([0,0])
+
+        prediction_index = 0
+        if Config.SLSTM_ONLINE_INFERENCE:
+            #only the first predicted position is used, so the online mode doesn't decode the rest of the horizon
+            predicted_positions = self.predict_online(np.stack(( combined_history_x, combined_history_y ), axis=-1), [id(agent) for agent in agents])
+            #same frame as the offline prediction (relative to the target agent's oldest observation)
+            prediction = predicted_positions[agent_index] - np.array([ combined_history_x[agent_index,0], combined_history_y[agent_index,0] ])
+        else:
+            ret_x_seq = self.predict_offline(combined_history_x, combined_history_y, agent_index)
+            prediction = ret_x_seq.data.cpu().numpy()[-12:][:,agent_index][prediction_index]
+
+        self.next_waypoint = np.array( agents[agent_index].goal_global_frame ) + prediction
+        #print(next_waypoint)
+
+        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
+        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
+        if self.dist_to_goal > 1e-8:
+            ref_prll = goal_direction / agents[agent_index].dist_to_goal
+        else:
+            ref_prll = goal_direction
+        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
+
+        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
+                                                 ref_prll[0])
+        heading_ego_frame = wrap( agents[agent_index].heading_global_frame - ref_prll_angle_global_frame)
+
+    
+        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
+
+        speed_global_frame = np.linalg.norm(vel_global_frame) 
+        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
+
+        if speed_global_frame > 1.5: speed_global_frame = 1.5
+        if speed_global_frame < 0.5: speed_global_frame = 0.5
+
+        #But in reality, the format of action is [speed, heading_delta]
+
+        action = np.array([speed_global_frame, -heading_ego_frame])
+       
+        return action
+
+    
+
+
+    def predict_offline(self, combined_history_x, combined_history_y, agent_index):
+        """ Predict the scene from scratch: encode the whole observation window from zero LSTM states, then decode pred_length frames
+
+        Args:
+            combined_history_x (np array): (num agents, obs_length) x position of each agent, oldest first
+            combined_history_y (np array): (num agents, obs_length) y position of each agent, oldest first
+            agent_index (int): row of the agent running the policy
+
+        Returns:
+            ret_x_seq (torch tensor): (obs_length+pred_length, num agents, 2) observed then predicted positions, relative to agents[agent_index]'s oldest observation
+
+        """
+
         observation_x_input = combined_history_x - combined_history_x[agent_index,0]#observation_x_input[:,0][:,None]
         observation_y_input = combined_history_y - combined_history_y[agent_index,0]#observation_y_input[:,0][:,None]
 
@@ -412,7 +395,6 @@ class SLSTMPolicy(InternalPolicy):
         #observation_x_input = combined_history_x  #observation_x_input[:,0][:,None]
         #observation_y_input = combined_history_y  #observation_y_input[:,0][:,None]
         
-        if observation_x_input.shape[0]==1: return np.array([0,0])
 
 
         ####FOR Observation input, its shape is [20, num_agents, 3(agent_id,x,y) ]
@@ -484,15 +466,16 @@ class SLSTMPolicy(InternalPolicy):
         
         #grid mask calculation
         if self.method == 2: #obstacle lstm
-            grid_seq = getSequenceGridMask(x_seq, dataset_data, PedsList_seq, self.saved_args.neighborhood_size, self.saved_args.grid_size, self.saved_args.use_cuda, True)
+            grid_seq = getSequenceGridMask(x_seq, dataset_data, PedsList_seq, self.saved_args.neighborhood_size, self.saved_args.grid_size, False, True)
         elif  self.method == 1: #social lstm   
-            grid_seq = getSequenceGridMask(x_seq, dataset_data, PedsList_seq, self.saved_args.neighborhood_size, self.saved_args.grid_size, self.saved_args.use_cuda)
+            grid_seq = getSequenceGridMask(x_seq, dataset_data, PedsList_seq, self.saved_args.neighborhood_size, self.saved_args.grid_size, False)
+
+        if self.method != 3: #getSequenceGridMask's using_cuda could only put them on the default cuda device
+            grid_seq = [grid.to(self.device) for grid in grid_seq]
 
         #vectorize datapoints
         x_seq, first_values_dict = vectorize_seq(x_seq, PedsList_seq, lookup_seq)
-
-        if self.use_cuda:
-            x_seq = x_seq.cuda()
+        x_seq = x_seq.to(self.device)
 
         # The sample function
         if self.method == 3: #vanilla lstm
@@ -519,42 +502,85 @@ class SLSTMPolicy(InternalPolicy):
         #print("PREDICTION")
         #print(ret_x_seq.data.cpu().numpy()[-12:][:,agent_index])
 
-        prediction_index = 0
-        self.next_waypoint = np.array( agents[agent_index].goal_global_frame ) + ret_x_seq.data.cpu().numpy()[-12:][:,agent_index][prediction_index]
-        #print(next_waypoint)
+        return ret_x_seq
 
-        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
-        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
-        if self.dist_to_goal > 1e-8:
-            ref_prll = goal_direction / agents[agent_index].dist_to_goal
-        else:
-            ref_prll = goal_direction
-        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
 
-        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
-                                                 ref_prll[0])
-        heading_ego_frame = wrap( agents[agent_index].heading_global_frame - ref_prll_angle_global_frame)
+    def predict_online(self, history, agent_ids):
+        """ Predict every agent's next position, carrying the LSTM states over from the previous observation
 
-    
-        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
+        Observations are every 4 timesteps, so the states are kept per phase (timestep % 4): each call feeds the newest
+        observation to the states that saw the observation 4 timesteps earlier, i.e., one LSTM step per call instead of
+        the (obs_length + pred_length) steps of :meth:`predict_offline`.
+        Like during training, an agent's input is its position relative to its first fed observation, and an agent
+        that just appeared starts from zero states. The states restart from the observation window (obs_length steps)
+        at the start of an episode, after a gap in the observations, and once they've seen obs_length+pred_length observations
+        (the sequence length the model was trained on).
 
-        speed_global_frame = np.linalg.norm(vel_global_frame) 
-        print("calc speed")
-        print(speed_global_frame)
-        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
+        Args:
+            history (np array): (num agents, obs_length, 2) position of each active agent, oldest first
+            agent_ids (list): :code:`id` of each active agent
 
-        if speed_global_frame > 1.5: speed_global_frame = 1.5
-        if speed_global_frame < 0.5: speed_global_frame = 0.5
+        Returns:
+            predicted_positions (np array): (num agents, 2) sampled next position of each agent
 
-        #But in reality, the format of action is [speed, heading_delta]
+        """
+        num_steps = trajectory_history.num_steps
+        state = self.online_states.get(num_steps % 4)
+        restart = state is None or state['num_resets'] != trajectory_history.num_resets or state['num_steps'] != num_steps - 4 \
+            or state['num_observations'].max() >= self.obs_length + self.pred_length
 
-        action = np.array([speed_global_frame, -heading_ego_frame])
-        print("action")
-        print(action)
-       
-        return action
+        with torch.no_grad():
+            if restart:
+                state = {'agent_ids': agent_ids, 'origins': history[:, 0].copy(), 'num_observations': np.zeros(len(agent_ids), dtype=int)}
+                hidden_states, cell_states = self.zero_states(len(agent_ids))
+                for tstep in range(self.obs_length):
+                    outputs, hidden_states, cell_states = self.step_net(history[:, tstep], state['origins'], hidden_states, cell_states)
+                state['num_observations'] += self.obs_length
+            else:
+                #keep the rows of the agents that are still there, new agents start from zero states at their current position
+                hidden_states, cell_states = self.zero_states(len(agent_ids))
+                origins = history[:, -1].copy()
+                num_observations = np.zeros(len(agent_ids), dtype=int)
+                prev_rows = dict(zip(state['agent_ids'], range(len(state['agent_ids']))))
+                for row, agent_id in enumerate(agent_ids):
+                    prev_row = prev_rows.get(agent_id)
+                    if prev_row is None:
+                        continue
+                    hidden_states[row] = state['hidden_states'][prev_row]
+                    if cell_states is not None:
+                        cell_states[row] = state['cell_states'][prev_row]
+                    origins[row] = state['origins'][prev_row]
+                    num_observations[row] = state['num_observations'][prev_row]
+                state = {'agent_ids': agent_ids, 'origins': origins, 'num_observations': num_observations + 1}
+                outputs, hidden_states, cell_states = self.step_net(history[:, -1], origins, hidden_states, cell_states)
+
+        state.update({'hidden_states': hidden_states, 'cell_states': cell_states, 'num_steps': num_steps, 'num_resets': trajectory_history.num_resets})
+        self.online_states[num_steps % 4] = state
+
+        num_agents = len(agent_ids)
+        mux, muy, sx, sy, corr = getCoef(outputs)
+        next_x, next_y = sample_gaussian_2d(mux.data.cpu(), muy.data.cpu(), sx.data.cpu(), sy.data.cpu(), corr.data.cpu(), range(num_agents), dict(zip(range(num_agents), range(num_agents))))
+        return state['origins'] + np.stack(( next_x.numpy(), next_y.numpy() ), axis=-1)
+
+    def zero_states(self, num_agents):
+        """ Initial (hidden, cell) LSTM states of num_agents agents (cell is None for GRU) """
+        hidden_states = Variable(torch.zeros(num_agents, self.net.args.rnn_size, device=self.device))
+        cell_states = None if self.gru else Variable(torch.zeros(num_agents, self.net.args.rnn_size, device=self.device))
+        return hidden_states, cell_states
+
+    def step_net(self, positions, origins, hidden_states, cell_states):
+        """ Feed one observation of every agent (positions relative to origins) to the network, the same way :meth:`sample` does """
+        num_agents = len(positions)
+        look_up = dict(zip(range(num_agents), range(num_agents)))
+        frame = Variable(torch.from_numpy(positions - origins).float()).view(1, num_agents, 2).to(self.device)
 
-    
+        if self.method == 3: #vanilla lstm
+            return self.net(frame, hidden_states, cell_states, [list(range(num_agents))], [num_agents], self.dataloader, look_up)
+
+        #the grid mask only depends on relative positions, so it can use the global frame
+        grid = getGridMask(torch.from_numpy(positions).float(), [720, 576], num_agents, self.saved_args.neighborhood_size, self.saved_args.grid_size, self.method == 2)
+        grid = Variable(torch.from_numpy(grid).float()).to(self.device)
+        return self.net(frame, [grid], hidden_states, cell_states, [list(range(num_agents))], [num_agents], self.dataloader, look_up)
 
 
     def sample(self, x_seq, Pedlist, net, true_x_seq, true_Pedlist, saved_args, dimensions, dataloader, look_up, num_pedlist, is_gru, grid = None):
@@ -587,22 +613,15 @@ class SLSTMPolicy(InternalPolicy):
 
         with torch.no_grad():
             # Construct variables for hidden and cell states
-            hidden_states = Variable(torch.zeros(numx_seq, net.args.rnn_size))
-            if self.use_cuda:
-                hidden_states = hidden_states.cuda()
+            hidden_states = Variable(torch.zeros(numx_seq, net.args.rnn_size, device=self.device))
             if not is_gru:
-                cell_states = Variable(torch.zeros(numx_seq, net.args.rnn_size))
-                if self.use_cuda:
-                    cell_states = cell_states.cuda()
+                cell_states = Variable(torch.zeros(numx_seq, net.args.rnn_size, device=self.device))
             else:
                 cell_states = None
 
 
-            ret_x_seq = Variable(torch.zeros(self.obs_length+self.pred_length, numx_seq, 2))
-
             # Initialize the return data structure
-            if self.use_cuda:
-                ret_x_seq = ret_x_seq.cuda()
+            ret_x_seq = Variable(torch.zeros(self.obs_length+self.pred_length, numx_seq, 2, device=self.device))
 
 
             # For the observed part of the trajectory
@@ -654,10 +673,7 @@ class SLSTMPolicy(InternalPolicy):
                 true_Pedlist[tstep+1] = [int(_x_seq) for _x_seq in true_Pedlist[tstep+1]]
                 next_ped_list = true_Pedlist[tstep+1].copy()
                 converted_pedlist = [look_up[_x_seq] for _x_seq in next_ped_list]
-                list_of_x_seq = Variable(torch.LongTensor(converted_pedlist))
-
-                if self.use_cuda:
-                    list_of_x_seq = list_of_x_seq.cuda()
+                list_of_x_seq = Variable(torch.LongTensor(converted_pedlist)).to(self.device)
                
                 #Get their predicted positions
                 current_x_seq = torch.index_select(ret_x_seq[tstep+1], 0, list_of_x_seq)
@@ -669,9 +685,7 @@ class SLSTMPolicy(InternalPolicy):
                     elif  self.method == 1: #social lstm   
                         prev_grid = getGridMask(current_x_seq.data.cpu(), dimensions, len(true_Pedlist[tstep+1]),saved_args.neighborhood_size, saved_args.grid_size)
 
-                    prev_grid = Variable(torch.from_numpy(prev_grid).float())
-                    if self.use_cuda:
-                        prev_grid = prev_grid.cuda()
+                    prev_grid = Variable(torch.from_numpy(prev_grid).float()).to(self.device)
 
             #ret_x_seq[args.obs_length-1] = temp_last_observed
 
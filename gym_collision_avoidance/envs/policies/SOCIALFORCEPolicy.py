@@ -47,7 +47,49 @@ class SOCIALFORCEPolicy(InternalPolicy):
 
         agents = list(compress(full_agent_list, active_agent_mask))
 
+        states = self.step_simulator(agents)
+
+        return self.action_from_states(agents, agent_index, states)
+
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Step the social force simulator once for this env step, and read every SOCIALFORCE agent's action from it
+
+        (Calling find_next_action per agent would build and step an identical simulator once per agent.)
+        """
+        active_agent_inds = np.cumsum(active_agent_mask) - 1 # index of each agent within the active agents
+        active_agents = list(compress(agents, active_agent_mask))
+
+        # The simulator's initial state depends on whether the policy has been initialized already,
+        # so (e.g., if a new agent just spawned) there may be one simulator per value of is_init
+        states_dict = {}
+        actions = np.zeros((len(agent_indices), 2))
+        for k, i in enumerate(agent_indices):
+            policy = agents[i].policy
+            was_init = policy.is_init
+            if was_init not in states_dict:
+                states_dict[was_init] = policy.step_simulator(active_agents)
+            else:
+                policy.step_simulator(active_agents, build_only=True)
+            actions[k, :] = policy.action_from_states(active_agents, active_agent_inds[i], states_dict[was_init])
+        return actions
+
+    def step_simulator(self, agents, build_only=False):
+        """ Build the social force simulator's initial state from the active agents, and step it once
+
+        Args:
+            agents (list): active :class:`~gym_collision_avoidance.envs.agent.Agent` objects
+            build_only (bool): only update this policy's bookkeeping (is_init, n_agents), don't step the simulator
+
+        Returns:
+            states (np array): (1, len(agents), 7) social force state of each agent after one step (None if build_only)
+
+        """
         
+        if build_only:
+            self.n_agents = len(agents)
+            self.init(agents)
+            return None
+
         observation_array = [] #observation array for social force, consist of N row of agents, each row = vector (x, y, v_x, v_y, d_x, d_y, [tau])
         
         if not self.is_init:   #Execute one time per init (complete simulation iteration)
@@ -83,9 +125,6 @@ class SOCIALFORCEPolicy(InternalPolicy):
                     
                     observation_array.append( [  agents[a].pos_global_frame[0], agents[a].pos_global_frame[1], agents[a].vel_global_frame[0], agents[a].vel_global_frame[1], agents[a].goal_global_frame[0], agents[a].goal_global_frame[1]   ]  )
 
-        #print("goal")
-        #print(agents[agent_index].goal_global_frame)
-        
         initial_state = np.array( observation_array )
         s=None
         #s = socialforce.Simulator(initial_state, delta_t=0.1)
@@ -94,6 +133,10 @@ class SOCIALFORCEPolicy(InternalPolicy):
 
         #print("states")
         #print(states)
+        return states
+
+    def action_from_states(self, agents, agent_index, states):
+        """ Convert agents[agent_index]'s next social force state into an action [speed, heading_delta] """
 
         next_waypoint_x = states[:, agent_index, 0][0]
         next_waypoint_y = states[:, agent_index, 1][0]
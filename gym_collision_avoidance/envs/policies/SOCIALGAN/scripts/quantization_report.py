@@ -0,0 +1,131 @@
+import argparse
+import os
+import time
+import torch
+
+from attrdict import AttrDict
+
+from socialgan.data.loader import data_loader
+from socialgan.models import TrajectoryGenerator
+from socialgan.losses import displacement_error, final_displacement_error
+from socialgan.utils import relative_to_abs, get_dset_path
+from gym_collision_avoidance.envs.policies.TorchDevice import quantize
+
+# Accuracy (and generator time) of the int8 dynamically quantized generators (Config.QUANTIZED_POLICIES) vs. the fp32 ones,
+# on the datasets/*/test splits, as a markdown table (see QUANTIZATION.md)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model_path', default='models/sgan-models', type=str)
+parser.add_argument('--num_samples', default=20, type=int)
+parser.add_argument('--dset_type', default='test', type=str)
+parser.add_argument('--seed', default=0, type=int)
+
+
+def get_generator(checkpoint):
+    args = AttrDict(checkpoint['args'])
+    generator = TrajectoryGenerator(
+        obs_len=args.obs_len,
+        pred_len=args.pred_len,
+        embedding_dim=args.embedding_dim,
+        encoder_h_dim=args.encoder_h_dim_g,
+        decoder_h_dim=args.decoder_h_dim_g,
+        mlp_dim=args.mlp_dim,
+        num_layers=args.num_layers,
+        noise_dim=args.noise_dim,
+        noise_type=args.noise_type,
+        noise_mix_type=args.noise_mix_type,
+        pooling_type=args.pooling_type,
+        pool_every_timestep=args.pool_every_timestep,
+        dropout=args.dropout,
+        bottleneck_dim=args.bottleneck_dim,
+        neighborhood_size=args.neighborhood_size,
+        grid_size=args.grid_size,
+        batch_norm=args.batch_norm)
+    generator.load_state_dict(checkpoint['g_state'])
+    generator.train()
+    return generator
+
+
+def evaluate_helper(error, seq_start_end):
+    sum_ = 0
+    error = torch.stack(error, dim=1)
+
+    for (start, end) in seq_start_end:
+        start = start.item()
+        end = end.item()
+        _error = error[start:end]
+        _error = torch.sum(_error, dim=0)
+        _error = torch.min(_error)
+        sum_ += _error
+    return sum_
+
+
+def evaluate(args, loader, generator, num_samples):
+    ade_outer, fde_outer = [], []
+    total_traj = 0
+    generator_time = 0
+    with torch.no_grad():
+        for batch in loader:
+            (obs_traj, pred_traj_gt, obs_traj_rel, pred_traj_gt_rel,
+             non_linear_ped, loss_mask, seq_start_end) = batch
+
+            ade, fde = [], []
+            total_traj += pred_traj_gt.size(1)
+
+            for _ in range(num_samples):
+                start_time = time.time()
+                pred_traj_fake_rel = generator(
+                    obs_traj, obs_traj_rel, seq_start_end
+                )
+                generator_time += time.time() - start_time
+                pred_traj_fake = relative_to_abs(
+                    pred_traj_fake_rel, obs_traj[-1]
+                )
+                ade.append(displacement_error(
+                    pred_traj_fake, pred_traj_gt, mode='raw'
+                ))
+                fde.append(final_displacement_error(
+                    pred_traj_fake[-1], pred_traj_gt[-1], mode='raw'
+                ))
+
+            ade_sum = evaluate_helper(ade, seq_start_end)
+            fde_sum = evaluate_helper(fde, seq_start_end)
+
+            ade_outer.append(ade_sum)
+            fde_outer.append(fde_sum)
+        ade = sum(ade_outer) / (total_traj * args.pred_len)
+        fde = sum(fde_outer) / (total_traj)
+        return ade, fde, generator_time
+
+
+def main(args):
+    if os.path.isdir(args.model_path):
+        filenames = os.listdir(args.model_path)
+        filenames.sort()
+        paths = [
+            os.path.join(args.model_path, file_) for file_ in filenames
+        ]
+    else:
+        paths = [args.model_path]
+
+    print('| Dataset | Pred Len | ADE fp32 | ADE int8 | FDE fp32 | FDE int8 | Generator time fp32 (s) | Generator time int8 (s) |')
+    print('|-----|-----|-----|-----|-----|-----|-----|-----|')
+    for path in paths:
+        checkpoint = torch.load(path, map_location='cpu')
+        _args = AttrDict(checkpoint['args'])
+        path = get_dset_path(_args.dataset_name, args.dset_type)
+        _, loader = data_loader(_args, path)
+        generator = get_generator(checkpoint)
+        results = []
+        for model in (generator, quantize(generator)):
+            # same batches and same noise for both generators, so the errors only differ by the quantization
+            torch.manual_seed(args.seed)
+            results.append(evaluate(_args, loader, model, args.num_samples))
+        (ade, fde, seconds), (ade_int8, fde_int8, seconds_int8) = results
+        print('| `{}` | {} | {:.3f} | {:.3f} | {:.3f} | {:.3f} | {:.1f} | {:.1f} |'.format(
+            _args.dataset_name, _args.pred_len, ade, ade_int8, fde, fde_int8, seconds, seconds_int8))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    main(args)
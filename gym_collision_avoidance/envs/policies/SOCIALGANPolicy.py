@@ -9,6 +9,10 @@ import numpy as np
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.ScenePredictionCache import scene_prediction_cache
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
+from gym_collision_avoidance.envs.policies.ModelRegistry import model_registry
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_checkpoint, inference_mode, inference_graph, load_network
 
 from gym_collision_avoidance.envs.policies.SOCIALGAN.socialgan.data.loader import data_loader, custom_data_loader
 from gym_collision_avoidance.envs.policies.SOCIALGAN.socialgan.models import TrajectoryGenerator
@@ -34,18 +38,19 @@ class SOCIALGANPolicy(InternalPolicy):
         self.is_init = False
 
 
-        #print("load 1")
-        self.checkpoint = torch.load("../envs/policies/SOCIALGAN/models/sgan-models/univ_12_model.pt")
-        #print("load 2")        
-        self.generator = self.get_generator(self.checkpoint)
-        #print("load 3")
+        #checkpoint & generator are loaded once, shared by every SOCIALGANPolicy
+        checkpoint_path = "../envs/policies/SOCIALGAN/models/sgan-models/univ_12_model.pt"
+        self.device = get_torch_device()
+        self.checkpoint, self.generator = model_registry.acquire(self, checkpoint_path, self.device, lambda: self.load_generator(checkpoint_path))
         self._args = AttrDict(self.checkpoint['args'])
 
+    def load_generator(self, checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        return checkpoint, inference_graph(load_network("SOCIALGAN", checkpoint_path, lambda: self.get_generator(checkpoint)))
+
     def init(self,agents):
  
         self.total_agents_num = [None]*self.n_agents
-        self.agent_pos_x = [None]*self.n_agents
-        self.agent_pos_y = [None]*self.n_agents
 
         self.near_goal_threshold = 0.5       
 
@@ -76,7 +81,7 @@ class SOCIALGANPolicy(InternalPolicy):
             grid_size=args.grid_size,
             batch_norm=args.batch_norm)
         generator.load_state_dict(checkpoint['g_state'])
-        generator.cuda()
+        generator.to(self.device)
         generator.train()
         return generator
 
@@ -84,13 +89,13 @@ class SOCIALGANPolicy(InternalPolicy):
         ade_outer, fde_outer = [], []
         total_traj = 0
         #print("pre no grad")
-        with torch.no_grad():
+        with inference_mode():
             #print("in no grad")
             #print("loader")
             #print(loader)
             for batch in loader:
                 #print("in evaluate")
-                batch = [tensor.cuda() for tensor in batch]
+                batch = [tensor.to(self.device) for tensor in batch]
                 (obs_traj, pred_traj_gt, obs_traj_rel, pred_traj_gt_rel,
                  non_linear_ped, loss_mask, seq_start_end) = batch
 
@@ -147,35 +152,7 @@ class SOCIALGANPolicy(InternalPolicy):
 
         #if agents[0].step_num % 4 != 0: return [ agents[agent_index].speed_global_frame , 0 ] #agents[agent_index].delta_heading_global_frame ]
 
-        #print("self.agent_pos_x")
-        #print(self.agent_pos_x)
-
-        #handle new agents due to dynamic number of agents, append length to make room for new agent, (use None for placeholder for newly added)
-        if len(self.agent_pos_x)< self.n_agents:
-            length_diff  = self.n_agents - len(self.agent_pos_x)
-            #print("proceed to add "+str(length_diff))
-            for add in range(length_diff):
-                #print("add "+str(1+add))
-                self.agent_pos_x.append( None )
-                self.agent_pos_y.append( None )
-
-        #print("AFTER self.agent_pos_x")
-        #print(self.agent_pos_x)
-       
-
-        for i in range(self.n_agents):
-            # Copy current agent positions, goal and preferred speeds into np array
-
-            if self.agent_pos_x[i] is None:
-                self.agent_pos_x[i] =   [ agents[i].pos_global_frame[0] ]
-            else:
-                self.agent_pos_x[i] +=  [ agents[i].pos_global_frame[0] ]
-            
-            if self.agent_pos_y[i] is None:
-                self.agent_pos_y[i] =   [ agents[i].pos_global_frame[1] ]
-            else:
-                self.agent_pos_y[i] +=  [ agents[i].pos_global_frame[1] ]
-
+        #positions of every agent are recorded by the env each timestep (see TrajectoryHistory)
 
         if ( agents[agent_index].step_num - agents[agent_index].start_step_num ) <= 3:
 
@@ -207,63 +184,86 @@ class SOCIALGANPolicy(InternalPolicy):
             #print(action)
             return action
   
-        #New agent history appended, but since the dimension might be less than already existed agent, add nan to make dimension regular.
-        self.fill_agent_pos_x = self.agent_pos_x
-        self.fill_agent_pos_y = self.agent_pos_y
+        #The prediction only depends on the scene history (not on which agent is asking),
+        #so it is computed once per timestep and shared by every agent running this policy
+        prediction = scene_prediction_cache.get_prediction(self, full_agent_list, active_agent_mask, self.predict_scene)
 
-        #print("self.fill_agent_pos_x")
-        #print(self.fill_agent_pos_x)
+        #if only target agent present, no other agent exist in observation
+        if prediction is None: return np.array([0,0])
 
-        #print("number ",self.n_agents)
-        for i in range(self.n_agents):
-           
-            #print("FIRST is ",len(self.fill_agent_pos_x[0]))
-            #print(self.fill_agent_pos_x[0])
-            #print("THIS  is ",len(self.fill_agent_pos_x[i]))
-            #print(self.fill_agent_pos_x[i])
+        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
+        before_index = np.array(active_agent_mask)[:agent_index]
 
-            
-            #here we assume the existed (oldest, first) agent history array is the longest  #this assumption will lead to problem
-            #if len(self.fill_agent_pos_x[0]) > len(self.fill_agent_pos_x[i]):
-            if len(max(self.fill_agent_pos_x, key=len)) > len(self.fill_agent_pos_x[i]):
-                
-                #length_diff  = len(self.fill_agent_pos_x[0]) - len(self.fill_agent_pos_x[i])
-                length_diff  = len(max(self.fill_agent_pos_x, key=len)) - len(self.fill_agent_pos_x[i])
-                for add in range(length_diff):
-                    #print("INSERT "+str(add+1))
-                    self.fill_agent_pos_x[i].insert( 0 , np.nan )
-                    self.fill_agent_pos_y[i].insert( 0 , np.nan ) 
+        #see how many non active agents are before index,  minus them calculate index shift
+        agent_index = agent_index - len( before_index[ before_index==False ] )
 
-        
-            
-        #Only take the latest 8 observation #test[:,-8:]
-        #select every 4 element from the end,    reverse it, and select the latest 8 entry
-        #if agents[0].step_num % 2 != 0: return [ agents[agent_index].speed_global_frame , 0 ]
+        agents = list(compress(agents, active_agent_mask))
 
+        prediction_index = 0 #0
+        self.next_waypoint = prediction[prediction_index][agent_index]
+##        print("Agent index")
+##        print(agent_index)
+##        print("position")
+##        print(agents[agent_index].pos_global_frame)
+##        print("observation_x_input")
+##        print(observation_x_input[agent_index])
+##        print("observation_y_input")
+##        print(observation_y_input[agent_index])
+##        print("prediction")
+##        print(prediction)
 
-        
-        
-        #observation_x_input = np.array( self.agent_pos_x )[:,::-4][:,::-1][:,-8:]
-        #observation_y_input = np.array( self.agent_pos_y )[:,::-4][:,::-1][:,-8:]
+        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
+        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
+        if self.dist_to_goal > 1e-8:
+            ref_prll = goal_direction / agents[agent_index].dist_to_goal
+        else:
+            ref_prll = goal_direction
+        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
 
-        #print("active agent mask")
-        #print(active_agent_mask)
+        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
+                                                 ref_prll[0])
+        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
+                                      ref_prll_angle_global_frame)
 
-        #print("before mask")
-        #print(np.array( self.fill_agent_pos_x )[:,::-4][:,::-1][:,-8:])
+    
 
-        observation_x_input = np.array( self.fill_agent_pos_x )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
-        observation_y_input = np.array( self.fill_agent_pos_y )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
+        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
 
-        #print("after mask")
-        #print(observation_x_input)
+        speed_global_frame = np.linalg.norm(vel_global_frame) 
+        print("calc speed")
+        print(speed_global_frame)
+        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
 
+        if speed_global_frame > 1.5: speed_global_frame = 1.5
+        if speed_global_frame < 0.5: speed_global_frame = 0.5
 
-        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
-        before_index = np.array(active_agent_mask)[:agent_index]
+        #But in reality, the format of action is [speed, heading_delta]
 
-        #see how many non active agents are before index,  minus them calculate index shift
-        agent_index = agent_index - len( before_index[ before_index==False ] )
+        action = np.array([speed_global_frame, -heading_ego_frame])
+        print("action")
+        print(action)
+       
+        return action
+
+    def predict_scene(self, agents, active_agent_mask):
+        """ Predict the future trajectory of every active agent from the recorded scene history.
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment (incl. inactive ones)
+            active_agent_mask (np array): (len(agents),) bool, True for agents that are still in the scene
+
+        Returns:
+            prediction (np array): (pred_seq_len, num_active_agents, 2) predicted positions, or None if there is only one active agent
+        """
+        self.n_agents = len(agents)
+
+        #Only take the latest 8 observation, one every 4 steps (NaN before an agent entered the scene)
+        recent_positions = trajectory_history.get_recent(np.flatnonzero(active_agent_mask), self.obs_seq_len, 4)
+        observation_x_input = recent_positions[:,:,0]
+        observation_y_input = recent_positions[:,:,1]
+
+        #print("after mask")
+        #print(observation_x_input)
 
         #assign new number of agents because of active_agent_mask
         self.n_agents = len(observation_x_input)
@@ -297,8 +297,8 @@ class SOCIALGANPolicy(InternalPolicy):
             #temp_x = np.where( ~np.isnan(observation_x_input[agent_ind]) , observation_x_input[agent_ind] , 0)
             #temp_y = np.where( ~np.isnan(observation_y_input[agent_ind]) , observation_y_input[agent_ind] , 0)
 
-            temp_x = np.array(  [x for x in observation_x_input[agent_ind] if str(x) != 'nan']   )
-            temp_y = np.array(  [x for x in observation_y_input[agent_ind] if str(x) != 'nan']   )            
+            temp_x = observation_x_input[agent_ind][ ~np.isnan(observation_x_input[agent_ind]) ]
+            temp_y = observation_y_input[agent_ind][ ~np.isnan(observation_y_input[agent_ind]) ]            
 
             #print("temp_x ")
             #print(len(temp_x) )
@@ -384,7 +384,7 @@ class SOCIALGANPolicy(InternalPolicy):
         #print("observation_x_input")
         #print(observation_x_input.shape)
         #print(observation_x_input)
-        if observation_x_input.shape[0]==1: return np.array([0,0])
+        if observation_x_input.shape[0]==1: return None
 
         #print("relative")
         #print(observation_x_input)
@@ -419,50 +419,6 @@ class SOCIALGANPolicy(InternalPolicy):
         #print("load 4")
         prediction = self.evaluate(self._args, loader, self.generator)
 
-        prediction_index = 0 #0
-        self.next_waypoint = prediction[prediction_index][agent_index]
-##        print("Agent index")
-##        print(agent_index)
-##        print("position")
-##        print(agents[agent_index].pos_global_frame)
-##        print("observation_x_input")
-##        print(observation_x_input[agent_index])
-##        print("observation_y_input")
-##        print(observation_y_input[agent_index])
-##        print("prediction")
-##        print(prediction)
-
-        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
-        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
-        if self.dist_to_goal > 1e-8:
-            ref_prll = goal_direction / agents[agent_index].dist_to_goal
-        else:
-            ref_prll = goal_direction
-        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
-
-        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
-                                                 ref_prll[0])
-        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
-                                      ref_prll_angle_global_frame)
-
-    
-
-        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
-
-        speed_global_frame = np.linalg.norm(vel_global_frame) 
-        print("calc speed")
-        print(speed_global_frame)
-        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
-
-        if speed_global_frame > 1.5: speed_global_frame = 1.5
-        if speed_global_frame < 0.5: speed_global_frame = 0.5
-
-        #But in reality, the format of action is [speed, heading_delta]
-
-        action = np.array([speed_global_frame, -heading_ego_frame])
-        print("action")
-        print(action)
-       
-        return action
+        return prediction
 
 
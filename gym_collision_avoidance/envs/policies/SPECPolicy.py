@@ -20,6 +20,7 @@ import torch.distributions.multivariate_normal as torchdist
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_pickled_array, inference_mode
 
 
 
@@ -137,7 +138,8 @@ class SPECPolicy(InternalPolicy):
         
         self.is_init = False
 
-        self.model = np.load("../envs/policies/SPEC/sgan/univ_best_1.npy",allow_pickle=True)[0]
+        self.device = get_torch_device()
+        self.model = load_pickled_array("../envs/policies/SPEC/sgan/univ_best_1.npy")[0]
 
 
         self.args = parameters()
@@ -430,7 +432,8 @@ class SPECPolicy(InternalPolicy):
        #fut = self.model.predictTraj(data.to("cuda"))
 
         #fut = self.model.predictTrajSample(data.to("cuda"))[0] ## take the first sample
-        fut = self.model.predictNextLoc(data.to("cuda"))[0,:,:,-1]
+        with inference_mode():
+            fut = self.model.predictNextLoc(data.to(self.device))[0,:,:,-1]
         prediction = fut.detach().cpu().numpy() #np.transpose(fut.detach().cpu().numpy() , ( 0,2,1 ) )
         #print("FULL observation_input")
         #print(np.transpose(np.array( observation_input ).astype(np.float32), (1, 2, 0)))
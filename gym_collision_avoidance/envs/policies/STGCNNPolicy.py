@@ -12,6 +12,10 @@ import torch.distributions.multivariate_normal as torchdist
 from gym_collision_avoidance.envs.policies.InternalPolicy import InternalPolicy
 from gym_collision_avoidance.envs import Config
 from gym_collision_avoidance.envs.util import *
+from gym_collision_avoidance.envs.policies.ScenePredictionCache import scene_prediction_cache
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
+from gym_collision_avoidance.envs.policies.ModelRegistry import model_registry
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device, load_checkpoint, inference_mode, inference_graph
 
 from gym_collision_avoidance.envs.policies.Social_STGCNN.utilsv2 import * 
 from gym_collision_avoidance.envs.policies.Social_STGCNN.metrics import * 
@@ -46,21 +50,25 @@ class STGCNNPolicy(InternalPolicy):
         self.tag='social-stgcnn-eth'
         self.use_lrschd=True
 
-        #Defining the model 
-        self.model = social_stgcnn(n_stgcnn =self.n_stgcnn,n_txpcnn=self.n_txpcnn,
+        #Defining the model (loaded once, shared by every STGCNNPolicy)
+        checkpoint_path = os.path.dirname(__file__)+"/Social_STGCNN/checkpoint/social-stgcnn-eth/val_best.pth"
+        self.device = get_torch_device()
+        self.model = model_registry.acquire(self, checkpoint_path, self.device, lambda: self.load_model(checkpoint_path))
+
+    def load_model(self, checkpoint_path):
+        model = social_stgcnn(n_stgcnn =self.n_stgcnn,n_txpcnn=self.n_txpcnn,
         output_feat=self.output_size,seq_len=self.obs_seq_len,
-        kernel_size=self.kernel_size,pred_seq_len=self.pred_seq_len).cuda()
-        self.model.load_state_dict(torch.load(os.path.dirname(__file__)+"/Social_STGCNN/checkpoint/social-stgcnn-eth/val_best.pth"))
+        kernel_size=self.kernel_size,pred_seq_len=self.pred_seq_len).to(self.device)
+        model.load_state_dict(load_checkpoint(checkpoint_path))
 
-        self.model.eval()
+        model.eval()
+        return inference_graph(model)
 
     def init(self,agents):
  
         self.total_agents_num = [None]*self.n_agents
 
         self.total_agents_num = [None]*self.n_agents
-        self.agent_pos_x = [None]*self.n_agents
-        self.agent_pos_y = [None]*self.n_agents
         
         self.near_goal_threshold = 0.5
         
@@ -93,35 +101,7 @@ class STGCNNPolicy(InternalPolicy):
 
         #if agents[0].step_num % 4 != 0: return [ agents[agent_index].speed_global_frame , 0 ] #agents[agent_index].delta_heading_global_frame ]
 
-        #print("self.agent_pos_x")
-        #print(self.agent_pos_x)
-
-        #handle new agents due to dynamic number of agents, append length to make room for new agent, (use None for placeholder for newly added)
-        if len(self.agent_pos_x)< self.n_agents:
-            length_diff  = self.n_agents - len(self.agent_pos_x)
-            #print("proceed to add "+str(length_diff))
-            for add in range(length_diff):
-                #print("add "+str(1+add))
-                self.agent_pos_x.append( None )
-                self.agent_pos_y.append( None )
-
-        #print("AFTER self.agent_pos_x")
-        #print(self.agent_pos_x)
-       
-
-        for i in range(self.n_agents):
-            # Copy current agent positions, goal and preferred speeds into np array
-
-            if self.agent_pos_x[i] is None:
-                self.agent_pos_x[i] =   [ agents[i].pos_global_frame[0] ]
-            else:
-                self.agent_pos_x[i] +=  [ agents[i].pos_global_frame[0] ]
-            
-            if self.agent_pos_y[i] is None:
-                self.agent_pos_y[i] =   [ agents[i].pos_global_frame[1] ]
-            else:
-                self.agent_pos_y[i] +=  [ agents[i].pos_global_frame[1] ]
-
+        #positions of every agent are recorded by the env each timestep (see TrajectoryHistory)
 
         if ( agents[agent_index].step_num - agents[agent_index].start_step_num ) <= 3:
 
@@ -153,63 +133,76 @@ class STGCNNPolicy(InternalPolicy):
             #print(action)
             return action
   
-        #New agent history appended, but since the dimension might be less than already existed agent, add nan to make dimension regular.
-        self.fill_agent_pos_x = self.agent_pos_x
-        self.fill_agent_pos_y = self.agent_pos_y
+        #The prediction only depends on the scene history (not on which agent is asking),
+        #so it is computed once per timestep and shared by every agent running this policy
+        V_pred_rel_to_abs = scene_prediction_cache.get_prediction(self, full_agent_list, active_agent_mask, self.predict_scene)
 
-        #print("self.fill_agent_pos_x")
-        #print(self.fill_agent_pos_x)
+        #if only target agent present, no other agent exist in observation
+        if V_pred_rel_to_abs is None: return np.array([0,0])
 
-        #print("number ",self.n_agents)
-        for i in range(self.n_agents):
-           
-            #print("FIRST is ",len(self.fill_agent_pos_x[0]))
-            #print(self.fill_agent_pos_x[0])
-            #print("THIS  is ",len(self.fill_agent_pos_x[i]))
-            #print(self.fill_agent_pos_x[i])
+        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
+        before_index = np.array(active_agent_mask)[:agent_index]
 
-            
-            #here we assume the existed (oldest, first) agent history array is the longest  #this assumption will lead to problem
-            #if len(self.fill_agent_pos_x[0]) > len(self.fill_agent_pos_x[i]):
-            if len(max(self.fill_agent_pos_x, key=len)) > len(self.fill_agent_pos_x[i]):
-                
-                #length_diff  = len(self.fill_agent_pos_x[0]) - len(self.fill_agent_pos_x[i])
-                length_diff  = len(max(self.fill_agent_pos_x, key=len)) - len(self.fill_agent_pos_x[i])
-                for add in range(length_diff):
-                    #print("INSERT "+str(add+1))
-                    self.fill_agent_pos_x[i].insert( 0 , np.nan )
-                    self.fill_agent_pos_y[i].insert( 0 , np.nan ) 
+        #see how many non active agents are before index,  minus them calculate index shift
+        agent_index = agent_index - len( before_index[ before_index==False ] )
 
-        
-            
-        #Only take the latest 8 observation #test[:,-8:]
-        #select every 4 element from the end,    reverse it, and select the latest 8 entry
-        #if agents[0].step_num % 2 != 0: return [ agents[agent_index].speed_global_frame , 0 ]
+        agents = list(compress(agents, active_agent_mask))
 
+        prediction_index = 0 #0
+        self.next_waypoint =  V_pred_rel_to_abs[prediction_index][agent_index] #agents[agent_index].pos_global_frame +
+        #print(next_waypoint)
 
-        
-        
-        #observation_x_input = np.array( self.agent_pos_x )[:,::-4][:,::-1][:,-8:]
-        #observation_y_input = np.array( self.agent_pos_y )[:,::-4][:,::-1][:,-8:]
 
-        #print("active agent mask")
-        #print(active_agent_mask)
+        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
+        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
+        if self.dist_to_goal > 1e-8:
+            ref_prll = goal_direction / agents[agent_index].dist_to_goal
+        else:
+            ref_prll = goal_direction
+        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
 
-        #print("before mask")
-        #print(np.array( self.fill_agent_pos_x )[:,::-4][:,::-1][:,-8:])
+        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
+                                                 ref_prll[0])
+        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
+                                      ref_prll_angle_global_frame)
 
-        observation_x_input = np.array( self.fill_agent_pos_x )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
-        observation_y_input = np.array( self.fill_agent_pos_y )[ active_agent_mask ][:,::-4][:,::-1][:,-8:]
+    
 
-        #print("after mask")
-        #print(observation_x_input)
+        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
 
+        speed_global_frame = np.linalg.norm(vel_global_frame) 
+        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
+        
+        if speed_global_frame > 1.5: speed_global_frame = 1.5
+        if speed_global_frame < 0.5: speed_global_frame = 0.5
+        #But in reality, the format of action is [speed, heading_delta]
 
-        #check if elements before index contains non active agents, if yes, remove them, thus calculate the index shift
-        before_index = np.array(active_agent_mask)[:agent_index]
+        action = np.array([speed_global_frame, -heading_ego_frame])
+        print("action")
+        print(action)
+       
+        return action
 
-        #see how many non active agents are before index,  minus them calculate index shift
-        agent_index = agent_index - len( before_index[ before_index==False ] )
+    @inference_mode()
+    def predict_scene(self, agents, active_agent_mask):
+        """ Predict the future trajectory of every active agent from the recorded scene history.
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment (incl. inactive ones)
+            active_agent_mask (np array): (len(agents),) bool, True for agents that are still in the scene
+
+        Returns:
+            prediction (np array): (pred_seq_len, num_active_agents, 2) predicted positions, or None if there is only one active agent
+        """
+        self.n_agents = len(agents)
+
+        #Only take the latest 8 observation, one every 4 steps (NaN before an agent entered the scene)
+        recent_positions = trajectory_history.get_recent(np.flatnonzero(active_agent_mask), self.obs_seq_len, 4)
+        observation_x_input = recent_positions[:,:,0]
+        observation_y_input = recent_positions[:,:,1]
+
+        #print("after mask")
+        #print(observation_x_input)
 
         #assign new number of agents because of active_agent_mask
         self.n_agents = len(observation_x_input)
@@ -243,8 +236,8 @@ class STGCNNPolicy(InternalPolicy):
             #temp_x = np.where( ~np.isnan(observation_x_input[agent_ind]) , observation_x_input[agent_ind] , 0)
             #temp_y = np.where( ~np.isnan(observation_y_input[agent_ind]) , observation_y_input[agent_ind] , 0)
 
-            temp_x = np.array(  [x for x in observation_x_input[agent_ind] if str(x) != 'nan']   )
-            temp_y = np.array(  [x for x in observation_y_input[agent_ind] if str(x) != 'nan']   )            
+            temp_x = observation_x_input[agent_ind][ ~np.isnan(observation_x_input[agent_ind]) ]
+            temp_y = observation_y_input[agent_ind][ ~np.isnan(observation_y_input[agent_ind]) ]            
 
             #print("temp_x ")
             #print(len(temp_x) )
@@ -324,37 +317,15 @@ class STGCNNPolicy(InternalPolicy):
         #print("relative")
         #print(observation_x_input)
 
-        ####FOR Observation input, its shape is [20, num_agents, 3(agent_id,x,y) ]
-        #####HOWEVER, the target agent have to be the last within the timestamp array, e.g:  for 1,2,3 agents, if agent 2 is target agent, then for timestamp x, the array is [ [1,x,y],[3,x,y],[2,x,y] ]
-
-        ####Basically, remove the target agent from the array and append to the end of the array
-
-        observation_input = []
-        for time_ind in range(self.obs_seq_len):
-            
-            for agent_ind in range(self.n_agents):
-                observation_input.append([ time_ind , agent_ind , observation_x_input[agent_ind][time_ind], observation_y_input[agent_ind][time_ind] ])
-
-
-
-        observation_len = len(observation_input)
-
-
         #if only target agent present, no other agent exist in observation
-        if observation_len== self.obs_seq_len: return np.array([0,0])
-        
-        data = np.array(observation_input)#np.column_stack((observation_timestamp,observation_agent_id,observation_agent_pos_x,observation_agent_pos_y))
-
-        dset_test = Simulator_TrajectoryDataset(data,
-                skip=1,norm_lap_matr=True)
+        if self.n_agents == 1: return None
 
-        loader_test = dset_test.__getitem__(0)
-        batch = loader_test
+        #(num_agents, 2(x,y), obs_seq_len) observed positions -> graph, without going through Simulator_TrajectoryDataset
+        positions = np.stack([ observation_x_input, observation_y_input ], axis=1)[:,:,:self.obs_seq_len]
+        obs_traj, obs_traj_rel, V_obs, A_obs = trajectories_to_graph(positions, norm_lap_matr=True)
 
         #Get data
-        batch = [tensor.cuda() for tensor in batch]
-        obs_traj, pred_traj_gt, obs_traj_rel, pred_traj_gt_rel, non_linear_ped,\
-         loss_mask,V_obs,A_obs,V_tr,A_tr = batch
+        obs_traj, obs_traj_rel, V_obs, A_obs = [tensor.to(self.device) for tensor in (obs_traj, obs_traj_rel, V_obs, A_obs)]
 
         num_of_objs = obs_traj_rel.shape[0]
 
@@ -382,11 +353,9 @@ class STGCNNPolicy(InternalPolicy):
         # torch.Size([1, 12, 2, 5])>>seq,node,feat
         # V_pred= torch.rand_like(V_tr).cuda()
 
-        V_tr = V_tr.squeeze()
-        A_tr = A_tr.squeeze()
         V_pred = V_pred.squeeze()
         num_of_objs = obs_traj_rel.shape[0]
-        V_pred,V_tr =  V_pred[:,:num_of_objs,:],V_tr[:,:num_of_objs,:]
+        V_pred =  V_pred[:,:num_of_objs,:]
         #print(V_pred.shape)
 
         #For now I have my bi-variate parameters 
@@ -396,7 +365,7 @@ class STGCNNPolicy(InternalPolicy):
         sy = torch.exp(V_pred[:,:,3]) #sy
         corr = torch.tanh(V_pred[:,:,4]) #corr
 
-        cov = torch.zeros(V_pred.shape[0],V_pred.shape[1],2,2).cuda()
+        cov = torch.zeros(V_pred.shape[0],V_pred.shape[1],2,2, device=self.device)
         cov[:,:,0,0]= sx*sx
         cov[:,:,0,1]= corr*sx*sy
         cov[:,:,1,0]= corr*sx*sy
@@ -418,12 +387,6 @@ class STGCNNPolicy(InternalPolicy):
         ade_ls = {}
         fde_ls = {}
         V_x = seq_to_nodes(obs_traj.data.cpu().numpy().copy())
-        V_x_rel_to_abs = nodes_rel_to_nodes_abs(V_obs.data.cpu().numpy().squeeze().copy(),
-                                                 V_x[0,:,:].copy())
-
-        V_y = seq_to_nodes(pred_traj_gt.data.cpu().numpy().copy())
-        V_y_rel_to_abs = nodes_rel_to_nodes_abs(V_tr.data.cpu().numpy().squeeze().copy(),
-                                                 V_x[-1,:,:].copy())
 
 
         global V_pred_rel_to_abs
@@ -438,40 +401,7 @@ class STGCNNPolicy(InternalPolicy):
 ##        print(V_pred_rel_to_abs.shape)
 ##        print(V_pred_rel_to_abs)
 
-        prediction_index = 0 #0
-        self.next_waypoint =  V_pred_rel_to_abs[prediction_index][agent_index] #agents[agent_index].pos_global_frame +
-        #print(next_waypoint)
-
-
-        goal_direction = self.next_waypoint - agents[agent_index].pos_global_frame
-        self.dist_to_goal = math.sqrt(goal_direction[0]**2 + goal_direction[1]**2)
-        if self.dist_to_goal > 1e-8:
-            ref_prll = goal_direction / agents[agent_index].dist_to_goal
-        else:
-            ref_prll = goal_direction
-        ref_orth = np.array([-ref_prll[1], ref_prll[0]])  # rotate by 90 deg
-
-        ref_prll_angle_global_frame = np.arctan2(ref_prll[1],
-                                                 ref_prll[0])
-        heading_ego_frame = wrap( agents[agent_index].heading_global_frame -
-                                      ref_prll_angle_global_frame)
-
-    
-
-        vel_global_frame = (( goal_direction)/4) / agents[agent_index].dt_nominal
-
-        speed_global_frame = np.linalg.norm(vel_global_frame) 
-        #if speed_global_frame > agents[agent_index].pref_speed: speed_global_frame = agents[agent_index].pref_speed
-        
-        if speed_global_frame > 1.5: speed_global_frame = 1.5
-        if speed_global_frame < 0.5: speed_global_frame = 0.5
-        #But in reality, the format of action is [speed, heading_delta]
-
-        action = np.array([speed_global_frame, -heading_ego_frame])
-        print("action")
-        print(action)
-       
-        return action
+        return V_pred_rel_to_abs
 
 '''
 observation?
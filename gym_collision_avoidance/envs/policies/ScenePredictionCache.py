@@ -0,0 +1,48 @@
+import numpy as np
+
+class ScenePredictionCache(object):
+    """ Share one full-scene trajectory prediction between every agent that runs the same policy class on a timestep.
+
+    Trajectory-prediction policies (e.g., :class:`~gym_collision_avoidance.envs.policies.STGCNNPolicy.STGCNNPolicy`)
+    predict the future of every active agent in the scene at once, but :code:`find_next_action` is called once per agent.
+    Entries are keyed by (policy class, agent list, timestep, active agents), so the model runs once per timestep
+    and each agent just reads its own row from the cached prediction.
+
+    Only the latest entry per policy class is kept, and :meth:`reset` should be called at the start of each episode
+    (the env does this), since timesteps repeat across episodes.
+
+    """
+    def __init__(self):
+        self.entries = {}
+
+    def reset(self):
+        """ Drop every cached prediction. """
+        self.entries = {}
+
+    def get_prediction(self, policy, agents, active_agent_mask, predict_fn):
+        """ Return the cached scene prediction for this policy class & timestep, or compute it with :code:`predict_fn`.
+
+        Args:
+            policy (:class:`~gym_collision_avoidance.envs.policies.Policy.Policy`): the policy asking for a prediction
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment (incl. inactive ones)
+            active_agent_mask (np array): (len(agents),) bool, True for agents that are still in the scene
+            predict_fn (function): called as :code:`predict_fn(agents, active_agent_mask)` on a cache miss
+
+        Returns:
+            whatever :code:`predict_fn` returned (prediction of every active agent, or None if there's nothing to predict)
+
+        """
+        active_agent_inds = tuple(np.flatnonzero(active_agent_mask))
+        step_num = max(agents[i].step_num for i in active_agent_inds) if len(active_agent_inds) > 0 else None
+        key = (id(agents), step_num, active_agent_inds)
+
+        entry = self.entries.get(type(policy))
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        prediction = predict_fn(agents, active_agent_mask)
+        self.entries[type(policy)] = (key, prediction)
+        return prediction
+
+# One cache per process, shared by every policy instance
+scene_prediction_cache = ScenePredictionCache()
@@ -15,7 +15,6 @@ import torch.optim as optim
 from torch.utils.data import Dataset
 from torch.utils.data import DataLoader
 from numpy import linalg as LA
-import networkx as nx
 from tqdm import tqdm
 import time
 
@@ -26,32 +25,59 @@ def anorm(p1,p2):
         return 0
     return 1/(NORM)
                 
+def normalized_laplacian(A):
+    """
+    Input:
+    - A: Numpy array of shape (seq_len, num_nodes, num_nodes), weighted adjacency (with self loops) per timestep
+    Output:
+    - Numpy array of the same shape, D^-1/2 (D - A) D^-1/2 per timestep (as networkx.normalized_laplacian_matrix)
+    """
+    degree = A.sum(axis=2)
+    with np.errstate(divide='ignore'):
+        degree_inv_sqrt = np.where(degree > 0, 1./np.sqrt(degree), 0.)
+    laplacian = -A
+    nodes = np.arange(A.shape[1])
+    laplacian[:, nodes, nodes] += degree
+    return degree_inv_sqrt[:, :, np.newaxis] * laplacian * degree_inv_sqrt[:, np.newaxis, :]
+
 def seq_to_graph(seq_,seq_rel,norm_lap_matr = True):
-    seq_ = seq_.squeeze()
-    seq_rel = seq_rel.squeeze()
-    seq_len = seq_.shape[2]
-    max_nodes = seq_.shape[0]
-
-    
-    V = np.zeros((seq_len,max_nodes,2))
-    A = np.zeros((seq_len,max_nodes,max_nodes))
-    for s in range(seq_len):
-        step_ = seq_[:,:,s]
-        step_rel = seq_rel[:,:,s]
-        for h in range(len(step_)): 
-            V[s,h,:] = step_rel[h]
-            A[s,h,h] = 1
-            for k in range(h+1,len(step_)):
-                l2_norm = anorm(step_rel[h],step_rel[k])
-                A[s,h,k] = l2_norm
-                A[s,k,h] = l2_norm
-        if norm_lap_matr: 
-            G = nx.from_numpy_matrix(A[s,:,:])
-            A[s,:,:] = nx.normalized_laplacian_matrix(G).toarray()
-            
+    # every timestep at once: A[s,h,k] = 1/||rel_h - rel_k|| (0 if equal), with 1 on the diagonal
+    # (num_peds, 2, seq_len), also for a single pedestrian or timestep (which squeeze() would drop)
+    seq_rel = seq_rel.reshape(-1, 2, seq_rel.shape[-1])
+    max_nodes = seq_rel.shape[0]
+
+    V = np.transpose(np.asarray(seq_rel, dtype=np.float64), (2, 0, 1))
+    diff = V[:, :, np.newaxis, :] - V[:, np.newaxis, :, :]
+    norm = np.sqrt(np.sum(diff**2, axis=3))
+    with np.errstate(divide='ignore'):
+        A = np.where(norm == 0, 0., 1./norm)
+    nodes = np.arange(max_nodes)
+    A[:, nodes, nodes] = 1
+    if norm_lap_matr:
+        A = normalized_laplacian(A)
+
     return torch.from_numpy(V).type(torch.float),\
            torch.from_numpy(A).type(torch.float)
 
+def trajectories_to_graph(positions, norm_lap_matr = True):
+    """
+    Inference-only version of Simulator_TrajectoryDataset(...)[0], for a scene where every pedestrian
+    is observed at every timestep (skips the dataset bookkeeping, poly_fit and the empty prediction graph)
+    Input:
+    - positions: Numpy array of shape (num_peds, 2, obs_len), absolute positions
+    Output:
+    - obs_traj, obs_traj_rel: torch float tensors of shape (num_peds, 2, obs_len)
+    - V_obs, A_obs: graph of the observation, as from seq_to_graph
+    """
+    positions = np.around(positions, decimals=4)
+    positions_rel = np.zeros(positions.shape)
+    positions_rel[:, :, 1:] = positions[:, :, 1:] - positions[:, :, :-1]
+
+    obs_traj = torch.from_numpy(positions).type(torch.float)
+    obs_traj_rel = torch.from_numpy(positions_rel).type(torch.float)
+    V_obs, A_obs = seq_to_graph(obs_traj, obs_traj_rel, norm_lap_matr)
+    return obs_traj, obs_traj_rel, V_obs, A_obs
+
 
 def poly_fit(traj, traj_len, threshold):
     """
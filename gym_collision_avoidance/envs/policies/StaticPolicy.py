@@ -21,3 +21,14 @@ class StaticPolicy(InternalPolicy):
         agents[i].goal_global_frame = agents[i].pos_global_frame
         action = np.array([0.0, 0.0])
         return action
+
+    def find_next_actions(self, obs_list, agents, agent_indices, active_agent_mask):
+        """ Same as :code:`find_next_action` for each of agent_indices, in one shot
+
+        Returns:
+            np array of shape (len(agent_indices), 2)... all zeros
+
+        """
+        for i in agent_indices:
+            agents[i].goal_global_frame = agents[i].pos_global_frame
+        return np.zeros((len(agent_indices), 2))
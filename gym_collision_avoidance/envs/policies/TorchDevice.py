@@ -0,0 +1,155 @@
+import io
+import os
+import pickle
+import numpy as np
+import torch
+from gym_collision_avoidance.envs import Config
+
+def get_torch_device():
+    """ The device every learned predictor policy (STGCNN, SOCIALGAN, NAVIGAN, ...) keeps its network and tensors on.
+
+    Set by :code:`Config.TORCH_DEVICE` (or the :code:`GYM_TORCH_DEVICE` environment variable): 'cpu' (default),
+    'cuda', 'cuda:1', ..., or 'auto' for cuda when available, else cpu.
+
+    """
+    device = Config.TORCH_DEVICE
+    if device == 'auto':
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(device)
+
+def load_checkpoint(path):
+    """ :code:`torch.load` a checkpoint straight onto :func:`get_torch_device` (e.g., a checkpoint saved from a GPU onto a CPU-only machine) """
+    return torch.load(path, map_location=get_torch_device())
+
+def load_pickled_array(path):
+    """ :code:`np.load` a pickled object array (e.g., of whole networks) with every tensor in it loaded straight onto :func:`get_torch_device`,
+    instead of onto the device it was saved from """
+    class DeviceUnpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            # pickled tensors rebuild their storage with torch.load, which would otherwise use the saved device
+            if (module, name) == ('torch.storage', '_load_from_bytes'):
+                return lambda b: torch.load(io.BytesIO(b), map_location=get_torch_device(), weights_only=False)
+            return pickle.Unpickler.find_class(self, module, name)
+
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f) if version == (1, 0) else np.lib.format.read_array_header_2_0(f)
+        if not dtype.hasobject:
+            raise ValueError("{} is not a pickled object array".format(path))
+        return DeviceUnpickler(f).load()
+
+def inference_mode():
+    """ Context manager (or decorator) that turns off autograd for inference:
+    :code:`torch.inference_mode()` where available (torch >= 1.9), :code:`torch.no_grad()` otherwise. """
+    if hasattr(torch, 'inference_mode'):
+        return torch.inference_mode()
+    return torch.no_grad()
+
+class InferenceGraph(object):
+    """ Run a network through an optimized inference graph instead of eagerly.
+
+    Args:
+        model (torch.nn.Module): the network (already on its device, in the mode it should run in)
+        mode (str): 'trace' (:code:`torch.jit.trace`) or 'compile' (:code:`torch.compile`, torch >= 2.0)
+
+    Traced graphs are specialized to the shapes of the inputs (and to any python control flow they went through),
+    so one graph is traced per distinct set of input shapes (e.g., per number of agents in the scene).
+    Tracing only handles positional tensor inputs: calls with keyword arguments run the network eagerly.
+    Compiled graphs may draw different random numbers than the eager network would.
+    Any other attribute (e.g., :code:`pred_len`, :code:`eval()`) is the network's.
+
+    """
+    def __init__(self, model, mode):
+        if mode == 'compile' and not hasattr(torch, 'compile'):
+            raise ValueError("TORCH_INFERENCE_GRAPH 'compile' needs torch >= 2.0 (use 'trace' or None)")
+        if mode not in ('trace', 'compile'):
+            raise ValueError("Unknown TORCH_INFERENCE_GRAPH {} (should be 'trace', 'compile' or None)".format(mode))
+        self.model = model
+        self.mode = mode
+        self.traced_graphs = {}
+        self.compiled_model = torch.compile(model) if mode == 'compile' else None
+
+    def __call__(self, *inputs, **kwargs):
+        if self.mode == 'compile':
+            return self.compiled_model(*inputs, **kwargs)
+        if kwargs:
+            return self.model(*inputs, **kwargs)
+        key = tuple((tuple(tensor.shape), tensor.dtype) for tensor in inputs)
+        graph = self.traced_graphs.get(key)
+        if graph is None:
+            # tracing runs the network once, which shouldn't use up random numbers (e.g., SOCIALGAN's noise)
+            with torch.random.fork_rng():
+                graph = self.traced_graphs[key] = torch.jit.trace(self.model, inputs, check_trace=False)
+        return graph(*inputs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def inference_graph(model):
+    """ :code:`model` wrapped in an :class:`InferenceGraph` as set by :code:`Config.TORCH_INFERENCE_GRAPH` (the model itself if None) """
+    if Config.TORCH_INFERENCE_GRAPH is None:
+        return model
+    return InferenceGraph(model, Config.TORCH_INFERENCE_GRAPH)
+
+def quantize(model):
+    """ Copy of :code:`model` whose Linear and LSTM layers run dynamically quantized to int8
+    (weights stored as int8, activations quantized on the fly), for faster cpu inference """
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM, torch.nn.LSTMCell}, dtype=torch.qint8)
+
+# policies whose quantized accuracy was measured (SOCIALGAN/QUANTIZATION.md): no ADE/FDE report exists yet for the others
+# (NAVIGAN, GROUPNAVIGAN, SLSTM), so they always load their fp32 networks
+QUANTIZABLE_POLICIES = ['SOCIALGAN']
+
+def is_quantized(policy_name):
+    """ Whether :code:`Config.QUANTIZED_POLICIES` asks for :code:`policy_name`'s network to be quantized (which only runs on cpu) """
+    # checks the whole list: the other policies never ask, so they'd silently run in fp32
+    for name in Config.QUANTIZED_POLICIES:
+        if name not in QUANTIZABLE_POLICIES:
+            raise ValueError("{} is in QUANTIZED_POLICIES, but only {} can be quantized (the others have no accuracy report in SOCIALGAN/QUANTIZATION.md)".format(name, QUANTIZABLE_POLICIES))
+    if policy_name not in Config.QUANTIZED_POLICIES:
+        return False
+    if get_torch_device().type != 'cpu':
+        raise ValueError("{} is in QUANTIZED_POLICIES, but quantized networks only run on cpu (TORCH_DEVICE is {})".format(policy_name, Config.TORCH_DEVICE))
+    return True
+
+def load_network(policy_name, checkpoint_path, load_fn):
+    """ Load a learned predictor policy's network, :func:`quantize`\ d if :code:`policy_name` is in :code:`Config.QUANTIZED_POLICIES`.
+
+    Args:
+        policy_name (str): name of the policy (e.g., 'SOCIALGAN')
+        checkpoint_path (str): checkpoint file the network is loaded from
+        load_fn (function): called with no arguments, returns the network loaded from :code:`checkpoint_path`
+
+    Returns:
+        the network (whatever :code:`load_fn` returned, or its quantized copy)
+
+    The quantized network is also stored next to the checkpoint (<checkpoint>_int8.pt, rebuilt whenever the checkpoint
+    or the torch version changes), so later loads read it from there without calling :code:`load_fn`.
+
+    """
+    if not is_quantized(policy_name):
+        return load_fn()
+
+    cache_path = os.path.splitext(checkpoint_path)[0]+"_int8.pt"
+    # size and modification time of the checkpoint, to tell whether the quantized network on disk is stale
+    stamp = [os.path.getsize(checkpoint_path), os.path.getmtime(checkpoint_path), torch.__version__]
+    if os.path.exists(cache_path):
+        try:
+            try:
+                cache = torch.load(cache_path, map_location='cpu', weights_only=False)
+            except TypeError: # torch < 1.13 has no weights_only (and always loads whole modules)
+                cache = torch.load(cache_path, map_location='cpu')
+            if cache['stamp'] == stamp:
+                return cache['network']
+        except Exception: # e.g., truncated file, or a model class that moved since: quantize again
+            pass
+
+    network = quantize(load_fn())
+    try:
+        # write to a temporary file first, so processes loading the same policy never read a half-written cache
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        torch.save({'stamp': stamp, 'network': network}, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass # e.g., read-only install: quantize again next time
+    return network
@@ -0,0 +1,67 @@
+import numpy as np
+from gym_collision_avoidance.envs import Config
+
+class TrajectoryHistory(object):
+    """ Recent positions of every agent in the scene, for trajectory-prediction policies that observe the scene history
+    (e.g., :class:`~gym_collision_avoidance.envs.policies.STGCNNPolicy.STGCNNPolicy`).
+
+    The env calls :meth:`record` once per timestep (before the policies pick their actions) and :meth:`reset` at the start of
+    each episode. Positions go into a fixed-size (num agents x :code:`window` x 2) ring buffer, so recording and reading
+    the last few observations cost the same no matter how long the episode has been running.
+
+    Rows follow the env's agent list: agents appended mid-episode (respawn) get a new row, and a row whose agent
+    object changed starts over. Entries from before an agent was in the scene are NaN.
+
+    """
+    def __init__(self, window):
+        self.window = window
+        self.num_resets = 0
+        self.reset()
+
+    def reset(self):
+        """ Forget every recorded position. """
+        self.num_resets += 1 # lets policies that keep state between timesteps tell episodes apart
+        self.positions = np.full((0, self.window, 2), np.nan)
+        self.row_agent_ids = []
+        self.num_steps = 0
+
+    def record(self, agents):
+        """ Store the current position of each agent (row i = agents[i]) as the newest timestep. """
+        num_agents = len(agents)
+        if num_agents > len(self.positions):
+            grown = np.full((max(num_agents, 2*len(self.positions)), self.window, 2), np.nan)
+            grown[:len(self.positions)] = self.positions
+            self.positions = grown
+
+        agent_ids = [id(agent) for agent in agents]
+        if agent_ids != self.row_agent_ids:
+            for i, agent_id in enumerate(agent_ids):
+                if i >= len(self.row_agent_ids) or self.row_agent_ids[i] != agent_id:
+                    self.positions[i] = np.nan
+            self.positions[num_agents:] = np.nan
+            self.row_agent_ids = agent_ids
+
+        slot = self.num_steps % self.window
+        self.positions[:num_agents, slot] = [agent.pos_global_frame for agent in agents]
+        self.num_steps += 1
+
+    def get_recent(self, agent_inds, num_obs, stride):
+        """ The last :code:`num_obs` recorded positions of some agents, every :code:`stride` timesteps, ending at the newest one.
+
+        Args:
+            agent_inds (list): indices of the agents (in the agent list passed to :meth:`record`)
+            num_obs (int): number of positions per agent
+            stride (int): timesteps between two positions
+
+        Returns:
+            positions (np array): (len(agent_inds), num_obs, 2) oldest first, NaN where the agent wasn't recorded yet
+
+        """
+        assert stride*(num_obs-1) < self.window, "TrajectoryHistory window is too short for {} observations every {} steps".format(num_obs, stride)
+        steps = self.num_steps - 1 - stride*np.arange(num_obs-1, -1, -1)
+        recent = self.positions[np.asarray(agent_inds, dtype=int)[:, np.newaxis], (steps % self.window)[np.newaxis, :]]
+        recent[:, steps < 0] = np.nan
+        return recent
+
+# One history per process, recorded by the env and shared by every policy instance
+trajectory_history = TrajectoryHistory(Config.TRAJECTORY_HISTORY_WINDOW)
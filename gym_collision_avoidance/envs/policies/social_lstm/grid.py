@@ -1,6 +1,5 @@
 import numpy as np
 import torch
-import itertools
 from torch.autograd import Variable
 
 
@@ -30,33 +29,32 @@ def getGridMask(frame, dimensions, num_person, neighborhood_size, grid_size, is_
     width_bound, height_bound = (neighborhood_size/(width*1.0))*2, (neighborhood_size/(height*1.0))*2
     #print("weight_bound: ", width_bound, "height_bound: ", height_bound)
 
-    #instead of 2 inner loop, we check all possible 2-permutations which is 2 times faster.
-    list_indices = list(range(0, mnp))
-    for real_frame_index, other_real_frame_index in itertools.permutations(list_indices, 2):
-        current_x, current_y = frame_np[real_frame_index, 0], frame_np[real_frame_index, 1]
-
-        width_low, width_high = current_x - width_bound/2, current_x + width_bound/2
-        height_low, height_high = current_y - height_bound/2, current_y + height_bound/2
-
-        other_x, other_y = frame_np[other_real_frame_index, 0], frame_np[other_real_frame_index, 1]
-        
-        #if (other_x >= width_high).all() or (other_x < width_low).all() or (other_y >= height_high).all() or (other_y < height_low).all():
-        if (other_x >= width_high) or (other_x < width_low) or (other_y >= height_high) or (other_y < height_low):
-                # Ped not in surrounding, so binary mask should be zero
-                #print("not surrounding")
-                continue
-        # If in surrounding, calculate the grid cell
-        cell_x = int(np.floor(((other_x - width_low)/width_bound) * grid_size))
-        cell_y = int(np.floor(((other_y - height_low)/height_bound) * grid_size))
-
-        if cell_x >= grid_size or cell_x < 0 or cell_y >= grid_size or cell_y < 0:
-                continue
-
-        if is_occupancy:
-            frame_mask[real_frame_index, cell_x + cell_y*grid_size] = 1
-        else:
-            # Other ped is in the corresponding grid cell of current ped
-            frame_mask[real_frame_index, other_real_frame_index, cell_x + cell_y*grid_size] = 1
+    #instead of looping over every pair of peds, compute the cell of every other ped in every ped's grid at once.
+    #same precision as per-pair scalar arithmetic would use (float64 on numpy < 2, the frame's dtype on numpy >= 2),
+    #so the masks match the ones the models were trained with
+    frame_np = frame_np[:mnp, :2].astype((frame_np.dtype.type(0) - width_bound).dtype)
+    current_x, current_y = frame_np[:, 0, np.newaxis], frame_np[:, 1, np.newaxis] #row: current ped
+    other_x, other_y = frame_np[np.newaxis, :, 0], frame_np[np.newaxis, :, 1]     #column: other ped
+
+    width_low, width_high = current_x - width_bound/2, current_x + width_bound/2
+    height_low, height_high = current_y - height_bound/2, current_y + height_bound/2
+
+    # Ped not in surrounding (or the ped itself), so binary mask should be zero
+    in_surrounding = (other_x < width_high) & (other_x >= width_low) & (other_y < height_high) & (other_y >= height_low)
+    np.fill_diagonal(in_surrounding, False)
+
+    # If in surrounding, calculate the grid cell
+    cell_x = np.floor(((other_x - width_low)/width_bound) * grid_size)
+    cell_y = np.floor(((other_y - height_low)/height_bound) * grid_size)
+    in_grid = in_surrounding & (cell_x < grid_size) & (cell_x >= 0) & (cell_y < grid_size) & (cell_y >= 0)
+
+    real_frame_index, other_real_frame_index = np.nonzero(in_grid)
+    cell_index = cell_x[in_grid].astype(int) + cell_y[in_grid].astype(int)*grid_size
+    if is_occupancy:
+        frame_mask[real_frame_index, cell_index] = 1
+    else:
+        # Other ped is in the corresponding grid cell of current ped
+        frame_mask[real_frame_index, other_real_frame_index, cell_index] = 1
 
     #Two inner loops aproach -> slower
     # # For each ped in the frame (existent and non-existent)
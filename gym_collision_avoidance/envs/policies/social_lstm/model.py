@@ -66,15 +66,8 @@ class SocialModel(nn.Module):
         # Number of peds
         numNodes = grid.size()[0]
 
-        # Construct the variable
-        social_tensor = Variable(torch.zeros(numNodes, self.grid_size*self.grid_size, self.rnn_size))
-        if self.use_cuda:
-            social_tensor = social_tensor.cuda()
-        
-        # For each ped
-        for node in range(numNodes):
-            # Compute the social tensor
-            social_tensor[node] = torch.mm(torch.t(grid[node]), hidden_states)
+        # Compute the social tensor of every ped at once (batched over peds: grid[node]^T x hidden_states)
+        social_tensor = torch.matmul(torch.transpose(grid, 1, 2), hidden_states)
 
         # Reshape the social tensor
         social_tensor = social_tensor.view(numNodes, self.grid_size*self.grid_size*self.rnn_size)
@@ -118,9 +111,7 @@ class SocialModel(nn.Module):
         look_up = args[7]
 
         numNodes = len(look_up)
-        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size))
-        if self.use_cuda:            
-            outputs = outputs.cuda()
+        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size, device=input_data.device))
 
         # For each frame in the sequence
         for framenum,frame in enumerate(input_data):
@@ -142,9 +133,7 @@ class SocialModel(nn.Module):
             #print("lookup table :%s"% look_up)
             list_of_nodes = [look_up[x] for x in nodeIDs]
 
-            corr_index = Variable((torch.LongTensor(list_of_nodes)))
-            if self.use_cuda:            
-                corr_index = corr_index.cuda()
+            corr_index = Variable((torch.LongTensor(list_of_nodes))).to(input_data.device)
 
             #print("list of nodes: %s"%nodeIDs)
             #print("trans: %s"%corr_index)
@@ -197,11 +186,6 @@ class SocialModel(nn.Module):
                 cell_states[corr_index.data] = c_nodes
 
         # Reshape outputs
-        outputs_return = Variable(torch.zeros(self.seq_length, numNodes, self.output_size))
-        if self.use_cuda:
-            outputs_return = outputs_return.cuda()
-        for framenum in range(self.seq_length):
-            for node in range(numNodes):
-                outputs_return[framenum, node, :] = outputs[framenum*numNodes + node, :]
+        outputs_return = outputs.view(self.seq_length, numNodes, self.output_size)
 
         return outputs_return, hidden_states, cell_states
@@ -65,9 +65,7 @@ class OLSTMModel(nn.Module):
         # Number of peds
         numNodes = grid.size()[0]
         # Construct the variable
-        Obs_tensor = Variable(torch.zeros(numNodes, self.grid_size*self.grid_size))
-        if self.use_cuda:
-            Obs_tensor = Obs_tensor.cuda()
+        Obs_tensor = Variable(torch.zeros(numNodes, self.grid_size*self.grid_size, device=grid.device))
         # For each ped
         for node in range(numNodes):
             # Compute the obstacle tensor
@@ -117,9 +115,7 @@ class OLSTMModel(nn.Module):
         look_up = args[7]
 
         numNodes = len(look_up)
-        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size))
-        if self.use_cuda:            
-            outputs = outputs.cuda()
+        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size, device=input_data.device))
 
         # For each frame in the sequence
         for framenum,frame in enumerate(input_data):
@@ -142,9 +138,7 @@ class OLSTMModel(nn.Module):
             #print("lookup table :%s"% look_up)
             list_of_nodes = [look_up[x] for x in nodeIDs]
 
-            corr_index = Variable((torch.LongTensor(list_of_nodes)))
-            if self.use_cuda:
-                corr_index = corr_index.cuda()
+            corr_index = Variable((torch.LongTensor(list_of_nodes))).to(input_data.device)
             #print("list of nodes: %s"%nodeIDs)
             #print("trans: %s"%corr_index)
             #if self.use_cuda:
@@ -195,9 +189,7 @@ class OLSTMModel(nn.Module):
                 cell_states[corr_index.data] = c_nodes
 
         # Reshape outputs
-        outputs_return = Variable(torch.zeros(self.seq_length, numNodes, self.output_size))
-        if self.use_cuda:
-            outputs_return = outputs_return.cuda()
+        outputs_return = Variable(torch.zeros(self.seq_length, numNodes, self.output_size, device=input_data.device))
         for framenum in range(self.seq_length):
             for node in range(numNodes):
                 outputs_return[framenum, node, :] = outputs[framenum*numNodes + node, :]
@@ -518,7 +518,7 @@ class DataLoader():
         #output: seq_lenght (real sequence lenght+1)*max_ped_id+1 (biggest id number in the sequence)*2 (x,y)
         
         #get unique ids from sequence
-        unique_ids = pd.unique(np.concatenate(pedlist).ravel().tolist()).astype(int)
+        unique_ids = pd.unique(np.concatenate(pedlist).ravel()).astype(int)
         # create a lookup table which maps ped ids -> array indices
         lookup_table = dict(zip(unique_ids, range(0, len(unique_ids))))
 
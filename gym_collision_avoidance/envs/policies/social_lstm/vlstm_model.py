@@ -92,9 +92,7 @@ class VLSTMModel(nn.Module):
         look_up = args[6]
 
         numNodes = len(look_up)
-        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size))
-        if self.use_cuda:            
-            outputs = outputs.cuda()
+        outputs = Variable(torch.zeros(self.seq_length * numNodes, self.output_size, device=input_data.device))
 
         # For each frame in the sequence
         for framenum,frame in enumerate(input_data):
@@ -117,9 +115,7 @@ class VLSTMModel(nn.Module):
             #print("lookup table :%s"% look_up)
             list_of_nodes = [look_up[x] for x in nodeIDs]
 
-            corr_index = Variable((torch.LongTensor(list_of_nodes)))
-            if self.use_cuda:            
-                outputs = outputs.cuda()
+            corr_index = Variable((torch.LongTensor(list_of_nodes))).to(input_data.device)
             #print("list of nodes: %s"%nodeIDs)
             #print("trans: %s"%corr_index)
             #if self.use_cuda:
@@ -160,9 +156,7 @@ class VLSTMModel(nn.Module):
                 cell_states[corr_index.data] = c_nodes
 
         # Reshape outputs
-        outputs_return = Variable(torch.zeros(self.seq_length, numNodes, self.output_size))
-        if self.use_cuda:
-            outputs_return = outputs_return.cuda()
+        outputs_return = Variable(torch.zeros(self.seq_length, numNodes, self.output_size, device=input_data.device))
         for framenum in range(self.seq_length):
             for node in range(numNodes):
                 outputs_return[framenum, node, :] = outputs[framenum*numNodes + node, :]
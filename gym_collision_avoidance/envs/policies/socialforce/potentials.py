@@ -16,6 +16,20 @@ class PedPedPotential(object):
         self.delta_t = delta_t
         self.v0 = v0
         self.sigma = sigma
+        self.buffers = {}  # work arrays for grad_r_ab, keyed by number of pedestrians
+
+    def get_buffers(self, n):
+        """Work arrays for grad_r_ab with n pedestrians (allocated once per n)."""
+        if n not in self.buffers:
+            self.buffers[n] = {
+                'r_ab': np.empty((n, n, 2)),
+                'r_ab_next': np.empty((n, n, 2)),
+                'grad': np.empty((n, n, 2)),
+                'norm_r_ab': np.empty((n, n)),
+                'norm_r_ab_next': np.empty((n, n)),
+                'scale': np.empty((n, n)),
+            }
+        return self.buffers[n]
 
     def b(self, r_ab, speeds, desired_directions):
         """Calculate b."""
@@ -47,7 +61,47 @@ class PedPedPotential(object):
         speeds = stateutils.speeds(state)
         return self.value_r_ab(self.r_ab(state), speeds, stateutils.desired_directions(state))
 
-    def grad_r_ab(self, state, delta=1e-3):
+    def grad_r_ab(self, state):
+        """Compute gradient wrt r_ab analytically.
+
+        With d_b = delta_t * speed_b * e_b and b = 0.5 * sqrt((|r_ab| + |r_ab - d_b|)^2 - (delta_t * speed_b)^2):
+        dV/dr_ab = -V / sigma * (|r_ab| + |r_ab - d_b|) / (4 b) * (r_ab / |r_ab| + (r_ab - d_b) / |r_ab - d_b|)
+
+        This is the exact gradient. The forward difference this used to be (grad_r_ab_finite_difference, delta=1e-3)
+        is off by up to ~1% (~0.1 absolute) for close pedestrians, so SOCIALFORCE trajectories differ from results
+        computed before the change.
+        """
+        n = state.shape[0]
+        buffers = self.get_buffers(n)
+        r_ab, r_ab_next, grad = buffers['r_ab'], buffers['r_ab_next'], buffers['grad']
+        norm_r_ab, norm_r_ab_next, scale = buffers['norm_r_ab'], buffers['norm_r_ab_next'], buffers['scale']
+
+        speeds = stateutils.speeds(state)
+        step_b = np.expand_dims(self.delta_t * speeds, -1) * stateutils.desired_directions(state)
+
+        np.subtract(np.expand_dims(state[:, 0:2], 1), np.expand_dims(state[:, 0:2], 0), out=r_ab)
+        np.subtract(r_ab, np.expand_dims(step_b, 0), out=r_ab_next)
+        np.hypot(r_ab[:, :, 0], r_ab[:, :, 1], out=norm_r_ab)
+        np.hypot(r_ab_next[:, :, 0], r_ab_next[:, :, 1], out=norm_r_ab_next)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # scale = (|r| + |r - d|)
+            np.add(norm_r_ab, norm_r_ab_next, out=scale)
+            # b
+            b = 0.5 * np.sqrt(scale**2 - (self.delta_t * np.expand_dims(speeds, 0))**2)
+            # scale = -V / sigma * (|r| + |r - d|) / (4 b)
+            scale *= -self.v0 / self.sigma * np.exp(-b / self.sigma) / (4.0 * b)
+
+            np.divide(r_ab, np.expand_dims(norm_r_ab, -1), out=grad)
+            grad += r_ab_next / np.expand_dims(norm_r_ab_next, -1)
+            grad *= np.expand_dims(scale, -1)
+
+        # remove gradients from self-intereactions (and pedestrians on top of each other)
+        grad[np.arange(n), np.arange(n)] = 0.0
+        grad[~np.isfinite(grad)] = 0.0
+        return grad.copy()
+
+    def grad_r_ab_finite_difference(self, state, delta=1e-3):
         """Compute gradient wrt r_ab using finite difference differentiation."""
         r_ab = self.r_ab(state)
         speeds = stateutils.speeds(state)
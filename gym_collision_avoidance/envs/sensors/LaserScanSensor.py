@@ -60,27 +60,57 @@ class LaserScanSensor(Sensor):
         """
 
 
-        # Approx 200x faster than sense_old (0.002sec per call vs. 0.4sec) :)
         host_agent = agents[agent_index]
+        ranges = self.compute_ranges(np.array([host_agent.pos_global_frame], dtype=np.float64),
+                                     np.array([host_agent.heading_global_frame], dtype=np.float64),
+                                     np.array([host_agent.radius], dtype=np.float64),
+                                     top_down_map)[0]
 
-        angles = self.angles + host_agent.heading_global_frame
-        ranges = self.ranges
-        angles_ranges_mesh = np.meshgrid(angles, ranges)
-        angles_ranges = np.dstack([angles_ranges_mesh[0], angles_ranges_mesh[1]])
-        beam_coords = np.tile(host_agent.pos_global_frame, (len(angles), len(ranges), 1)).astype(np.float64)
-        beam_coords[:,:,0] += (angles_ranges[:,:,1]*np.cos(angles_ranges[:,:,0])).T
-        beam_coords[:,:,1] += (angles_ranges[:,:,1]*np.sin(angles_ranges[:,:,0])).T
+        if self.debug:
+            angles_ranges_mesh = np.meshgrid(self.angles + host_agent.heading_global_frame, self.ranges)
+            beam_coords = np.tile(host_agent.pos_global_frame, (len(self.angles), len(self.ranges), 1)).astype(np.float64)
+            beam_coords[:,:,0] += (angles_ranges_mesh[1]*np.cos(angles_ranges_mesh[0])).T
+            beam_coords[:,:,1] += (angles_ranges_mesh[1]*np.sin(angles_ranges_mesh[0])).T
+            iis, jjs, in_maps = top_down_map.world_coordinates_to_map_indices_vec(beam_coords)
+            in_map_inds = np.where(in_maps)
+            lidar_map = top_down_map.map.copy()
+            lidar_map[iis[in_map_inds], jjs[in_map_inds]] = 1
+            plt.figure('lidar')
+            plt.imshow(lidar_map)
+            plt.pause(0.01)
 
-        iis, jjs, in_maps = top_down_map.world_coordinates_to_map_indices_vec(beam_coords)
+        return self.store_measurement(ranges)
 
-        ego_agent_mask = top_down_map.get_agent_mask(host_agent.pos_global_frame, host_agent.radius)
-        lidar_hits = np.logical_and.reduce((top_down_map.map[iis, jjs], np.invert(ego_agent_mask[iis, jjs]), in_maps))
-        lidar_hits_cumsum = np.cumsum(lidar_hits, axis=1)
-        first_hits = np.where(lidar_hits_cumsum == 1)
+    def get_batch_key(self):
+        return (self.num_beams, self.range_resolution, self.max_range, self.min_range, self.min_angle, self.max_angle)
 
-        ranges = self.max_range*np.ones_like(self.angles)
-        ranges[first_hits[0]] = self.ranges[first_hits[1]]
+    def sense_all(self, agents, host_inds, top_down_map, host_sensors):
+        """ Batched version of :meth:`sense`: ray-trace the beams of every host agent in one call
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment
+            host_inds (list): indices (in :code:`agents`) of the agents to sense for
+            top_down_map (:class:`~gym_collision_avoidance.envs.Map.Map`): map of static objects and agents
+            host_sensors (list): each host's own LaserScanSensor (with the same settings as self), which stores that host's scan history
+
+        Returns:
+            measurement_histories (list): for each host, (:code:`num_to_store` x :code:`num_beams`) stacked history of laserscans
+
+        """
+        host_agents = [agents[i] for i in host_inds]
+        ranges = self.compute_ranges(np.array([agent.pos_global_frame for agent in host_agents], dtype=np.float64),
+                                     np.array([agent.heading_global_frame for agent in host_agents], dtype=np.float64),
+                                     np.array([agent.radius for agent in host_agents], dtype=np.float64),
+                                     top_down_map)
+        return [sensor.store_measurement(host_ranges) for sensor, host_ranges in zip(host_sensors, ranges)]
+
+    def store_measurement(self, ranges):
+        """ Push the newest scan onto measurement_history (the first scan fills the whole history)
+
+        Returns:
+            measurement_history (np array): copy of the updated (:code:`num_to_store` x :code:`num_beams`) history
 
+        """
         if self.num_measurements_made == 0:
             self.measurement_history[:,:] = ranges
         else:
@@ -88,18 +118,67 @@ class LaserScanSensor(Sensor):
             self.measurement_history[0,:] = ranges
 
         self.num_measurements_made += 1
-
-        if self.debug:
-            in_map_inds = np.where(in_maps)
-            iis_in_map = iis[in_map_inds]
-            jjs_in_map = jjs[in_map_inds]
-            lidar_map = top_down_map.map.copy()
-            lidar_map[iis_in_map, jjs_in_map] = 1
-            plt.figure('lidar')
-            plt.imshow(lidar_map)
-            plt.pause(0.01)
         return self.measurement_history.copy()
 
+    def compute_ranges(self, positions, headings, radii, top_down_map):
+        """ Ray-trace the beams of several sensors at once, returning the range of the first obstacle along each beam
+
+        Each beam is sampled at :code:`self.ranges`, like :meth:`sense_old`, but rather than checking every sample,
+        the map's distance transform is used to jump over samples that must be in free space, and each beam stops at its first hit.
+        The cells of each host's own disc are skipped using the host's radius (same cells as :meth:`Map.get_agent_mask`).
+
+        Args:
+            positions (np array): (num_hosts x 2) sensor positions in global frame
+            headings (np array): (num_hosts,) sensor headings in global frame
+            radii (np array): (num_hosts,) radius of the agent carrying each sensor
+            top_down_map (:class:`~gym_collision_avoidance.envs.Map.Map`): map of static objects and agents
+
+        Returns:
+            ranges (np array): (num_hosts x num_beams) range of the first obstacle on each beam (max_range if none)
+
+        """
+        num_hosts = len(positions)
+        num_ranges = len(self.ranges)
+        angles = headings[:, np.newaxis] + self.angles[np.newaxis, :]
+        beam_cos = np.cos(angles)
+        beam_sin = np.sin(angles)
+
+        host_iis, host_jjs, host_in_map = top_down_map.world_coordinates_to_map_indices_vec(positions[np.newaxis,:,:])
+        host_iis, host_jjs, host_in_map = host_iis[0], host_jjs[0], host_in_map[0]
+        ego_radius_sq = (radii/top_down_map.grid_cell_size)**2
+        distance_transform = top_down_map.get_distance_transform()
+        # a sample s meters further along the beam lands in a cell whose center is at most (s/cell + sqrt(2)) cells away,
+        # so every sample closer than (distance_transform - sqrt(2)) cells is guaranteed to be free
+        range_resolution_cells = self.range_resolution/top_down_map.grid_cell_size
+
+        first_hit_inds = np.full((num_hosts, len(self.angles)), num_ranges)
+        hosts, beams = np.unravel_index(np.arange(first_hit_inds.size), first_hit_inds.shape)
+        range_inds = np.zeros_like(hosts)
+        while len(hosts) > 0:
+            r = self.ranges[range_inds]
+            beam_coords = np.stack([positions[hosts, 0] + r*beam_cos[hosts, beams],
+                                    positions[hosts, 1] + r*beam_sin[hosts, beams]], axis=-1)
+            iis, jjs, in_maps = top_down_map.world_coordinates_to_map_indices_vec(beam_coords[np.newaxis,:,:])
+            iis, jjs, in_maps = iis[0], jjs[0], in_maps[0]
+
+            in_ego_agent = host_in_map[hosts] & \
+                ((iis-host_iis[hosts])**2 + (jjs-host_jjs[hosts])**2 < ego_radius_sq[hosts])
+            lidar_hits = in_maps & top_down_map.map[iis, jjs] & np.invert(in_ego_agent)
+            first_hit_inds[hosts[lidar_hits], beams[lidar_hits]] = range_inds[lidar_hits]
+
+            free_cells = np.where(in_maps & np.invert(lidar_hits), distance_transform[iis, jjs], 0.)
+            with np.errstate(invalid='ignore'):
+                num_free_samples = np.ceil((free_cells - np.sqrt(2) - 1e-6)/range_resolution_cells)
+            range_inds = range_inds + np.maximum(1, np.nan_to_num(num_free_samples, posinf=num_ranges)).astype(int)
+
+            keep = np.invert(lidar_hits) & (range_inds < num_ranges)
+            hosts, beams, range_inds = hosts[keep], beams[keep], range_inds[keep]
+
+        ranges = self.max_range*np.ones((num_hosts, len(self.angles)))
+        hit = first_hit_inds < num_ranges
+        ranges[hit] = self.ranges[first_hit_inds[hit]]
+        return ranges
+
     def sense_old(self, agents, agent_index, top_down_map):
         host_agent = agents[agent_index]
 
@@ -142,3 +142,100 @@ class OtherAgentsStatesSensor(Sensor):
         host_agent.num_other_agents_observed = other_agent_count
 
         return other_agents_states
+
+    def get_batch_key(self):
+        return (self.max_num_other_agents_observed, self.agent_sorting_method)
+
+    def sense_all(self, agents, host_inds=None, top_down_map=None, host_sensors=None):
+        """ Batched version of :meth:`sense` that computes the other_agents_states of every agent at once
+
+        Relative positions/velocities/distances of all N x N pairs are computed in one shot, projected onto each agent's
+        ego frame, masked by SENSING_HORIZON, and the closest max_num_other_agents_observed per agent are picked with
+        :code:`np.argpartition` + :code:`np.lexsort` (same keys & tie-breaks as :meth:`get_clipped_sorted_inds`).
+        Like :meth:`sense`, this also fills in each agent's :code:`other_agent_states` & :code:`num_other_agents_observed`.
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment
+            host_inds (list): indices (in :code:`agents`) of the agents to sense for (default: all of them)
+            top_down_map (2D np array): not used!
+            host_sensors (list): not used (this sensor doesn't keep any state)
+
+        Returns:
+            other_agents_states (np array): (len(host_inds) x Config.MAX_NUM_OTHER_AGENTS_OBSERVED x 7), row k is what :code:`sense(agents, host_inds[k])` returns
+
+        """
+        if host_inds is None:
+            host_inds = range(len(agents))
+        host_inds = np.asarray(host_inds, dtype=int)
+        num_hosts = len(host_inds)
+        other_agents_states = np.zeros((num_hosts, Config.MAX_NUM_OTHER_AGENTS_OBSERVED, 7))
+        if num_hosts == 0:
+            return other_agents_states
+
+        pos = np.array([agent.pos_global_frame for agent in agents], dtype=np.float64)
+        vel = np.array([agent.vel_global_frame for agent in agents], dtype=np.float64)
+        radius = np.array([agent.radius for agent in agents], dtype=np.float64)
+        ids = np.array([agent.id for agent in agents])
+        ref_prll = np.array([agents[i].ref_prll for i in host_inds], dtype=np.float64)
+        ref_orth = np.array([agents[i].ref_orth for i in host_inds], dtype=np.float64)
+
+        # [host, other, ...]
+        rel_pos = pos[np.newaxis, :, :] - pos[host_inds, np.newaxis, :]
+        p_parallel_ego_frame = rel_pos[:, :, 0]*ref_prll[:, np.newaxis, 0] + rel_pos[:, :, 1]*ref_prll[:, np.newaxis, 1]
+        p_orthog_ego_frame = rel_pos[:, :, 0]*ref_orth[:, np.newaxis, 0] + rel_pos[:, :, 1]*ref_orth[:, np.newaxis, 1]
+        v_parallel_ego_frame = vel[np.newaxis, :, 0]*ref_prll[:, np.newaxis, 0] + vel[np.newaxis, :, 1]*ref_prll[:, np.newaxis, 1]
+        v_orthog_ego_frame = vel[np.newaxis, :, 0]*ref_orth[:, np.newaxis, 0] + vel[np.newaxis, :, 1]*ref_orth[:, np.newaxis, 1]
+        dist_between_agent_centers = np.sqrt(rel_pos[:, :, 0]**2 + rel_pos[:, :, 1]**2)
+        combined_radius = radius[host_inds, np.newaxis] + radius[np.newaxis, :]
+        dist_2_other = dist_between_agent_centers - combined_radius
+
+        observable = (ids[host_inds, np.newaxis] != ids[np.newaxis, :]) & (dist_between_agent_centers <= Config.SENSING_HORIZON)
+
+        # Sorting keys, most significant first (np.lexsort wants them least significant first)
+        rounded_dist_2_other = np.round(dist_2_other, 2)
+        if self.agent_sorting_method in ['closest_last', 'closest_first']:
+            selection_keys = [rounded_dist_2_other, p_orthog_ego_frame]
+        elif self.agent_sorting_method in ['time_to_impact']:
+            time_to_impact = np.zeros(observable.shape)
+            for k, j in zip(*np.nonzero(observable)):
+                i = host_inds[k]
+                time_to_impact[k, j] = compute_time_to_impact(pos[i], pos[j], vel[i], vel[j], combined_radius[k, j])
+            selection_keys = [-time_to_impact, -rounded_dist_2_other, p_orthog_ego_frame]
+        else:
+            raise ValueError("Did not supply proper self.agent_sorting_method in Agent.py.")
+
+        if self.agent_sorting_method == "closest_last":
+            ordering_keys = [-rounded_dist_2_other, p_orthog_ego_frame]
+        else:
+            ordering_keys = selection_keys
+
+        max_num_observed = self.max_num_other_agents_observed
+        primary_key = np.where(observable, selection_keys[0], np.inf)
+        for i in range(num_hosts):
+            candidates = np.flatnonzero(observable[i])
+            if len(candidates) > max_num_observed:
+                # argpartition on the primary key, but keep everyone tied with the cutoff value so the
+                # secondary keys can break ties exactly like the sorted() in get_clipped_sorted_inds
+                kth = np.partition(primary_key[i], max_num_observed-1)[max_num_observed-1]
+                candidates = np.flatnonzero(observable[i] & (primary_key[i] <= kth))
+                if len(candidates) > max_num_observed:
+                    order = np.lexsort([key[i, candidates] for key in reversed(selection_keys)])
+                    candidates = candidates[order[:max_num_observed]]
+            order = np.lexsort([key[i, candidates] for key in reversed(ordering_keys)])
+            clipped_sorted_inds = candidates[order]
+
+            num_observed = len(clipped_sorted_inds)
+            other_agents_states[i, :num_observed, 0] = p_parallel_ego_frame[i, clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 1] = p_orthog_ego_frame[i, clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 2] = v_parallel_ego_frame[i, clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 3] = v_orthog_ego_frame[i, clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 4] = radius[clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 5] = combined_radius[i, clipped_sorted_inds]
+            other_agents_states[i, :num_observed, 6] = dist_2_other[i, clipped_sorted_inds]
+
+            host_agent = agents[host_inds[i]]
+            if num_observed > 0:
+                host_agent.other_agent_states[:] = other_agents_states[i, 0, :]
+            host_agent.num_other_agents_observed = num_observed
+
+        return other_agents_states
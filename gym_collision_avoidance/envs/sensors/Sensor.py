@@ -10,6 +10,27 @@ class Sensor(object):
         """
         raise NotImplementedError
 
+    def get_batch_key(self):
+        """ Sensors that implement :meth:`sense_all` return a hashable key here (same key <=> same measurement settings),
+        so the env can sense for every agent with that key in one call. None means only :meth:`sense` is available.
+        """
+        return None
+
+    def sense_all(self, agents, host_inds, top_down_map, host_sensors):
+        """ Dummy method to be re-implemented by Sensor subclasses that can sense for many agents at once
+
+        Args:
+            agents (list): all :class:`~gym_collision_avoidance.envs.agent.Agent` in the environment
+            host_inds (list): indices (in :code:`agents`) of the agents to sense for
+            top_down_map (2D np array): binary image with 0 if that pixel is free space, 1 if occupied
+            host_sensors (list): each host's own instance of this sensor (for sensors that keep state, e.g., past measurements)
+
+        Returns:
+            measurements (list or np array): what :code:`host_sensors[k].sense(agents, host_inds[k], top_down_map)` would return, for each k
+
+        """
+        raise NotImplementedError
+
     def set_args(self, args):
         """ Update several class attributes (in dict format) of the Sensor object
         
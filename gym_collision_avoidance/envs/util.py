@@ -136,6 +136,19 @@ def wrap(angle):
         angle += 2*np.pi
     return angle
 
+def wrap_array(angles):
+    # same as wrap, elementwise on an np array (returns a copy)
+    angles = np.array(angles, dtype=np.float64)
+    too_big = angles >= np.pi
+    while np.any(too_big):
+        angles[too_big] -= 2*np.pi
+        too_big = angles >= np.pi
+    too_small = angles < -np.pi
+    while np.any(too_small):
+        angles[too_small] += 2*np.pi
+        too_small = angles < -np.pi
+    return angles
+
 def find_nearest(array,value):
     # array is a 1D np array
     # value is an scalar or 1D np array
@@ -1,19 +1,25 @@
 import numpy as np
 from gym_collision_avoidance.envs.util import find_nearest, rgba2rgb
 from sys import platform
-if platform == "darwin":
-    import matplotlib as mpl
-    mpl.use('TkAgg')
-import matplotlib.pyplot as plt
+import os
 import matplotlib
+# TkAgg windows for SHOW_EPISODE_PLOTS, unless MPLBACKEND picks the backend,
+# or there is no display to open them on (e.g., rendering plots and animations on a headless server)
+if "MPLBACKEND" not in os.environ:
+    if platform.startswith("linux") and not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        matplotlib.use('Agg')
+    else:
+        matplotlib.use('TkAgg')
+import matplotlib.pyplot as plt
 
-matplotlib.use('TkAgg')
-
-import os
 import matplotlib.patches as ptch
 from matplotlib.collections import LineCollection
 import glob
 import imageio
+import queue
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 # Filter list by Boolean list 
 # Using itertools.compress 
@@ -81,6 +87,9 @@ def animate_episode(num_agents, plot_save_dir=None, plot_policy_name=None, test_
     animation_filename = animation_save_dir+animation_filename
     imageio.mimsave(animation_filename, images)
 
+    gif_to_mp4(animation_filename)
+
+def gif_to_mp4(animation_filename):
     # convert .gif to .mp4
     try:
         import moviepy.editor as mp
@@ -362,3 +371,272 @@ def plot_perturbed_observation(agents, ax, perturbed_info):
 
         plt.plot(other_agent_pos[0], other_agent_pos[1], 'x', color=plt_colors[i+1], zorder=4)
         plt.plot(other_agent_perturbed_pos[0], other_agent_perturbed_pos[1], 'x', color=plt_colors[-1], zorder=4)
+
+class EpisodeAnimator(object):
+    """ Render the animation frames of an episode incrementally and stream them into a gif (and mp4) while the episode runs.
+
+    :func:`plot_episode` (with :code:`save_for_animation`) clears the figure, redraws every agent's whole history and saves a png,
+    which :func:`animate_episode` reads back at the end of the episode. Here, each agent's artists (trajectory, circles along
+    the trajectory, current position, labels) are created once on an offscreen Agg canvas and updated in place each frame,
+    and the rendered pixels are handed to a background thread that encodes them (no png round trip).
+
+    The frames look like :func:`plot_episode`'s, except that the colors follow the legend (every agent's policy) rather than
+    the policies of the active agents only, so an agent keeps its color when others finish.
+
+    """
+    def __init__(self, circles_along_traj=True, limits=None, fig_size=(10,8), dpi=100, fps=10, final_frame_repeats=10, max_queued_frames=32):
+        self.circles_along_traj = circles_along_traj
+        self.limits = limits
+        self.fig_size = fig_size
+        self.dpi = dpi
+        self.fps = fps
+        self.final_frame_repeats = final_frame_repeats
+        self.max_queued_frames = max_queued_frames
+        self.frame_queue = None
+        self.writer_thread = None
+        self.writer_error = None
+        self.animation_filename = None
+        self.fig = None
+        self.num_frames = 0
+
+    def add_frame(self, agents, active_agent_mask, episode_step_num, plot_save_dir=None, plot_policy_name=None, test_case_index=0):
+        """ Update the artists to the agents' current state, render, and queue the frame (the first frame opens the gif/mp4) """
+        if max([agent.step_num for agent in agents]) == 0:
+            return
+
+        if self.fig is None:
+            self._start_episode(agents, plot_save_dir, plot_policy_name, test_case_index)
+
+        self._update_legend(agents)
+        active_agents = list(compress(agents, active_agent_mask))
+        max_time = max([agent.step_num for agent in active_agents] + [1e-4])
+        self.new_limit_points = []
+        for i, agent in enumerate(agents):
+            if i not in self.agent_artists:
+                self._add_agent_artists(i, agent)
+            artists = self.agent_artists[i]
+            visible = bool(active_agent_mask[i])
+            for artist in artists['all']:
+                artist.set_visible(visible)
+            if visible:
+                self._update_agent_artists(artists, agent, max_time)
+        self.frame_text.set_text("Frame: " + str(episode_step_num))
+
+        if self.limits is None and len(self.new_limit_points) > 0:
+            # grow the data limits with the positions since the last frame (relim would go through every patch again)
+            self.ax.update_datalim(np.concatenate(self.new_limit_points))
+            self.ax.autoscale_view()
+
+        self.canvas.draw()
+        self.last_frame = np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+        self._put(self.last_frame)
+        self.num_frames += 1
+
+    def finish(self):
+        """ Hold the last frame for a moment, close the gif/mp4 of the episode, and get ready for the next episode
+
+        Returns:
+            animation_filename (str): path of the gif (None if no frame was added this episode)
+
+        Raises:
+            RuntimeError: if writing the gif/mp4 failed (the writer thread's exception is the cause)
+
+        """
+        if self.writer_thread is None:
+            return None
+        for _ in range(self.final_frame_repeats):
+            self._put(self.last_frame)
+        self._put(None)
+        self.writer_thread.join()
+
+        animation_filename = self.animation_filename
+        writer_error = self.writer_error
+        self.writer_thread = None
+        self.writer_error = None
+        self.animation_filename = None
+        self.fig = None
+        self.num_frames = 0
+        if writer_error is not None:
+            raise RuntimeError("EpisodeAnimator could not write {}".format(animation_filename)) from writer_error
+        return animation_filename
+
+    def _start_episode(self, agents, plot_save_dir, plot_policy_name, test_case_index):
+        plot_save_dir, plot_policy_name, base_fig_name, _ = get_plot_save_dir(plot_save_dir, plot_policy_name, agents)
+        animation_save_dir = plot_save_dir+"animations/"
+        os.makedirs(animation_save_dir, exist_ok=True)
+        self.animation_filename = animation_save_dir+base_fig_name.format(
+            policy=plot_policy_name,
+            test_case = str(test_case_index).zfill(3),
+            step="",
+            extension='gif')
+        # a fresh queue per episode (frames dropped into the last one after its writer failed are never read)
+        self.frame_queue = queue.Queue(maxsize=self.max_queued_frames)
+        self.writer_thread = threading.Thread(target=self._write_frames, args=(self.animation_filename,), daemon=True)
+        self.writer_thread.start()
+
+        self.fig = Figure(figsize=self.fig_size, dpi=self.dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        self.ax.set_xlabel('x (m)')
+        self.ax.set_ylabel('y (m)')
+        self.frame_text = self.ax.text(0.5, 0.95, "", fontsize=12, transform=self.ax.transAxes)
+        # plotting style (only show axis on bottom and left)
+        self.ax.spines['top'].set_visible(False)
+        self.ax.spines['right'].set_visible(False)
+        self.ax.yaxis.set_ticks_position('left')
+        self.ax.xaxis.set_ticks_position('bottom')
+        if self.limits is not None:
+            xlim, ylim = self.limits
+            self.ax.set_xlim(xlim)
+            self.ax.set_ylim(ylim)
+            self.ax.set_aspect('equal')
+        else:
+            self.ax.axis('equal')
+
+        self.agent_artists = {}
+        self.policy_names = []
+        self.last_frame = None
+
+    def _update_legend(self, agents):
+        # Add legend to identify color representation of algorithm (recolor everything if a new policy shows up)
+        policy_names = list(np.unique([agent.policy.str for agent in agents]))
+        if policy_names == self.policy_names:
+            return
+        self.policy_names = policy_names
+        self.ax.legend(handles=[ptch.Patch(color=plt_colors[i], label=algo_name) for i, algo_name in enumerate(policy_names)],
+                       loc="upper right", prop={'size': 10})
+        for artists in self.agent_artists.values():
+            artists['color'] = plt_colors[self.policy_names.index(artists['policy_name'])]
+            for artist in artists['colored']:
+                artist.set_color(artists['color'])
+
+    def _add_agent_artists(self, i, agent):
+        plt_color = plt_colors[self.policy_names.index(agent.policy.str)]
+        artists = {'policy_name': agent.policy.str, 'color': plt_color, 'num_positions_in_limits': 0}
+        if self.circles_along_traj:
+            artists['line'], = self.ax.plot([], [], color=plt_color, ls='-', linewidth=2)
+            artists['goal'], = self.ax.plot(agent.global_state_history[0, 3], agent.global_state_history[0, 4],
+                                            color=plt_color, marker='*', markersize=20)
+            artists['trail_circles'] = []
+            artists['trail_circle_times'] = []
+            artists['trail_texts'] = []
+            artists['trail_text_times'] = []
+            artists['time_text'] = self.ax.text(0, 0, '', color=plt_color)
+            artists['colored'] = [artists['line'], artists['goal'], artists['time_text']]
+        else:
+            #added to label goals
+            artists['goal'], = self.ax.plot(agent.target_global_frame[0], agent.target_global_frame[1],
+                                            color=plt_color, marker='*', markersize=20)
+            artists['trail_scatter'] = self.ax.scatter(np.zeros(0), np.zeros(0))
+            artists['colored'] = [artists['goal']]
+        artists['circle'] = ptch.Circle((0, 0), radius=agent.radius, ec=plt_color)
+        self.ax.add_patch(artists['circle'])
+        artists['id_text'] = self.ax.text(0, 0, agent.id, fontsize=10, ha='center', va='center')
+        artists['all'] = [artist for key, artist in artists.items() if key in ['line', 'goal', 'time_text', 'trail_scatter', 'circle', 'id_text']]
+        self.agent_artists[i] = artists
+
+    def _update_agent_artists(self, artists, agent, max_time, max_time_alpha_scalar=1.2):
+        history = agent.global_state_history
+        plt_color = artists['color']
+        ind = agent.step_num - 1
+        # rows before the agent spawned are drawn at its start position
+        start = min(agent.start_step_num, ind)
+        position = history[max(ind, start), 1:3]
+
+        if self.circles_along_traj:
+            artists['line'].set_data(history[start:agent.step_num, 1], history[start:agent.step_num, 2])
+
+            # Display circle at agent pos every circle_spacing (nom 1.5 sec), only adding the ones that appeared since the last frame
+            circle_times = np.arange(0.0, history[ind, 0], 0.4)[len(artists['trail_circles']):]
+            if len(circle_times) > 0:
+                _, circle_inds = find_nearest(history[:agent.step_num, 0], circle_times)
+                for circle_ind in np.maximum(circle_inds, start):
+                    circle = ptch.Circle(history[circle_ind, 1:3], radius=agent.radius, ec=plt_color, fill=True)
+                    self.ax.add_patch(circle)
+                    artists['trail_circles'].append(circle)
+                    artists['trail_circle_times'].append(history[circle_ind, 0])
+                    artists['all'].append(circle)
+                    artists['colored'].append(circle)
+            # Display text of current timestamp every text_spacing (nom 1.5 sec)
+            text_times = np.arange(0.0, history[ind, 0], 1.5)[len(artists['trail_texts']):]
+            if len(text_times) > 0:
+                _, text_inds = find_nearest(history[:agent.step_num, 0], text_times)
+                for text_ind in np.maximum(text_inds, start):
+                    text = self.ax.text(history[text_ind, 1]-0.15, history[text_ind, 2]+0.1, '%.1f' % history[text_ind, 0])
+                    artists['trail_texts'].append(text)
+                    artists['trail_text_times'].append(history[text_ind, 0])
+                    artists['all'].append(text)
+
+            # circles and texts fade with time (relative to the current max_time)
+            for circle, t in zip(artists['trail_circles'], artists['trail_circle_times']):
+                circle.set_edgecolor(plt_color)
+                circle.set_facecolor(rgba2rgb(plt_color+[float(1 - t / (max_time_alpha_scalar*max_time))]))
+            for text, t in zip(artists['trail_texts'], artists['trail_text_times']):
+                alpha = 0.3 if t / (max_time_alpha_scalar*max_time) < 0.5 else 0.9
+                text.set_color(rgba2rgb(plt_color+[alpha]))
+
+            # Also display circle at agent position at end of trajectory
+            circle_alpha = 1 - history[ind, 0] / (max_time_alpha_scalar*max_time)
+            artists['time_text'].set_position((position[0] - 0.15, position[1] + 0.1))
+            artists['time_text'].set_text('%.1f' % history[ind, 0])
+        else:
+            colors = np.zeros((agent.step_num, 4))
+            colors[:,:3] = plt_color
+            colors[:, 3] = np.linspace(0.2, 1., agent.step_num)
+            colors = rgba2rgb(colors)[start:]
+            artists['trail_scatter'].set_offsets(history[start:agent.step_num, 1:3])
+            artists['trail_scatter'].set_facecolors(colors)
+            artists['trail_scatter'].set_edgecolors(colors)
+
+            # Also display circle at agent position at end of trajectory
+            circle_alpha = 0.7
+        artists['circle'].center = position
+        artists['circle'].set_edgecolor(plt_color)
+        artists['circle'].set_facecolor(rgba2rgb(plt_color+[float(circle_alpha)]))
+        artists['id_text'].set_position(position)
+
+        new_positions = history[max(artists['num_positions_in_limits'], start):agent.step_num, 1:3]
+        self.new_limit_points.extend([new_positions - agent.radius, new_positions + agent.radius])
+        artists['num_positions_in_limits'] = agent.step_num
+
+    def _put(self, frame):
+        # drop the frame if the writer thread stopped (finish() raises its error), instead of blocking forever
+        while True:
+            if not self.writer_thread.is_alive():
+                return
+            try:
+                self.frame_queue.put(frame, timeout=1.0)
+                return
+            except queue.Full:
+                pass
+
+    def _write_frames(self, animation_filename):
+        # Runs in the writer thread: encode every queued frame until the None sentinel (errors are raised by finish())
+        try:
+            writers = [imageio.get_writer(animation_filename, mode='I', fps=self.fps)]
+            try:
+                writers.append(imageio.get_writer(animation_filename[:-4]+".mp4", fps=self.fps))
+                write_mp4 = False
+            except (ImportError, OSError, RuntimeError, ValueError):
+                # no ffmpeg writer available: convert the gif afterwards, as animate_episode does
+                write_mp4 = True
+            try:
+                while True:
+                    frame = self.frame_queue.get()
+                    if frame is None:
+                        break
+                    for writer in writers:
+                        writer.append_data(frame)
+            finally:
+                for writer in writers:
+                    writer.close()
+            if write_mp4:
+                gif_to_mp4(animation_filename)
+        except Exception as e:
+            self.writer_error = e
+            # empty the queue, so a put() waiting on it can go on and see the thread stopped
+            while True:
+                try:
+                    self.frame_queue.get_nowait()
+                except queue.Empty:
+                    break
@@ -1,7 +1,7 @@
 number_of_agent = 100
 import os
 
-from master_scenario_generator import Scenario_Generator, Seeded_Scenario_Generator, Seeded_Population_Scenario_Generator, real_dataset_traj
+from gym_collision_avoidance.experiments.src.master_scenario_generator import Scenario_Generator, Seeded_Scenario_Generator, Seeded_Population_Scenario_Generator, real_dataset_traj, generate_population_scenarios
 
 class Master_Config(object):
     def __init__(self):
@@ -101,7 +101,7 @@ class Master_Config(object):
 
 
 class Scenario_Config(object):
-    def __init__(self, experiment_number, algorithm_name, experiment_iteration_num, dataset_name=None, population_density=None):
+    def __init__(self, experiment_number, algorithm_name, experiment_iteration_num, dataset_name=None, population_density=None, num_workers=1):
 
         self.exp_setting = None
         #####################################################################################################################################################
@@ -148,9 +148,8 @@ class Scenario_Config(object):
             #    self.POPULATION = [    None            ,None            ,1             ,None         ,0              ,5             ,0              ,5      , [[-1,6],[-1,6]]     ]
             
             self.exp_setting = self.POPULATION
-            self.scenario=[]
-            for i in range(experiment_iteration_num):         
-                self.scenario.append( Seeded_Population_Scenario_Generator( population_density, algorithm_name, self.exp_setting[4],self.exp_setting[5], self.exp_setting[6], self.exp_setting[7], self.exp_setting[2], 0.2, 0, random_seed=i  ).population_random_square_edge() )
+            #one scenario per iteration (seed i), generated in num_workers processes
+            self.scenario = generate_population_scenarios( range(experiment_iteration_num), population_density, algorithm_name, self.exp_setting[4],self.exp_setting[5], self.exp_setting[6], self.exp_setting[7], self.exp_setting[2], 0.2, 0, num_workers=num_workers )
 
         elif experiment_number == 3:  #touranment  1 vs n-1
             self.exp_setting = self.POPULATION
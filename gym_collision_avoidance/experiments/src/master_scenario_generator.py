@@ -1,6 +1,8 @@
 import numpy as np
 import random
 import os
+import multiprocessing
+from scipy.spatial import cKDTree
 #sg = Scenario_Generator(10, "RVO", -10, 10 ,-10, 10, 0.5, 0.05, 0)
 
 
@@ -243,7 +245,7 @@ class Seeded_Scenario_Generator(object):
                     collide=False
                     break
 
-                past_start_points = np.array(scenario)[:,2:4].astype(np.float)
+                past_start_points = np.array(scenario)[:,2:4].astype(np.float64)
                 closet_distance_to_other_start_point = 999
                 for past_start_point in past_start_points:
                     distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
@@ -286,7 +288,7 @@ class Seeded_Scenario_Generator(object):
                     collide=False
                     break
 
-                past_goal_points = np.array(scenario)[:,4:6].astype(np.float)
+                past_goal_points = np.array(scenario)[:,4:6].astype(np.float64)
                 closet_distance_to_other_goal_point = 999
                 for past_goal_point in past_goal_points:
                     distance = np.linalg.norm(past_goal_point - np.array([goal_x,goal_y]) )
@@ -304,6 +306,71 @@ class Seeded_Scenario_Generator(object):
         return scenario
 
 ##################################################################
+class SpawnGrid(object):
+    """ Points that a new start/goal must stay away from, bucketed in a background grid (as in Bridson's Poisson-disk sampling).
+
+    Cells are as wide as the spawn distance threshold, so a candidate only needs to be checked against the points in the
+    3x3 cells around it instead of against every point placed so far.
+    """
+    def __init__(self, min_distance, points=()):
+        self.min_distance = min_distance
+        self.cells = {}
+        self.num_points = 0
+        for point in points:
+            self.add(point)
+
+    def get_cell(self, point):
+        return (int(np.floor(point[0] / self.min_distance)), int(np.floor(point[1] / self.min_distance)))
+
+    def add(self, point):
+        self.cells.setdefault(self.get_cell(point), []).append(np.array(point, dtype=np.float64))
+        self.num_points += 1
+
+    def closest_distance(self, point):
+        """ Distance from point to the closest point in the grid, or 999 if none is within min_distance """
+        cell_x, cell_y = self.get_cell(point)
+        point = np.array(point, dtype=np.float64)
+        closest_distance = 999
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_point in self.cells.get((cell_x+dx, cell_y+dy), ()):
+                    distance = np.linalg.norm(other_point - point)
+                    if distance < closest_distance: closest_distance = distance
+        return closest_distance
+
+def count_spawn_attempt(num_attempts, max_attempts, agent_index, point_name):
+    """ num_attempts + 1, or raise a ValueError once max_attempts were spent on placing one start/goal """
+    if num_attempts >= max_attempts:
+        raise ValueError("Could not place the {} of agent {} in {} attempts (the population density is too high for the spawn distance threshold)".format(point_name, agent_index, max_attempts))
+    return num_attempts + 1
+
+def _generate_population_scenario(args_and_kwargs):
+    args, kwargs = args_and_kwargs
+    return Seeded_Population_Scenario_Generator(*args, **kwargs).population_random_square_edge()
+
+def generate_population_scenarios(random_seeds, population_density, policy_list, x_min, x_max, y_min, y_max, pref_speed, agent_radius, start_timestamp, num_agents_override=None, num_workers=1):
+    """ One :class:`Seeded_Population_Scenario_Generator` scenario per seed (e.g., every iteration of an experiment sweep).
+
+    Each scenario only depends on its seed, so they can be generated in a pool of num_workers processes (None: one per cpu),
+    and come out the same as generating them one by one.
+
+    Returns:
+        scenarios (list): the population_random_square_edge scenario of each seed, in the order of random_seeds
+
+    """
+    args = (population_density, policy_list, x_min, x_max, y_min, y_max, pref_speed, agent_radius, start_timestamp)
+    jobs = [(args, {'random_seed': random_seed, 'num_agents_override': num_agents_override}) for random_seed in random_seeds]
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if min(num_workers, len(jobs)) <= 1:
+        return [_generate_population_scenario(job) for job in jobs]
+    pool = multiprocessing.Pool(min(num_workers, len(jobs)))
+    try:
+        return pool.map(_generate_population_scenario, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
 class Seeded_Population_Scenario_Generator(object):
     def __init__(self, population_density, policy_list, x_min, x_max, y_min, y_max, pref_speed, agent_radius, start_timestamp, random_seed=0, num_agents_override=None):
         self.random_seed      = random_seed*1000
@@ -316,7 +383,7 @@ class Seeded_Population_Scenario_Generator(object):
             #override
             if self.num_agents <=2: self.num_agents=3
         else:
-            self.num_agents = num_agent_override
+            self.num_agents = num_agents_override
             
         self.policy_list      = policy_list
         self.x_min            = x_min
@@ -328,6 +395,7 @@ class Seeded_Population_Scenario_Generator(object):
         self.start_timestamp  = start_timestamp
 
         self.border_relaxer = 1
+        self.max_spawn_attempts = 10000 # give up (instead of looping forever) if a start/goal can't be placed that many times
         self.spawn_distance_threshold = 0.7
         
         pass
@@ -338,6 +406,9 @@ class Seeded_Population_Scenario_Generator(object):
 
     def population_random_square_edge(self):
         scenario = []
+        # starts/goals placed so far, for the spawn distance checks
+        start_grid = SpawnGrid(self.spawn_distance_threshold)
+        goal_grid = SpawnGrid(self.spawn_distance_threshold)
 
         for i in range(self.num_agents):
 
@@ -368,7 +439,9 @@ class Seeded_Population_Scenario_Generator(object):
 
             #To make sure it is not colliding with other start point
             collide = True
+            num_attempts = 0
             while collide:
+                num_attempts = count_spawn_attempt(num_attempts, self.max_spawn_attempts, i, "start")
                 self.seed()
                 if np.random.choice([True,False]):
                     # along x axis (left right edge)
@@ -400,11 +473,7 @@ class Seeded_Population_Scenario_Generator(object):
                     collide=False
                     break
 
-                past_start_points = np.array(scenario)[:,2:4].astype(np.float)
-                closet_distance_to_other_start_point = 999
-                for past_start_point in past_start_points:
-                    distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
-                    if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+                closet_distance_to_other_start_point = start_grid.closest_distance([start_x,start_y])
 
                 if closet_distance_to_other_start_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                     collide=False
@@ -412,7 +481,9 @@ class Seeded_Population_Scenario_Generator(object):
 
             #To make sure it is not colliding with other goal point
             collide = True
+            num_attempts = 0
             while collide:
+                num_attempts = count_spawn_attempt(num_attempts, self.max_spawn_attempts, i, "goal")
                 self.seed()
                 if np.random.choice([True,False]):
                     # along x axis (left right edge)
@@ -461,11 +532,7 @@ class Seeded_Population_Scenario_Generator(object):
                     collide=False
                     break
 
-                past_goal_points = np.array(scenario)[:,4:6].astype(np.float)
-                closet_distance_to_other_goal_point = 999
-                for past_goal_point in past_goal_points:
-                    distance = np.linalg.norm(past_goal_point - np.array([goal_x,goal_y]) )
-                    if distance < closet_distance_to_other_goal_point: closet_distance_to_other_goal_point = distance
+                closet_distance_to_other_goal_point = goal_grid.closest_distance([goal_x,goal_y])
 
                 if closet_distance_to_other_goal_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                     collide=False
@@ -475,6 +542,8 @@ class Seeded_Population_Scenario_Generator(object):
             
             #print([ i, policy, start_x, start_y, goal_x, goal_y, pref_speed, agent_radius, start_timestamp ])
             scenario.append( [ i, policy, start_x, start_y, goal_x, goal_y, pref_speed, agent_radius, start_timestamp ] )
+            start_grid.add([start_x,start_y])
+            goal_grid.add([goal_x,goal_y])
 
         return scenario
        
@@ -501,8 +570,10 @@ class Single_Seeded_Population_Scenario_Generator(object):
         self.pref_speed       = pref_speed
         self.agent_radius     = agent_radius
         self.start_timestamp  = start_timestamp
+        self.agents           = agents
 
         self.border_relaxer = 1
+        self.max_spawn_attempts = 10000 # give up (instead of looping forever) if a start/goal can't be placed that many times
         self.spawn_distance_threshold = 1.5 #0.7
         
         pass
@@ -513,6 +584,8 @@ class Single_Seeded_Population_Scenario_Generator(object):
 
     def population_random_square_edge(self):
         scenario = []
+        # every start, goal and current position of the other agents, for the spawn distance checks (they don't move meanwhile)
+        occupied_grid = SpawnGrid(self.spawn_distance_threshold, [ point for agent in self.agents for point in (agent.start_global_frame, agent.goal_global_frame, agent.pos_global_frame) ])
 
         for i in range(self.num_agents):
 
@@ -543,7 +616,9 @@ class Single_Seeded_Population_Scenario_Generator(object):
 
             #To make sure it is not colliding with other start point
             collide = True
+            num_attempts = 0
             while collide:
+                num_attempts = count_spawn_attempt(num_attempts, self.max_spawn_attempts, i, "start")
                 self.seed()
                 if np.random.choice([True,False]):
                     # along x axis (left right edge)
@@ -575,19 +650,9 @@ class Single_Seeded_Population_Scenario_Generator(object):
                     collide=False
                     break
 
-                #past_start_points = np.array(scenario)[:,2:4].astype(np.float)
-                past_start_points          =   np.array( [ agent.start_global_frame for agent in agents ] ) .astype(np.float)
-                past_goal_points           =   np.array( [ agent.goal_global_frame for agent in agents ] ) .astype(np.float)
-                past_current_points        =   np.array( [ agent.pos_global_frame for agent in agents ] ) .astype(np.float)
-
-                past_start_points = np.concatenate((past_start_points,past_goal_points,past_current_points))
-
-                if len(past_start_points)==0: break
+                if occupied_grid.num_points==0: break
                 
-                closet_distance_to_other_start_point = 999
-                for past_start_point in past_start_points:
-                    distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
-                    if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+                closet_distance_to_other_start_point = occupied_grid.closest_distance([start_x,start_y])
 
                 if closet_distance_to_other_start_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                     collide=False
@@ -595,7 +660,9 @@ class Single_Seeded_Population_Scenario_Generator(object):
 
             #To make sure it is not colliding with other goal point
             collide = True
+            num_attempts = 0
             while collide:
+                num_attempts = count_spawn_attempt(num_attempts, self.max_spawn_attempts, i, "goal")
                 self.seed()
                 if np.random.choice([True,False]):
                     # along x axis (left right edge)
@@ -644,19 +711,9 @@ class Single_Seeded_Population_Scenario_Generator(object):
                     collide=False
                     break
 
-                #past_goal_points = np.array(scenario)[:,4:6].astype(np.float)
-                past_start_points          =   np.array( [ agent.start_global_frame for agent in agents ] ) .astype(np.float)
-                past_goal_points           =   np.array( [ agent.goal_global_frame for agent in agents ] ) .astype(np.float)
-                past_current_points        =   np.array( [ agent.pos_global_frame for agent in agents ] ) .astype(np.float)
+                if occupied_grid.num_points==0: break
 
-                past_goal_points = np.concatenate((past_start_points,past_goal_points,past_current_points))
-
-                if len(past_goal_points)==0: break
-
-                closet_distance_to_other_goal_point = 999
-                for past_goal_point in past_goal_points:
-                    distance = np.linalg.norm(past_goal_point - np.array([goal_x,goal_y]) )
-                    if distance < closet_distance_to_other_goal_point: closet_distance_to_other_goal_point = distance
+                closet_distance_to_other_goal_point = occupied_grid.closest_distance([goal_x,goal_y])
 
                 if closet_distance_to_other_goal_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                     collide=False
@@ -670,44 +727,81 @@ class Single_Seeded_Population_Scenario_Generator(object):
         return [ i, policy, start_x, start_y, goal_x, goal_y, pref_speed, agent_radius, start_timestamp ]
         
 ########
-class real_dataset_traj(object):
-
-    def __init__( self, dataset_name="hotel"):
-        self.random_seed=0
-        self.spawn_distance_threshold = 0.7 #0.7
-        
-        data_dir = os.path.dirname(__file__)+"/datasets/"+dataset_name.lower()+"/test/"
-        delim='\t'
-        
-        all_files = os.listdir(data_dir)
-        all_files = [os.path.join(data_dir, _path) for _path in all_files]
-
+# Parsed trajectories of each dataset, so respawning an agent doesn't parse the dataset files again
+dataset_traj_cache = {}
+
+def load_dataset_traj(dataset_name, delim='\t', min_length=8, min_displacement=2):
+    """ Every usable agent trajectory of datasets/<dataset_name>/test/, parsed once per process.
+
+    The first time a dataset is loaded, the filtered trajectories are also stored as flat arrays
+    in datasets/<dataset_name>/test_traj_index.npz (rebuilt whenever a file under test/ changes),
+    so later processes skip parsing the text files.
+
+    Args:
+        dataset_name (str): name of the dataset directory (e.g., 'hotel')
+        delim (str): column delimiter of the dataset files
+        min_length (int): trajectories with fewer timestamps are dropped
+        min_displacement (float): trajectories whose start and goal are closer than this are dropped
+
+    Returns:
+        dataset_traj (list): (n_timestamps, 2) position array of each trajectory
+
+    """
+    dataset_name = dataset_name.lower()
+    if dataset_name in dataset_traj_cache:
+        return dataset_traj_cache[dataset_name]
+
+    dataset_dir = os.path.dirname(__file__)+"/datasets/"+dataset_name
+    data_dir = dataset_dir+"/test/"
+    index_path = dataset_dir+"/test_traj_index.npz"
+
+    all_files = [os.path.join(data_dir, _path) for _path in os.listdir(data_dir)]
+    # name, size and modification time of each source file, to tell whether the index on disk is stale
+    file_stamps = np.array([ [os.path.basename(path), str(os.path.getsize(path)), str(os.path.getmtime(path))] for path in all_files ])
+
+    points = None
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path) as index:
+                if np.array_equal(index['file_stamps'], file_stamps):
+                    points, offsets = index['points'], index['offsets']
+        except (OSError, KeyError, ValueError):
+            points = None
+
+    if points is None:
         print(all_files)
-
-
-        filtered_frame_data = []
+        traj_list = []
         for path in all_files:
             data = read_file(path, delim)
 
-            agent_list = np.unique(data[:, 1]).tolist()
-            print(agent_list)
+            # group the rows by agent id (ascending), keeping each agent's rows in file order
+            data = data[np.argsort(data[:, 1], kind='stable')]
+            _, first_rows, lengths = np.unique(data[:, 1], return_index=True, return_counts=True)
+            last_rows = first_rows + lengths - 1
 
-            frame_data = []
-            for frame in agent_list:
-                frame_data.append(data[frame == data[:, 1], :])
+            #remove record if start and goal are too close     or if the agent record have less than 8 timestamps
+            displacement = np.linalg.norm(data[last_rows, 2:] - data[first_rows, 2:], axis=1)
+            keep = (displacement >= min_displacement) & (lengths >= min_length)
+            traj_list.extend( data[first:first+length, 2:] for first, length in zip(first_rows[keep], lengths[keep]) )
 
-            #start filtering data
-            
-            #iterate through agents
-            for i,record in enumerate(frame_data):
-                diff = np.array(record[-1][2:]) - np.array(record[0][2:])
+        points = np.concatenate(traj_list) if len(traj_list) > 0 else np.empty((0, 2))
+        offsets = np.cumsum([0] + [len(traj) for traj in traj_list])
+        try:
+            np.savez(index_path, points=points, offsets=offsets, file_stamps=file_stamps)
+        except OSError:
+            pass # e.g., read-only install: parse again next time
+
+    dataset_traj = [ points[start:end] for start, end in zip(offsets[:-1], offsets[1:]) ]
+    dataset_traj_cache[dataset_name] = dataset_traj
+    return dataset_traj
 
-                #remove record if start and goal are too close     or if the agent record have less than 8 timestamps
-                if (np.linalg.norm(diff) < 2) or (len(record)<8): continue
-                filtered_frame_data.append( record[:,2:]  )
+class real_dataset_traj(object):
 
+    def __init__( self, dataset_name="hotel"):
+        self.random_seed=0
+        self.spawn_distance_threshold = 0.7 #0.7
 
-        self.dataset_traj = np.array(filtered_frame_data)
+        self.dataset_traj = load_dataset_traj(dataset_name)
         
     def seed(self):
         self.random_seed+=1
@@ -719,6 +813,10 @@ class real_dataset_traj(object):
         #get target agent's start, goal, current position, so that when picking new traj, prevent choosing one that is close to these points
         num_traj = len(self.dataset_traj)
 
+        #points the new start can't be close to: every agent's start, goal and current position (don't change while we sample)
+        occupied_points = np.array( [ point for agent in agents for point in (agent.start_global_frame, agent.goal_global_frame, agent.pos_global_frame) ], dtype=np.float64 ).reshape(-1, 2)
+        occupied_tree = cKDTree(occupied_points) if len(occupied_points) > 0 else None
+
         collide = True
         while collide:
             self.seed()
@@ -731,21 +829,10 @@ class real_dataset_traj(object):
 
             past_traj = picked_agent_traj[:8]
 
-            #past_goal_points = np.array(scenario)[:,4:6].astype(np.float)
-            past_start_points          =   np.array( [ agent.start_global_frame for agent in agents ] ) .astype(np.float)
-            past_goal_points           =   np.array( [ agent.goal_global_frame for agent in agents ] ) .astype(np.float)
-            past_current_points        =   np.array( [ agent.pos_global_frame for agent in agents ] ) .astype(np.float)
-
-            own_goal_points            = np.array( [[ goal_x, goal_y  ]]).astype(np.float)
-
-            past_start_points = np.concatenate((past_start_points,past_goal_points,past_current_points,own_goal_points))
+            if occupied_tree is None: break
 
-            if len(past_goal_points)==0: break
-
-            closet_distance_to_other_start_point = 999
-            for past_start_point in past_start_points:
-                distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
-                if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+            #the new start must also be away from its own goal
+            closet_distance_to_other_start_point = min( occupied_tree.query([start_x,start_y])[0], np.linalg.norm( np.array([goal_x-start_x, goal_y-start_y]) ) )
 
             if closet_distance_to_other_start_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                 collide=False
@@ -803,6 +890,9 @@ class real_dataset_traj(object):
             speed_threshold = 0.2
             if (pref_speed < speed_threshold ): pref_speed = speed_threshold
 
+            #start and goal points of the agents picked so far (don't change while we sample this agent)
+            past_tree = cKDTree( np.array([ row[2:6] for row in scenario ], dtype=np.float64).reshape(-1, 2) ) if len(scenario) > 0 else None
+
             #To make sure it is not colliding with other start point
             collide = True
             while collide:
@@ -822,17 +912,7 @@ class real_dataset_traj(object):
                     collide=False
                     break
 
-                past_start_points = np.array(scenario)[:,2:4].astype(np.float)
-                past_goal_points  = np.array(scenario)[:,4:6].astype(np.float)
-
-                past_start_points = np.concatenate((past_start_points,past_goal_points))
-
-                if len(past_start_points)==0: break
-                
-                closet_distance_to_other_start_point = 999
-                for past_start_point in past_start_points:
-                    distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
-                    if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+                closet_distance_to_other_start_point = past_tree.query([start_x,start_y])[0]
 
                 if closet_distance_to_other_start_point >= self.spawn_distance_threshold: #0.7 #default=1, reduce if it is a crowded scene
                     collide=False
@@ -0,0 +1,62 @@
+import random
+import zlib
+import multiprocessing
+import numpy as np
+
+# State of the current worker process: its own env, the job function, and a cache the job function can use
+# to keep things between jobs (e.g., agents whose policies already loaded their models)
+_worker = {}
+
+def case_seed(base_seed, *keys):
+    """ Deterministic seed for one test case (same value no matter which worker runs it, or in which order) """
+    return zlib.crc32(repr((base_seed,) + keys).encode())
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        import torch
+        torch.manual_seed(seed)
+    except ImportError:
+        pass
+
+def _init_worker(run_job_fn):
+    from gym_collision_avoidance.experiments.src.env_utils import create_env
+    _worker['env'], _worker['one_env'] = create_env()
+    _worker['run_job_fn'] = run_job_fn
+    _worker['cache'] = {}
+
+def _run_job(job):
+    return job, _worker['run_job_fn'](_worker['env'], _worker['one_env'], _worker['cache'], job)
+
+def run_jobs(jobs, run_job_fn, num_workers=1):
+    """ Run each job with :code:`run_job_fn(env, one_env, worker_cache, job)`, spread across a pool of worker processes.
+
+    Each worker creates its own env once, and keeps its worker_cache dict across jobs, so run_job_fn can hold on to
+    agents/policies that already loaded their models. With num_workers <= 1, everything runs in this process.
+
+    Args:
+        jobs (list): picklable descriptions of what to run (e.g., dicts with num_agents, policy, test_case)
+        run_job_fn (function): module-level function (so it can be pickled) that runs one job and returns its result
+        num_workers (int): number of worker processes (None: one per cpu)
+
+    Returns:
+        generator of (job, result) tuples, in the order jobs finish (not the order of jobs)
+
+    """
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = min(num_workers, len(jobs))
+    if num_workers <= 1:
+        _init_worker(run_job_fn)
+        for job in jobs:
+            yield _run_job(job)
+        return
+
+    pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(run_job_fn,))
+    try:
+        for job_and_result in pool.imap_unordered(_run_job, jobs):
+            yield job_and_result
+    finally:
+        pool.close()
+        pool.join()
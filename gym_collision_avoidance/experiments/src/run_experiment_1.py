@@ -13,51 +13,56 @@ parser.add_argument("--timeout"              , type=int, required=True, help="ho
 
 parser.add_argument("--population_density"   , type=float, required=False, default="-1.0" ,help="under exp2, what population density should be used?")
 parser.add_argument("--dataset_name"         , type=str  , required=False, default="None" ,help="under exp1, for the exp settings of algortihms, which dataset should they mimick?")
-args = parser.parse_args()
-print(args)
+parser.add_argument("--scenario_workers"     , type=int  , required=False, default=1      ,help="under exp2, how many processes generate the scenarios? (same scenarios, just faster for many iterations)")
+# the setup only runs in the main process: under the spawn start method (macOS, Windows), every --scenario_workers
+# process re-imports this script, and would otherwise parse the arguments and generate the scenarios again
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+
+    experiment_number = args.experiment_num
+    algorithm_name    = args.algorithm_name
 
-experiment_number = args.experiment_num
-algorithm_name    = args.algorithm_name
+    experiment_iteration_num = args.experiment_iteration
+    timeout = args.timeout
 
-experiment_iteration_num = args.experiment_iteration
-timeout = args.timeout
+    dataset_name = args.dataset_name
+    population_density = args.population_density
 
-dataset_name = args.dataset_name
-population_density = args.population_density
+    os.environ["global_timeout"]             = str(timeout)
+    os.environ["global_experiment_number"]   = str(experiment_number)
+    os.environ["global_dataset_name"]        = str(dataset_name)
+    os.environ["global_population_density"]  = str(population_density)
 
-os.environ["global_timeout"]             = str(timeout)
-os.environ["global_experiment_number"]   = str(experiment_number)
-os.environ["global_dataset_name"]        = str(dataset_name)
-os.environ["global_population_density"]  = str(population_density)
+    ##print("AFter set")
+    ##print(os.environ["global_timeout"] )
+    ##print(os.environ["global_experiment_number"])
+    ##print(os.environ["global_dataset_name"])
 
-##print("AFter set")
-##print(os.environ["global_timeout"] )
-##print(os.environ["global_experiment_number"])
-##print(os.environ["global_dataset_name"])
 
+    import pickle
+    from tqdm import tqdm
 
-import pickle
-from tqdm import tqdm
+    os.environ['GYM_CONFIG_CLASS'] = 'Custom' 
 
-os.environ['GYM_CONFIG_CLASS'] = 'Custom' 
 
+    from gym_collision_avoidance.experiments.src.master_config_deploy import Master_Config
+    from gym_collision_avoidance.experiments.src.master_config_deploy import Scenario_Config
 
-from gym_collision_avoidance.experiments.src.master_config_deploy import Master_Config
-from gym_collision_avoidance.experiments.src.master_config_deploy import Scenario_Config
+    ##master_config   = Master_Config(    timeout  )
+    ##scenario_config = Scenario_Config(  experiment_number, algorithm_name, experiment_iteration_num, dataset_name=None, population_density=None)
 
-##master_config   = Master_Config(    timeout  )
-##scenario_config = Scenario_Config(  experiment_number, algorithm_name, experiment_iteration_num, dataset_name=None, population_density=None)
+    #master config and scenario config from "master_config_deploy.py"
+    master_config   = Master_Config()
 
-#master config and scenario config from "master_config_deploy.py"
-master_config   = Master_Config()
+    # scenario config for algorith, exp no etc
+    scenario_config = Scenario_Config(  experiment_number, algorithm_name, experiment_iteration_num, dataset_name, population_density, num_workers=args.scenario_workers)
 
-# scenario config for algorith, exp no etc
-scenario_config = Scenario_Config(  experiment_number, algorithm_name, experiment_iteration_num, dataset_name, population_density)
 
+    from gym_collision_avoidance.envs import Config
+    import gym_collision_avoidance.envs.test_cases as tc
+    from gym_collision_avoidance.experiments.src.env_utils import run_episode, create_env, store_stats, policies
 
-from gym_collision_avoidance.envs import Config
-import gym_collision_avoidance.envs.test_cases as tc
-from gym_collision_avoidance.experiments.src.env_utils import run_episode, create_env, store_stats, policies
 
 LINEAR      = 0
 NonCooperativePolicy = 0
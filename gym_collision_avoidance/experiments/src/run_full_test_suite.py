@@ -9,6 +9,7 @@ os.environ['GYM_CONFIG_CLASS'] = 'FullTestSuite'
 from gym_collision_avoidance.envs import Config
 import gym_collision_avoidance.envs.test_cases as tc
 from gym_collision_avoidance.experiments.src.env_utils import run_episode, create_env, store_stats, policies
+from gym_collision_avoidance.experiments.src.parallel_runner import run_jobs, case_seed, seed_everything
 
 def reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents, policies, policy, prev_agents):
     test_case_args['num_agents'] = num_agents
@@ -34,10 +35,7 @@ def reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents,
     one_env.test_case_index = test_case
     return init_obs
 
-def main():
-    np.random.seed(0)
-
-    test_case_fn = tc.full_test_suite
+def get_test_case_args():
     test_case_args = {}
 
     if Config.FIXED_RADIUS_AND_VPREF:
@@ -47,36 +45,58 @@ def main():
         vpref1_str = 'vpref1.0_r{}-{}/'.format(radius_bounds[0], radius_bounds[1])
     else:
         vpref1_str = ''
+    return test_case_args, vpref1_str
+
+def run_test_case(env, one_env, worker_cache, job):
+    # Runs in a worker: one episode of test case job['test_case'], with num_agents agents all following job['policy']
+    num_agents, policy, test_case = job['num_agents'], job['policy'], job['test_case']
+    test_case_args, vpref1_str = get_test_case_args()
+    one_env.set_plot_save_dir(os.path.dirname(os.path.realpath(__file__)) + '/../results/full_test_suites/{vpref1_str}{num_agents}_agents/figs/'.format(vpref1_str=vpref1_str, num_agents=num_agents))
+
+    # Seed per test case, so results don't depend on how the cases were split across workers
+    seed_everything(case_seed(0, num_agents, policy, test_case))
 
-    env, one_env = create_env()
+    # Re-use this worker's agents from the last episode with the same setup, so their policies don't re-load their models
+    prev_agents = worker_cache.get((num_agents, policy))
+    _ = reset_env(env, one_env, tc.full_test_suite, test_case_args, test_case, num_agents, policies, policy, prev_agents)
+    episode_stats, prev_agents, _ = run_episode(env, one_env)
+    worker_cache[(num_agents, policy)] = prev_agents
+    return episode_stats
 
-    print("Running {test_cases} test cases for {num_agents} for policies: {policies}".format(
+def main():
+    _, vpref1_str = get_test_case_args()
+
+    print("Running {test_cases} test cases for {num_agents} for policies: {policies} ({num_workers} workers)".format(
         test_cases=Config.NUM_TEST_CASES,
         num_agents=Config.NUM_AGENTS_TO_TEST,
         policies=Config.POLICIES_TO_TEST,
+        num_workers=Config.NUM_EXPERIMENT_WORKERS,
         ))
-    with tqdm(total=len(Config.NUM_AGENTS_TO_TEST)*len(Config.POLICIES_TO_TEST)*Config.NUM_TEST_CASES) as pbar:
+    jobs = [{'num_agents': num_agents, 'policy': policy, 'test_case': test_case}
+            for num_agents in Config.NUM_AGENTS_TO_TEST
+            for policy in Config.POLICIES_TO_TEST
+            for test_case in range(Config.NUM_TEST_CASES)]
+
+    # Episode stats stream back as each test case finishes (in any order)
+    episode_stats_dict = {}
+    with tqdm(total=len(jobs)) as pbar:
+        for job, episode_stats in run_jobs(jobs, run_test_case, num_workers=Config.NUM_EXPERIMENT_WORKERS):
+            episode_stats_dict[(job['num_agents'], job['policy'], job['test_case'])] = episode_stats
+            pbar.update(1)
+
+    if Config.RECORD_PICKLE_FILES:
         for num_agents in Config.NUM_AGENTS_TO_TEST:
-            one_env.set_plot_save_dir(os.path.dirname(os.path.realpath(__file__)) + '/../results/full_test_suites/{vpref1_str}{num_agents}_agents/figs/'.format(vpref1_str=vpref1_str, num_agents=num_agents))
             for policy in Config.POLICIES_TO_TEST:
-                np.random.seed(0)
-                prev_agents = None
                 df = pd.DataFrame()
                 for test_case in range(Config.NUM_TEST_CASES):
-                    ##### Actually run the episode ##########
-                    _ = reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents, policies, policy, prev_agents)
-                    episode_stats, prev_agents = run_episode(env, one_env)
-                    df = store_stats(df, {'test_case': test_case, 'policy_id': policy}, episode_stats)
-                    ########################################
-                    pbar.update(1)
+                    df = store_stats(df, {'test_case': test_case, 'policy_id': policy}, episode_stats_dict[(num_agents, policy, test_case)])
 
-                if Config.RECORD_PICKLE_FILES:
-                    file_dir = os.path.dirname(os.path.realpath(__file__)) + '/../results/full_test_suites/{vpref1_str}'.format(vpref1_str=vpref1_str)
-                    file_dir += '{num_agents}_agents/stats/'.format(num_agents=num_agents)
-                    os.makedirs(file_dir, exist_ok=True)
-                    log_filename = file_dir+'/stats_{}.p'.format(policy)
-                    # log_filename = file_dir+'/stats_{}_{}.p'.format(policy, now.strftime("%m_%d_%Y__%H_%M_%S"))
-                    df.to_pickle(log_filename)
+                file_dir = os.path.dirname(os.path.realpath(__file__)) + '/../results/full_test_suites/{vpref1_str}'.format(vpref1_str=vpref1_str)
+                file_dir += '{num_agents}_agents/stats/'.format(num_agents=num_agents)
+                os.makedirs(file_dir, exist_ok=True)
+                log_filename = file_dir+'/stats_{}.p'.format(policy)
+                # log_filename = file_dir+'/stats_{}_{}.p'.format(policy, now.strftime("%m_%d_%Y__%H_%M_%S"))
+                df.to_pickle(log_filename)
 
     return True
 
@@ -30,6 +30,7 @@ os.environ['GYM_CONFIG_CLASS'] = 'Sam_multi_algo'
 from gym_collision_avoidance.envs import Config
 import gym_collision_avoidance.envs.test_cases as tc
 from gym_collision_avoidance.experiments.src.env_utils import run_episode, create_env, store_stats, policies
+from gym_collision_avoidance.experiments.src.parallel_runner import run_jobs, case_seed, seed_everything
 
 
 ######## Create simulation for each policy,  not setting unique policy for each agents
@@ -105,22 +106,30 @@ def reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents,
     one_env.test_case_index = test_case
     return init_obs
 
-def main():
-    np.random.seed(0)
-
+def run_test_case_sequence(env, one_env, worker_cache, job):
+    # Runs in a worker: every test case for job['num_agents'] agents, in order
+    # (each test case starts from where the previous one's agents ended up, so they can't be split up)
     test_case_fn = tc.sam_formation #formation
     test_case_args = {}
 
+    one_env.set_plot_save_dir(
+        os.path.dirname(os.path.realpath(__file__)) + '/../results/sam/')
+
+    seed_everything(case_seed(0, job['num_agents']))
+    agent_policies_list = Config.POLICIES_TO_TEST
+    prev_agents = None
+    all_episode_stats = []
+    for test_case in range(Config.NUM_TEST_CASES):
+        _ = reset_env(env, one_env, test_case_fn, test_case_args, test_case, job['num_agents'], agent_policies_list,  prev_agents)
+        episode_stats, prev_agents, _ = run_episode(env, one_env)
+        all_episode_stats.append(episode_stats)
+    return all_episode_stats
+
+def main():
     #Formation
     #env test_cases formation
     #For sceneraio generator, can be programmed
     #formation is for 6 agents
-    
-
-    env, one_env = create_env()
-
-    one_env.set_plot_save_dir(
-        os.path.dirname(os.path.realpath(__file__)) + '/../results/sam/')
 
 #######Create simulation for each policy,  not setting unique policy for each agents
 ##
@@ -132,15 +141,10 @@ def main():
 ##                _ = reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents, policies, policy, prev_agents)
 ##                episode_stats, prev_agents = run_episode(env, one_env)
 
-    for num_agents in Config.NUM_AGENTS_TO_TEST: #if two num agents to test, simulate two times
-        
-        agent_policies_list = Config.POLICIES_TO_TEST
-        
-        np.random.seed(0)
-        prev_agents = None
-        for test_case in range(Config.NUM_TEST_CASES):
-            _ = reset_env(env, one_env, test_case_fn, test_case_args, test_case, num_agents, agent_policies_list,  prev_agents)
-            episode_stats, prev_agents = run_episode(env, one_env)
+    #if two num agents to test, simulate two times (each in its own worker, if Config.NUM_EXPERIMENT_WORKERS > 1)
+    jobs = [{'num_agents': num_agents} for num_agents in Config.NUM_AGENTS_TO_TEST]
+    for job, _ in run_jobs(jobs, run_test_case_sequence, num_workers=Config.NUM_EXPERIMENT_WORKERS):
+        print("Finished {} test cases with {} agents".format(Config.NUM_TEST_CASES, job['num_agents']))
 
     return True
 
@@ -0,0 +1,80 @@
+import os
+import unittest
+import numpy as np
+
+# agents need the settings of an experiment config (e.g., agent_time_out), not just the base Config
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs import Config
+from gym_collision_avoidance.envs.broadphase import find_candidate_pairs
+from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.policies.NonCooperativePolicy import NonCooperativePolicy
+from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
+from gym_collision_avoidance.envs.collision_avoidance_env import CollisionAvoidanceEnv
+
+
+def random_positions(rng, n):
+    return rng.uniform(-10, 10, (n, 2))
+
+def clustered_positions(rng, n):
+    # a few tight clusters (many pairs in the same grid cell), some exact duplicates, and points on cell boundaries
+    centers = rng.uniform(-10, 10, (3, 2))
+    positions = centers[rng.randint(0, 3, n)] + rng.normal(0, 0.3, (n, 2))
+    if n == 0:
+        return positions
+    positions[:n//10] = positions[0]
+    positions[n//10:n//5] = np.round(positions[n//10:n//5])
+    return positions
+
+
+class TestBroadphase(unittest.TestCase):
+
+    def assertSamePairs(self, positions, cutoff, method):
+        pairs_i, pairs_j = find_candidate_pairs(positions, cutoff, method=method)
+        brute_i, brute_j = find_candidate_pairs(positions, cutoff, method='brute_force')
+        # brute_force returns every pair: keep the ones within cutoff
+        diff = positions[brute_i] - positions[brute_j]
+        within = diff[:, 0]**2 + diff[:, 1]**2 <= cutoff**2
+        self.assertTrue(np.all(pairs_i < pairs_j))
+        self.assertEqual(sorted(zip(pairs_i.tolist(), pairs_j.tolist())),
+                         sorted(zip(brute_i[within].tolist(), brute_j[within].tolist())))
+
+    def test_candidate_pairs_match_brute_force(self):
+        rng = np.random.RandomState(0)
+        for method in ['grid', 'kdtree']:
+            for positions_fn in [random_positions, clustered_positions]:
+                for n in [0, 1, 2, 10, 100, 300]:
+                    for cutoff in [0.5, 1.0, 1.2, 3.0]:
+                        self.assertSamePairs(positions_fn(rng, n), cutoff, method)
+
+    def test_check_for_collisions_matches_brute_force(self):
+        env = CollisionAvoidanceEnv()
+        rng = np.random.RandomState(1)
+        broadphase = Config.COLLISION_BROADPHASE
+        try:
+            for trial in range(40):
+                num_agents = rng.randint(2, 60)
+                positions = (random_positions if trial % 2 else clustered_positions)(rng, num_agents) / 4.
+                radii = rng.uniform(0.2, 0.5, num_agents)
+                env.active_agents = [ Agent(x, y, 0, 0, radius, 1.0, 0, NonCooperativePolicy, UnicycleDynamics, [], i)
+                    for i, ((x, y), radius) in enumerate(zip(positions, radii)) ]
+
+                results = {}
+                for method in ['brute_force', 'grid', 'kdtree']:
+                    Config.COLLISION_BROADPHASE = method
+                    collision_with_agent, _, _, dist_btwn_nearest_agent = env._check_for_collisions()
+                    results[method] = (np.array(collision_with_agent), np.array(dist_btwn_nearest_agent))
+
+                brute_collision, brute_dist = results['brute_force']
+                close = brute_dist <= Config.GETTING_CLOSE_RANGE
+                for method in ['grid', 'kdtree']:
+                    collision, dist = results[method]
+                    self.assertTrue(np.array_equal(collision, brute_collision))
+                    self.assertTrue(np.allclose(dist[close], brute_dist[close], rtol=0, atol=1e-12))
+                    # agents that aren't close aren't reported as close either
+                    self.assertTrue(np.all(dist[~close] > Config.GETTING_CLOSE_RANGE))
+        finally:
+            Config.COLLISION_BROADPHASE = broadphase
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import unittest
+import numpy as np
+
+# agents need the settings of an experiment config (e.g., agent_time_out), not just the base Config
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs import Config
+from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
+from gym_collision_avoidance.envs.policies.CADRLPolicy import CADRLPolicy
+from gym_collision_avoidance.envs.policies.CADRL.scripts.multi import gen_rand_testcases as gen_tc
+
+
+def find_dist_between_segs_masked(x1, x2, y1, y2):
+    """ gen_rand_testcases.find_dist_between_segs as it was before it was broadcast (one host agent, one other agent) """
+    if_one_pt = False
+    if x2.shape == (2,):
+        x2 = x2.reshape((1,2))
+        y2 = y2.reshape((1,2))
+        if_one_pt = True
+    end_dist = np.linalg.norm(x2 - y2, axis=1)
+    critical_dist = end_dist.copy()
+    z_bar = (x2 - x1) - (y2 - y1)
+    inds = np.where((np.linalg.norm(z_bar,axis=1)>0))[0]
+    t_bar = - np.sum((x1-y1) * z_bar[inds,:], axis=1) \
+            / np.sum(z_bar[inds,:] * z_bar[inds,:], axis=1)
+    t_bar_rep = np.tile(t_bar, (2, 1)).transpose()
+    dist_bar = np.linalg.norm(x1 + (x2[inds,:]-x1) * t_bar_rep \
+              - y1 - (y2[inds,:]-y1) * t_bar_rep, axis=1)
+    inds_2 = np.where((t_bar > 0) & (t_bar < 1.0))
+    critical_dist[inds[inds_2]] = dist_bar[inds_2]
+    min_dist = np.amin(np.vstack((end_dist, critical_dist)), axis=0)
+    if if_one_pt:
+        return min_dist[0]
+    return min_dist
+
+def make_prediction_block_loop(nn, X):
+    """ Neural_network_regr_multi.make_prediction as it was before the max-pool gather indices (one np.max per pooled block) """
+    nb_layers = nn.num_hidden_layers + 1
+    out = X
+    for layer in range(nb_layers-1):
+        if nn.multiagent_net_param.layers_type[layer] == 'conn':
+            tmp = np.dot(out, nn.W[layer]) + np.tile(nn.b[layer], (X.shape[0], 1))
+            out = tmp * (tmp>0)
+        elif nn.multiagent_net_param.layers_type[layer] == 'max':
+            num_pts = out.shape[0]
+            out_next = np.zeros((num_pts, np.sum(nn.multiagent_net_param.layers_info[layer][:,1])))
+            if num_pts == 0:
+                out = out_next
+                continue
+            cur_s_ind = 0
+            next_s_ind = 0
+            for ii in range(nn.multiagent_net_param.layers_info[layer].shape[0]):
+                num_agents = nn.multiagent_net_param.layers_info[layer][ii,0]
+                stride = nn.multiagent_net_param.layers_info[layer][ii,1]
+                cur_e_ind = cur_s_ind + num_agents * stride
+                next_e_ind = next_s_ind + stride
+                block_form = np.reshape(out[:,cur_s_ind:cur_e_ind], (num_pts,-1,stride))
+                out_next[:,next_s_ind:next_e_ind] = np.max(block_form, axis=1)
+                cur_s_ind = cur_e_ind
+                next_s_ind = next_e_ind
+            out = out_next
+    return np.dot(out, nn.W[nb_layers-1]) + np.tile(nn.b[nb_layers-1], (X.shape[0], 1))
+
+def make_agents(rng, n):
+    starts = rng.uniform(-4, 4, (n, 2))
+    goals = rng.uniform(-4, 4, (n, 2))
+    agents = [ Agent(start[0], start[1], goal[0], goal[1], rng.uniform(0.2, 0.5), rng.uniform(0.5, 1.5), rng.uniform(-np.pi, np.pi), CADRLPolicy, UnicycleDynamics, [], i)
+        for i, (start, goal) in enumerate(zip(starts, goals)) ]
+    # out of everyone else's sensing range, if it is finite (then goes straight to its goal)
+    agents[-1].pos_global_frame = np.array([100., 100.])
+    return agents
+
+
+class TestCADRL(unittest.TestCase):
+
+    def test_find_dist_between_segs_matches_masked(self):
+        rng = np.random.RandomState(0)
+        for trial in range(200):
+            num_actions, num_other_agents = rng.randint(1, 30), rng.randint(1, 4)
+            x1 = rng.uniform(-3, 3, 2)
+            x2 = x1 + rng.uniform(-1, 1, (num_actions, 2))
+            y1 = rng.uniform(-3, 3, (num_other_agents, 2))
+            y2 = y1 + rng.uniform(-1, 1, (num_other_agents, 2))
+            # no relative motion (no critical point) for some of the actions
+            x2[::3] = x1 + (y2[0] - y1[0])
+            # every action against one other agent, as the previous implementation did
+            for j in range(num_other_agents):
+                dist = gen_tc.find_dist_between_segs(x1, x2, y1[j], np.tile(y2[j], (num_actions, 1)))
+                expected_dist = find_dist_between_segs_masked(x1, x2, y1[j], np.tile(y2[j], (num_actions, 1)))
+                self.assertTrue(np.array_equal(dist, expected_dist))
+                self.assertEqual(gen_tc.find_dist_between_segs(x1, x2[0], y1[j], y2[j]), find_dist_between_segs_masked(x1, x2[0], y1[j], y2[j]))
+            # every action against every other agent at once
+            dist = gen_tc.find_dist_between_segs(x1, x2[:, np.newaxis, :], y1, np.broadcast_to(y2, (num_actions, num_other_agents, 2)))
+            expected_dist = np.stack([ find_dist_between_segs_masked(x1, x2, y1[j], np.tile(y2[j], (num_actions, 1))) for j in range(num_other_agents) ], axis=1)
+            self.assertTrue(np.array_equal(dist, expected_dist))
+
+    def test_make_prediction_matches_block_loop(self):
+        nn = CADRLPolicy().value_net.nn
+        self.assertIn('max', nn.multiagent_net_param.layers_type)
+        input_dim = nn.W[0].shape[0]
+        rng = np.random.RandomState(1)
+        for num_pts in [0, 1, 7, 200]:
+            X = rng.randn(num_pts, input_dim)
+            self.assertTrue(np.allclose(nn.make_prediction(X), make_prediction_block_loop(nn, X), rtol=1e-12, atol=1e-12))
+        X = rng.randn(5, 10, input_dim)
+        self.assertTrue(np.array_equal(nn.make_prediction(X), nn.make_prediction(X.reshape(50, input_dim)).reshape(5, 10, -1)))
+
+    def test_find_next_actions_matches_find_next_action(self):
+        rng = np.random.RandomState(2)
+        sensing_horizon = Config.SENSING_HORIZON
+        try:
+            for horizon in [np.inf, 10.]:
+                Config.SENSING_HORIZON = horizon
+                for trial in range(3):
+                    seed = rng.randint(1000)
+                    # the same agents twice: one set steps with per-agent find_next_action, the other with the batched find_next_actions
+                    agents = make_agents(np.random.RandomState(seed), 7)
+                    batched_agents = make_agents(np.random.RandomState(seed), 7)
+                    active_agent_mask = [True]*7
+                    active_agent_mask[trial] = False
+                    agent_indices = [i for i in range(7) if active_agent_mask[i]]
+                    for step in range(5):
+                        actions = np.array([ agents[i].policy.find_next_action(None, agents, i, full_agent_list=agents, active_agent_mask=active_agent_mask)
+                            for i in agent_indices ])
+                        batched_actions = batched_agents[agent_indices[0]].policy.find_next_actions(None, batched_agents, agent_indices, active_agent_mask)
+                        self.assertTrue(np.array_equal(actions, batched_actions))
+                        for i, action, batched_action in zip(agent_indices, actions, batched_actions):
+                            agents[i].take_action(action, 0.1)
+                            batched_agents[i].take_action(batched_action, 0.1)
+        finally:
+            Config.SENSING_HORIZON = sensing_horizon
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import json
+import unittest
+import numpy as np
+
+from gym_collision_avoidance.experiments.src import master_scenario_generator as msg
+
+
+class Agent(object):
+    """ Just the fields of :class:`~gym_collision_avoidance.envs.agent.Agent` that the scenario generators read """
+    def __init__(self, start, goal, pos):
+        self.start_global_frame = np.array(start, dtype=np.float64)
+        self.goal_global_frame = np.array(goal, dtype=np.float64)
+        self.pos_global_frame = np.array(pos, dtype=np.float64)
+
+
+class MinLoopDatasetTraj(msg.real_dataset_traj):
+    """ real_dataset_traj with the spawn rejection of the previous implementation (python min loop over every point) """
+    def pick_one(self, agents, random_seed=0):
+        self.random_seed = random_seed*1000
+        np.random.seed(self.random_seed)
+        num_traj = len(self.dataset_traj)
+        collide = True
+        while collide:
+            self.seed()
+            index = np.random.randint(0,num_traj)
+            picked_agent_traj = self.dataset_traj[index]
+            start_x,start_y = picked_agent_traj[7]
+            goal_x,goal_y = picked_agent_traj[-1]
+            past_traj = picked_agent_traj[:8]
+
+            past_start_points = np.array( [ agent.start_global_frame for agent in agents ] ).astype(np.float64)
+            past_goal_points = np.array( [ agent.goal_global_frame for agent in agents ] ).astype(np.float64)
+            past_current_points = np.array( [ agent.pos_global_frame for agent in agents ] ).astype(np.float64)
+            own_goal_points = np.array( [[ goal_x, goal_y ]]).astype(np.float64)
+            if len(past_goal_points)==0: break
+            past_start_points = np.concatenate((past_start_points,past_goal_points,past_current_points,own_goal_points))
+
+            closet_distance_to_other_start_point = 999
+            for past_start_point in past_start_points:
+                distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
+                if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+            if closet_distance_to_other_start_point >= self.spawn_distance_threshold:
+                collide=False
+        return [ None , None ,start_x, start_y, goal_x, goal_y, past_traj, None, None ]
+
+    def pick_start(self, population_density, policy_list, x_min, x_max, y_min, y_max, pref_speed, agent_radius, start_timestamp, random_seed=0, num_agents_override=None):
+        self.random_seed = random_seed*1000
+        np.random.seed(self.random_seed)
+        num_agents = num_agents_override
+        scenario = []
+        for i in range(num_agents):
+            collide = True
+            while collide:
+                self.seed()
+                index = np.random.randint(0,len(self.dataset_traj))
+                picked_agent_traj = self.dataset_traj[index]
+                start_x,start_y = picked_agent_traj[7]
+                goal_x,goal_y = picked_agent_traj[-1]
+                past_traj = picked_agent_traj[:8]
+                if len(scenario)==0: break
+
+                # (np.array(scenario) itself is ragged: past_traj)
+                past_points = np.array([ row[2:6] for row in scenario ]).astype(np.float64)
+                past_start_points = np.concatenate((past_points[:,0:2],past_points[:,2:4]))
+                closet_distance_to_other_start_point = 999
+                for past_start_point in past_start_points:
+                    distance = np.linalg.norm(past_start_point - np.array([start_x,start_y]) )
+                    if distance < closet_distance_to_other_start_point: closet_distance_to_other_start_point = distance
+                if closet_distance_to_other_start_point >= self.spawn_distance_threshold:
+                    collide=False
+            scenario.append( [ i, policy_list, start_x, start_y, goal_x, goal_y, pref_speed, agent_radius, past_traj ] )
+        return scenario
+
+
+class TestRealDatasetTraj(unittest.TestCase):
+
+    def assertSamePicks(self, picks, expected_picks):
+        self.assertEqual(len(picks), len(expected_picks))
+        for pick, expected_pick in zip(picks, expected_picks):
+            self.assertEqual(pick[2:6], expected_pick[2:6])
+            self.assertTrue(np.array_equal(pick[8], expected_pick[8]))
+
+    def test_pick_start_matches_min_loop(self):
+        for dataset_name in ['hotel', 'univ', 'eth', 'zara1']:
+            dataset_traj = msg.real_dataset_traj(dataset_name)
+            min_loop_dataset_traj = MinLoopDatasetTraj(dataset_name)
+            for random_seed in range(3):
+                for num_agents in [2, 10, 25]:
+                    scenario = dataset_traj.pick_start(None, 'CVM', -5, 5, -5, 5, 1.0, 0.2, 0,
+                        random_seed=random_seed, num_agents_override=num_agents)
+                    expected_scenario = min_loop_dataset_traj.pick_start(None, 'CVM', -5, 5, -5, 5, 1.0, 0.2, 0,
+                        random_seed=random_seed, num_agents_override=num_agents)
+                    self.assertSamePicks(scenario, expected_scenario)
+
+    def test_pick_start_population_density(self):
+        scenario = msg.real_dataset_traj('hotel').pick_start(0.1, 'CVM', -5, 5, -5, 5, 1.0, 0.2, 0)
+        self.assertEqual(len(scenario), 10)
+        for row in scenario:
+            self.assertEqual(row[8].shape, (8, 2))
+
+    def test_pick_one_matches_min_loop(self):
+        rng = np.random.RandomState(0)
+        for dataset_name in ['hotel', 'univ', 'eth', 'zara1']:
+            dataset_traj = msg.real_dataset_traj(dataset_name)
+            min_loop_dataset_traj = MinLoopDatasetTraj(dataset_name)
+            for random_seed in range(5):
+                for num_agents in [0, 1, 5, 20]:
+                    starts = rng.uniform(-5, 5, (num_agents, 2))
+                    goals = rng.uniform(-5, 5, (num_agents, 2))
+                    agents = [ Agent(start, goal, start + rng.uniform(0, 1)*(goal-start)) for start, goal in zip(starts, goals) ]
+                    pick = dataset_traj.pick_one(agents, random_seed=random_seed)
+                    expected_pick = min_loop_dataset_traj.pick_one(agents, random_seed=random_seed)
+                    self.assertEqual(pick[2:6], expected_pick[2:6])
+                    self.assertTrue(np.array_equal(pick[6], expected_pick[6]))
+
+
+class TestPopulationScenarios(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # scenarios recorded with the previous implementation (python min loop over every start/goal placed so far)
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'population_scenarios.json')) as f:
+            cls.golden = json.load(f)
+
+    def test_population_random_square_edge_matches_golden(self):
+        for case in self.golden['population_random_square_edge']:
+            scenario = msg.Seeded_Population_Scenario_Generator(case['population_density'], 'RVO', case['x_min'], case['x_max'], case['x_min'], case['x_max'], 1.0, 0.2, 0,
+                random_seed=case['random_seed']).population_random_square_edge()
+            self.assertEqual(scenario, case['scenario'])
+
+    def test_single_population_random_square_edge_matches_golden(self):
+        for case in self.golden['single_population_random_square_edge']:
+            agents = [ Agent(*agent) for agent in self.golden['single_agents'] ]
+            generator = msg.Single_Seeded_Population_Scenario_Generator(0, 'RVO', -5, 5, -5, 5, 1.0, 0.2, 0, agents,
+                random_seed=case['random_seed'], num_agents_override=3)
+            row = generator.population_random_square_edge()
+            self.assertEqual(row, case['row'])
+            # the spawned start and goal keep away from every start, goal and position of the other agents
+            occupied_points = np.array(self.golden['single_agents']).reshape(-1, 2)
+            for point in [row[2:4], row[4:6]]:
+                self.assertTrue(np.all(np.linalg.norm(occupied_points - point, axis=1) >= generator.spawn_distance_threshold))
+
+    def test_spawn_attempts_limit(self):
+        self.assertEqual(msg.count_spawn_attempt(9999, 10000, 0, "start"), 10000)
+        with self.assertRaises(ValueError):
+            msg.count_spawn_attempt(10000, 10000, 0, "start")
+        # 30 agents don't fit on the edges of a 2x2 square
+        generator = msg.Seeded_Population_Scenario_Generator(0.1, 'RVO', 0, 2, 0, 2, 1.0, 0.2, 0, num_agents_override=30)
+        with self.assertRaises(ValueError):
+            generator.population_random_square_edge()
+
+    def test_generate_population_scenarios_workers(self):
+        args = (0.3, 'RVO', -5, 5, -5, 5, 1.0, 0.2, 0)
+        scenarios = msg.generate_population_scenarios(range(6), *args, num_workers=1)
+        self.assertEqual(scenarios, [ msg.Seeded_Population_Scenario_Generator(*args, random_seed=random_seed).population_random_square_edge()
+            for random_seed in range(6) ])
+        self.assertEqual(msg.generate_population_scenarios(range(6), *args, num_workers=3), scenarios)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+# agents need the settings of an experiment config (e.g., agent_time_out), not just the base Config
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+# read by the env's respawn loop
+for name, value in [('global_timeout', '200'), ('global_experiment_number', '2'), ('global_dataset_name', 'ETH'), ('global_population_density', '0.1')]:
+    os.environ.setdefault(name, value)
+from gym_collision_avoidance.envs import Config
+from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.policies.NonCooperativePolicy import NonCooperativePolicy
+from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
+from gym_collision_avoidance.envs.sensors.OtherAgentsStatesSensor import OtherAgentsStatesSensor
+from gym_collision_avoidance.envs.collision_avoidance_env import CollisionAvoidanceEnv
+
+
+class PerAgentLoopEnv(CollisionAvoidanceEnv):
+    """ The env with the per-agent reward and done loops it had before they were written as masks """
+
+    def _compute_rewards(self):
+        rewards = self.reward_time_step*np.ones(len(self.active_agents))
+        collision_with_agent, collision_with_wall, entered_norm_zone, dist_btwn_nearest_agent = \
+            self._check_for_collisions()
+
+        for i, agent in enumerate(self.active_agents):
+            if agent.is_at_goal:
+                if agent.was_at_goal_already is False:
+                    rewards[i] = self.reward_at_goal
+                if agent.was_in_collision_already is False:
+                    if collision_with_agent[i] and (agent.time_since_collision >= agent.collision_cooldown):
+                        rewards[i] = self.reward_collision_with_agent
+                        agent.in_collision = True
+            else:
+                if agent.was_in_collision_already is False:
+                    if collision_with_agent[i] and (agent.time_since_collision >= agent.collision_cooldown):
+                        rewards[i] = self.reward_collision_with_agent
+                        agent.in_collision = True
+                    elif collision_with_wall[i] and (agent.time_since_collision >= agent.collision_cooldown):
+                        rewards[i] = self.reward_collision_with_wall
+                        agent.in_collision = True
+                    else:
+                        if dist_btwn_nearest_agent[i] <= Config.GETTING_CLOSE_RANGE:
+                            rewards[i] = -0.1 - dist_btwn_nearest_agent[i]/2.
+                        if abs(agent.past_actions[0, 1]) > self.wiggly_behavior_threshold:
+                            rewards[i] += self.reward_wiggly_behavior
+        rewards = np.clip(rewards, self.min_possible_reward,
+                          self.max_possible_reward)
+        if Config.TRAIN_SINGLE_AGENT:
+            rewards = rewards[0]
+        return rewards
+
+    def _check_which_agents_done(self):
+        for agent in self.agents:
+            if (agent.arrival_timestep is None) and (agent.timeout_timestep is None) and (agent.out_of_bounds_timestep is None):
+                if agent.ran_out_of_time:
+                    agent.timeout_timestep = agent.step_num
+                    agent.arrival_timestep = -1
+                    agent.out_of_bounds_timestep = -1
+                elif agent.is_at_goal:
+                    agent.timeout_timestep = []
+                    agent.arrival_timestep = agent.step_num
+                    agent.out_of_bounds_timestep = -1
+                elif agent.is_out_of_bounds:
+                    agent.timeout_timestep = []
+                    agent.arrival_timestep = -1
+                    agent.out_of_bounds_timestep = agent.step_num
+            if (agent.in_collision and (agent.time_since_collision >= agent.collision_cooldown) and not agent.is_done):
+                agent.collision_timestep.append(self.episode_step_number)
+
+        at_goal_condition = np.array(
+                [a.is_at_goal for a in self.agents])
+        ran_out_of_time_condition = np.array(
+                [a.ran_out_of_time for a in self.agents])
+        out_of_bounds_condition = np.array(
+            [a.is_out_of_bounds for a in self.agents])
+        which_agents_done = np.logical_or.reduce((at_goal_condition, ran_out_of_time_condition, out_of_bounds_condition))
+        for agent_index, agent in enumerate(self.agents):
+            agent.is_done = which_agents_done[agent_index]
+
+        if Config.EVALUATE_MODE:
+            game_over = np.all(which_agents_done)
+        elif Config.TRAIN_SINGLE_AGENT:
+            game_over = which_agents_done[0]
+        else:
+            learning_agent_inds = [i for i in range(len(self.agents)) if self.agents[i].policy.is_still_learning]
+            game_over = np.all(which_agents_done[learning_agent_inds])
+        return which_agents_done, game_over
+
+
+def mixed_scenario_agents():
+    """ Agents that (in the first ~40 steps) collide head-on (then stay in contact while stopped, during the collision cooldown),
+    arrive at their goal, get close without touching, run out of time and leave the field """
+    specs = [
+        # start, goal, pref_speed
+        ((0, 0), (6, 0), 1.0), ((6, 0), (0, 0), 1.0), # head-on collision
+        ((0, 3), (1, 3), 1.0), # reaches its goal
+        ((0, -2), (6, -2), 1.0), ((6, -2.55), (0, -2.55), 1.0), # pass each other within GETTING_CLOSE_RANGE
+        ((-6, 6), (6, 6), 0.2), # runs out of time (see below)
+        ((9, -6), (14, -6), 1.0), # leaves the field
+    ]
+    agents = []
+    for i, (start, goal, pref_speed) in enumerate(specs):
+        heading = np.arctan2(goal[1]-start[1], goal[0]-start[0])
+        agents.append(Agent(start[0], start[1], goal[0], goal[1], 0.2, pref_speed, heading, NonCooperativePolicy, UnicycleDynamics, [OtherAgentsStatesSensor], i))
+    return agents
+
+
+class TestRewards(unittest.TestCase):
+
+    def run_episode(self, env_class, num_steps):
+        env = env_class()
+        env.set_plot_save_dir(self.plot_save_dir)
+        env.set_agents(mixed_scenario_agents())
+        env.reset()
+        env.agents[5].time_remaining_to_reach_goal = 3.0
+
+        steps = []
+        for step in range(num_steps):
+            _, rewards, game_over, info = env.step({})
+            if env.agents[2].is_at_goal:
+                # the env respawns inactive agents that reached their goal
+                env.active_agent_mask[2] = False
+            steps.append((np.array(rewards), bool(game_over), info,
+                [(agent.in_collision, agent.was_in_collision_already, agent.time_since_collision, agent.is_done,
+                  agent.arrival_timestep, agent.timeout_timestep, agent.out_of_bounds_timestep, list(agent.collision_timestep))
+                 for agent in env.agents]))
+        return steps
+
+    def test_rewards_and_done_match_per_agent_loops(self):
+        self.plot_save_dir = tempfile.mkdtemp() + '/'
+        saved_config = (Config.EVALUATE_MODE, Config.ANIMATE_EPISODES, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS)
+        Config.ANIMATE_EPISODES, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS = False, False, False
+        try:
+            for evaluate_mode in [False, True]:
+                Config.EVALUATE_MODE = evaluate_mode
+                steps = self.run_episode(CollisionAvoidanceEnv, 40)
+                expected_steps = self.run_episode(PerAgentLoopEnv, 40)
+                for (rewards, game_over, info, agents_state), (expected_rewards, expected_game_over, expected_info, expected_agents_state) in zip(steps, expected_steps):
+                    self.assertTrue(np.array_equal(rewards, expected_rewards))
+                    self.assertEqual(game_over, expected_game_over)
+                    self.assertEqual(info, expected_info)
+                    self.assertEqual(agents_state, expected_agents_state)
+
+                # the scenario went through every case
+                all_rewards = np.concatenate([step[0] for step in steps])
+                final_agents_state = steps[-1][3]
+                env = CollisionAvoidanceEnv()
+                self.assertIn(env.reward_collision_with_agent, all_rewards)
+                self.assertIn(env.reward_at_goal, all_rewards)
+                self.assertTrue(np.any((all_rewards < -0.1) & (all_rewards > env.reward_collision_with_agent)))
+                self.assertEqual(len(final_agents_state[0][7]), 1) # still in contact after the collision, but the cooldown blocks a second one
+                self.assertNotEqual(final_agents_state[5][5], None) # timed out
+                self.assertNotEqual(final_agents_state[6][6], None) # left the field
+        finally:
+            Config.EVALUATE_MODE, Config.ANIMATE_EPISODES, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS = saved_config
+
+
+if __name__ == '__main__':
+    unittest.main()
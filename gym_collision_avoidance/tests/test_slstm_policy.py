@@ -0,0 +1,145 @@
+import os
+import types
+import unittest
+from unittest import mock
+import numpy as np
+import torch
+
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs.policies import SLSTMPolicy as slstm_policy
+from gym_collision_avoidance.envs.policies.SLSTMPolicy import SLSTMPolicy
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import trajectory_history
+from gym_collision_avoidance.envs.policies.TorchDevice import get_torch_device
+from gym_collision_avoidance.envs.policies.social_lstm.helper import get_model
+from gym_collision_avoidance.envs.policies.social_lstm.utilsv2 import DataLoader
+
+
+def sample_mean_2d(mux, muy, sx, sy, corr, nodesPresent, look_up):
+    """ sample_gaussian_2d without the sampling: the mean of each present node, so both modes are deterministic """
+    nodes = [look_up[node] for node in nodesPresent]
+    next_x = torch.zeros(mux.size()[1])
+    next_y = torch.zeros(mux.size()[1])
+    next_x[nodes] = mux[0, nodes].float()
+    next_y[nodes] = muy[0, nodes].float()
+    return next_x, next_y
+
+def make_policy(net, saved_args):
+    """ SLSTMPolicy around an untrained net (its __init__ loads the trained model and preprocesses the dataset) """
+    policy = SLSTMPolicy.__new__(SLSTMPolicy)
+    policy.obs_length, policy.pred_length, policy.obs_seq_len = 8, 12, 8
+    policy.gru, policy.method, policy.device = False, 1, get_torch_device()
+    policy.saved_args = saved_args
+    policy.net = net.to(policy.device)
+    policy.dataloader = DataLoader.__new__(DataLoader)
+    policy.dataloader.seq_length = 20
+    policy.online_states = {}
+    return policy
+
+class Position(object):
+    """ What TrajectoryHistory records of an agent """
+    def __init__(self):
+        self.pos_global_frame = np.zeros(2)
+
+
+class TestOnlineInference(unittest.TestCase):
+
+    def setUp(self):
+        saved_args = types.SimpleNamespace(rnn_size=32, grid_size=4, embedding_size=16, input_size=2, output_size=5, maxNumPeds=30,
+            seq_length=20, gru=False, dropout=0.0, use_cuda=False, neighborhood_size=720)
+        torch.manual_seed(0)
+        net = get_model(1, saved_args, True)
+        self.online_policy = make_policy(net, saved_args)
+        self.offline_policy = make_policy(net, saved_args)
+        sampler = mock.patch.object(slstm_policy, 'sample_gaussian_2d', sample_mean_2d)
+        sampler.start()
+        self.addCleanup(sampler.stop)
+        self.addCleanup(trajectory_history.reset)
+        trajectory_history.reset()
+
+    def predict_offline(self, history):
+        """ The next position of every agent, predicted by predict_offline from the whole (num agents, num obs, 2) history """
+        policy = self.offline_policy
+        policy.obs_length = policy.obs_seq_len = history.shape[1]
+        policy.pred_length = 20 - policy.obs_length
+        policy.n_agents = len(history)
+        predicted_positions = np.zeros((len(history), 2))
+        for agent_index in range(len(history)):
+            # the first predicted frame is only moved back to the scene frame for the target agent
+            ret_x_seq = policy.predict_offline(history[:,:,0], history[:,:,1], agent_index)
+            predicted_positions[agent_index] = ret_x_seq.data.numpy()[policy.obs_length, agent_index] + history[agent_index, 0]
+        return predicted_positions
+
+    def predict_online(self, agents, active):
+        """ predict_online the way find_next_action calls it, on the newest recorded timestep """
+        history = trajectory_history.get_recent(active, self.online_policy.obs_seq_len, 4)
+        return self.online_policy.predict_online(history, [id(agents[i]) for i in active])
+
+    def record(self, agents, positions):
+        for agent, position in zip(agents, positions):
+            agent.pos_global_frame = position
+        trajectory_history.record(agents)
+
+    def assertSamePredictions(self, predicted_positions, expected_positions):
+        self.assertEqual(predicted_positions.shape, expected_positions.shape)
+        self.assertTrue(np.allclose(predicted_positions, expected_positions, rtol=0, atol=1e-4),
+            "max difference {}".format(np.abs(predicted_positions - expected_positions).max()))
+
+    def test_online_matches_offline(self):
+        # neighbors are within each other's grids, so the social pooling couples the agents
+        rng = np.random.RandomState(0)
+        num_agents, num_steps = 4, 100
+        trajectories = rng.uniform(-1, 1, (num_agents, 1, 2)) + np.cumsum(rng.uniform(-0.05, 0.05, (num_agents, num_steps, 2)), axis=1)
+        agents = [Position() for _ in range(num_agents)]
+        active = list(range(num_agents))
+        num_compared = 0
+        for step in range(num_steps):
+            self.record(agents, trajectories[:, step])
+            if step < 28:
+                continue
+            # each of the 4 phases (step % 4) carries its own states, fed every 4 steps: 8 observations at the first
+            # call, one more per call, restart from the newest 8 observations once 20 have been fed
+            num_obs = 8 + (step - 28)//4 % 13
+            predicted_positions = self.predict_online(agents, active)
+            if num_obs == 20:
+                continue # predict_offline can't observe the whole training sequence length and still predict
+            self.assertSamePredictions(predicted_positions, self.predict_offline(trajectories[:, step-4*(num_obs-1):step+1:4]))
+            num_compared += 1
+        self.assertEqual(num_compared, num_steps - 28 - 4)
+
+    def test_online_restarts(self):
+        rng = np.random.RandomState(1)
+        num_agents = 3
+        agents = [Position() for _ in range(num_agents)]
+        active = list(range(num_agents))
+        # number of observations the states have been fed at each call: 8 after a restart, which happens at the first call,
+        # after a gap in the calls, and at a new episode (even with the same agents and what would be the next call otherwise)
+        for episode_calls in [{28: 8, 36: 8, 40: 9, 48: 8}, {52: 8, 56: 9}]:
+            trajectories = rng.uniform(-1, 1, (num_agents, 1, 2)) + np.cumsum(rng.uniform(-0.05, 0.05, (num_agents, 60, 2)), axis=1)
+            trajectory_history.reset()
+            for step in range(60):
+                self.record(agents, trajectories[:, step])
+                if step in episode_calls:
+                    num_obs = episode_calls[step]
+                    predicted_positions = self.predict_online(agents, active)
+                    self.assertSamePredictions(predicted_positions, self.predict_offline(trajectories[:, step-4*(num_obs-1):step+1:4]))
+
+    def test_agent_leaves_and_reenters(self):
+        # agents far apart (outside each other's grids), so the predictions of an agent only depend on its own observations
+        rng = np.random.RandomState(2)
+        num_agents, num_steps = 3, 65
+        trajectories = 100*np.arange(num_agents)[:, np.newaxis, np.newaxis] + np.cumsum(rng.uniform(-0.05, 0.05, (num_agents, num_steps, 2)), axis=1)
+        agents = [Position() for _ in range(num_agents)]
+        for step in range(28, num_steps, 4):
+            for record_step in range(step - 3 if step > 28 else 0, step + 1):
+                self.record(agents, trajectories[:, record_step])
+            # agent 1 isn't active for one call: when it comes back, it starts over from zero states at its current position
+            active = [0, 2] if step == 32 else [0, 1, 2]
+            predicted_positions = self.predict_online(agents, active)
+            for row, agent_index in enumerate(active):
+                first_step = 36 if (agent_index == 1 and step >= 36) else 0
+                expected_position = self.predict_offline(trajectories[agent_index:agent_index+1, first_step:step+1:4])[0]
+                self.assertSamePredictions(predicted_positions[row], expected_position)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import itertools
+import types
+import unittest
+import numpy as np
+import torch
+
+from gym_collision_avoidance.envs.policies.social_lstm.grid import getGridMask
+from gym_collision_avoidance.envs.policies.social_lstm.model import SocialModel
+
+
+def getGridMask_pair_loop(frame, dimensions, num_person, neighborhood_size, grid_size, is_occupancy=False):
+    """ getGridMask as it was before it was vectorized (per pair of peds, scalar arithmetic) """
+    mnp = num_person
+    width, height = dimensions[0], dimensions[1]
+    if is_occupancy:
+        frame_mask = np.zeros((mnp, grid_size**2))
+    else:
+        frame_mask = np.zeros((mnp, mnp, grid_size**2))
+    frame_np = frame.data.numpy()
+    width_bound, height_bound = (neighborhood_size/(width*1.0))*2, (neighborhood_size/(height*1.0))*2
+
+    for real_frame_index, other_real_frame_index in itertools.permutations(range(mnp), 2):
+        current_x, current_y = frame_np[real_frame_index, 0], frame_np[real_frame_index, 1]
+        width_low, width_high = current_x - width_bound/2, current_x + width_bound/2
+        height_low, height_high = current_y - height_bound/2, current_y + height_bound/2
+        other_x, other_y = frame_np[other_real_frame_index, 0], frame_np[other_real_frame_index, 1]
+        if (other_x >= width_high) or (other_x < width_low) or (other_y >= height_high) or (other_y < height_low):
+            continue
+        cell_x = int(np.floor(((other_x - width_low)/width_bound) * grid_size))
+        cell_y = int(np.floor(((other_y - height_low)/height_bound) * grid_size))
+        if cell_x >= grid_size or cell_x < 0 or cell_y >= grid_size or cell_y < 0:
+            continue
+        if is_occupancy:
+            frame_mask[real_frame_index, cell_x + cell_y*grid_size] = 1
+        else:
+            frame_mask[real_frame_index, other_real_frame_index, cell_x + cell_y*grid_size] = 1
+    return frame_mask
+
+def getSocialTensor_node_loop(model, grid, hidden_states):
+    """ SocialModel.getSocialTensor as it was before it was batched (one torch.mm per ped) """
+    numNodes = grid.size()[0]
+    social_tensor = torch.zeros(numNodes, model.grid_size*model.grid_size, model.rnn_size)
+    for node in range(numNodes):
+        social_tensor[node] = torch.mm(torch.t(grid[node]), hidden_states)
+    return social_tensor.view(numNodes, model.grid_size*model.grid_size*model.rnn_size)
+
+
+class TestGridMask(unittest.TestCase):
+
+    dimensions = [720, 576]
+
+    def assertSameMasks(self, frame, neighborhood_size, grid_size):
+        for is_occupancy in [False, True]:
+            mask = getGridMask(frame, self.dimensions, len(frame), neighborhood_size, grid_size, is_occupancy)
+            expected_mask = getGridMask_pair_loop(frame, self.dimensions, len(frame), neighborhood_size, grid_size, is_occupancy)
+            self.assertEqual(mask.dtype, expected_mask.dtype)
+            self.assertTrue(np.array_equal(mask, expected_mask))
+
+    def test_grid_mask_matches_pair_loop(self):
+        rng = np.random.RandomState(0)
+        for trial in range(200):
+            num_person = rng.randint(1, 30)
+            positions = rng.randn(num_person, 2) * rng.choice([0.5, 2, 10])
+            neighborhood_size, grid_size = rng.choice([32, 720, 1440]), rng.choice([4, 8])
+            for dtype in [np.float32, np.float64]:
+                self.assertSameMasks(torch.from_numpy(positions.astype(dtype)), neighborhood_size, grid_size)
+
+    def test_grid_mask_matches_pair_loop_on_cell_boundaries(self):
+        rng = np.random.RandomState(1)
+        for neighborhood_size, grid_size in [(720, 4), (1440, 4), (1440, 8)]:
+            # cell sizes in x and y: peds a whole number of cells apart are exactly on cell (or neighborhood) boundaries
+            cell_width = (neighborhood_size/(self.dimensions[0]*1.0))*2 / grid_size
+            cell_height = (neighborhood_size/(self.dimensions[1]*1.0))*2 / grid_size
+            for trial in range(50):
+                num_person = rng.randint(2, 20)
+                positions = rng.randint(-grid_size, grid_size+1, (num_person, 2)) * [cell_width, cell_height]
+                if trial % 2:
+                    positions += rng.uniform(-10, 10, 2)
+                for dtype in [np.float32, np.float64]:
+                    frame = positions.astype(dtype)
+                    self.assertSameMasks(torch.from_numpy(frame), neighborhood_size, grid_size)
+                    # one ulp off the boundaries: which cell they fall in depends on the precision of the arithmetic
+                    frame = np.nextafter(frame, frame + rng.choice([-1, 0, 1], frame.shape).astype(dtype))
+                    self.assertSameMasks(torch.from_numpy(frame), neighborhood_size, grid_size)
+
+
+class TestSocialTensor(unittest.TestCase):
+
+    def test_social_tensor_matches_node_loop(self):
+        args = types.SimpleNamespace(rnn_size=32, grid_size=4, embedding_size=16, input_size=2, output_size=5, maxNumPeds=30,
+            seq_length=20, gru=False, dropout=0.0, use_cuda=False, neighborhood_size=1440)
+        torch.manual_seed(0)
+        model = SocialModel(args, True)
+        rng = np.random.RandomState(2)
+        for trial in range(50):
+            num_person = rng.randint(1, 25)
+            frame = torch.from_numpy(rng.randn(num_person, 2).astype(np.float32) * 2)
+            grid = torch.from_numpy(getGridMask(frame, [720, 576], num_person, 1440, 4)).float()
+            hidden_states = torch.randn(num_person, 32)
+            with torch.no_grad():
+                social_tensor = model.getSocialTensor(grid, hidden_states)
+                expected_social_tensor = getSocialTensor_node_loop(model, grid, hidden_states)
+            self.assertEqual(social_tensor.shape, expected_social_tensor.shape)
+            self.assertTrue(torch.allclose(social_tensor, expected_social_tensor, rtol=1e-6, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
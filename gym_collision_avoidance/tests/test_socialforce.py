@@ -0,0 +1,73 @@
+import os
+import unittest
+import numpy as np
+
+# agents need the settings of an experiment config (e.g., agent_time_out), not just the base Config
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
+from gym_collision_avoidance.envs.policies.SOCIALFORCEPolicy import SOCIALFORCEPolicy
+from gym_collision_avoidance.envs.policies.socialforce import stateutils
+from gym_collision_avoidance.envs.policies.socialforce.potentials import PedPedPotential
+
+
+def grad_r_ab_central_difference(V, state, delta):
+    r_ab = V.r_ab(state)
+    speeds = stateutils.speeds(state)
+    desired_directions = stateutils.desired_directions(state)
+    grad = []
+    for d in (np.array([delta, 0.0]), np.array([0.0, delta])):
+        grad.append((V.value_r_ab(r_ab + d, speeds, desired_directions) - V.value_r_ab(r_ab - d, speeds, desired_directions)) / (2*delta))
+    grad = np.stack(grad, axis=-1)
+    grad[np.arange(len(state)), np.arange(len(state))] = 0.0
+    return grad
+
+def random_state(rng, n):
+    # x, y, v_x, v_y, goal_x, goal_y, tau (as in socialforce.Simulator)
+    return np.concatenate([rng.uniform(-3, 3, (n, 2)), rng.uniform(-1.3, 1.3, (n, 2)), rng.uniform(-10, 10, (n, 2)), np.full((n, 1), 0.5)], axis=1)
+
+def make_agents(rng, n):
+    starts = rng.uniform(-4, 4, (n, 2))
+    goals = rng.uniform(-4, 4, (n, 2))
+    return [ Agent(start[0], start[1], goal[0], goal[1], 0.2, 1.0, rng.uniform(-np.pi, np.pi), SOCIALFORCEPolicy, UnicycleDynamics, [], i)
+        for i, (start, goal) in enumerate(zip(starts, goals)) ]
+
+
+class TestSocialForce(unittest.TestCase):
+
+    def test_grad_r_ab_matches_central_difference(self):
+        rng = np.random.RandomState(0)
+        for delta_t in [0.1, 0.4]:
+            V = PedPedPotential(delta_t)
+            for _ in range(200):
+                state = random_state(rng, rng.randint(2, 20))
+                grad = V.grad_r_ab(state)
+                expected_grad = grad_r_ab_central_difference(V, state, 1e-6)
+                self.assertTrue(np.allclose(grad, expected_grad, rtol=1e-5, atol=1e-6))
+
+    def test_find_next_actions_matches_find_next_action(self):
+        rng = np.random.RandomState(1)
+        for trial in range(5):
+            seed = rng.randint(1000)
+            # the same agents twice: one set steps with per-agent find_next_action, the other with the batched find_next_actions
+            agents = make_agents(np.random.RandomState(seed), 8)
+            batched_agents = make_agents(np.random.RandomState(seed), 8)
+            active_agent_mask = [True]*8
+            active_agent_mask[trial % 8] = False
+            agent_indices = [i for i in range(8) if active_agent_mask[i]]
+            for step in range(6):
+                if step == 3:
+                    # a new (not yet initialized) policy mid-episode, as after a respawn
+                    agents[agent_indices[0]].policy = SOCIALFORCEPolicy()
+                    batched_agents[agent_indices[0]].policy = SOCIALFORCEPolicy()
+                actions = np.array([ agents[i].policy.find_next_action(None, agents, i, full_agent_list=agents, active_agent_mask=active_agent_mask)
+                    for i in agent_indices ])
+                batched_actions = batched_agents[agent_indices[0]].policy.find_next_actions(None, batched_agents, agent_indices, active_agent_mask)
+                self.assertTrue(np.array_equal(actions, batched_actions))
+                for i, action, batched_action in zip(agent_indices, actions, batched_actions):
+                    agents[i].take_action(action, 0.1)
+                    batched_agents[i].take_action(batched_action, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+import networkx as nx
+import numpy as np
+import torch
+
+from gym_collision_avoidance.envs.policies.Social_STGCNN import utilsv2
+from gym_collision_avoidance.envs.policies.Social_STGCNN.utilsv2 import anorm, normalized_laplacian, seq_to_graph, trajectories_to_graph, Simulator_TrajectoryDataset
+
+
+def seq_to_graph_loop(seq_, seq_rel, norm_lap_matr=True):
+    """ seq_to_graph as it was before it was vectorized (per pair of peds, networkx Laplacian per timestep), without its
+    squeeze(), which dropped the pedestrian axis of a single pedestrian (networkx 3 renamed from_numpy_matrix to from_numpy_array) """
+    seq_len = seq_.shape[2]
+    max_nodes = seq_.shape[0]
+
+    V = np.zeros((seq_len,max_nodes,2))
+    A = np.zeros((seq_len,max_nodes,max_nodes))
+    for s in range(seq_len):
+        step_ = seq_[:,:,s]
+        step_rel = seq_rel[:,:,s]
+        for h in range(len(step_)):
+            V[s,h,:] = step_rel[h]
+            A[s,h,h] = 1
+            for k in range(h+1,len(step_)):
+                l2_norm = anorm(step_rel[h],step_rel[k])
+                A[s,h,k] = l2_norm
+                A[s,k,h] = l2_norm
+        if norm_lap_matr:
+            G = nx.from_numpy_array(A[s,:,:])
+            A[s,:,:] = nx.normalized_laplacian_matrix(G).toarray()
+
+    return torch.from_numpy(V).type(torch.float),\
+           torch.from_numpy(A).type(torch.float)
+
+def random_positions(rng, num_peds, seq_len):
+    """ (num_peds, 2, seq_len) random walks, some of them on top of each other at some timesteps (zero distance) """
+    positions = rng.uniform(-5, 5, (num_peds, 2, 1)) + np.cumsum(rng.uniform(-0.5, 0.5, (num_peds, 2, seq_len)), axis=2)
+    for _ in range(rng.randint(0, 3)):
+        h, k, s = rng.randint(num_peds), rng.randint(num_peds), rng.randint(seq_len)
+        positions[h, :, s] = positions[k, :, s]
+    return positions
+
+
+class TestSeqToGraph(unittest.TestCase):
+
+    def assertSameGraph(self, graph, expected_graph):
+        V, A = graph
+        expected_V, expected_A = expected_graph
+        self.assertEqual(V.shape, expected_V.shape)
+        self.assertEqual(A.shape, expected_A.shape)
+        self.assertEqual(V.dtype, expected_V.dtype)
+        self.assertEqual(A.dtype, expected_A.dtype)
+        self.assertTrue(torch.equal(V, expected_V))
+        self.assertTrue(torch.allclose(A, expected_A, rtol=1e-6, atol=1e-6), "max difference {}".format((A - expected_A).abs().max()))
+
+    def test_seq_to_graph_matches_loop(self):
+        rng = np.random.RandomState(0)
+        for trial in range(100):
+            num_peds, seq_len = rng.randint(1, 12), rng.randint(1, 10)
+            seq_rel = random_positions(rng, num_peds, seq_len)
+            if trial % 3 == 0:
+                # every ped at the same (relative) position: no edges but the self loops
+                seq_rel[:, :, rng.randint(seq_len)] = 0
+            seq_ = torch.from_numpy(seq_rel + rng.uniform(-5, 5, seq_rel.shape)).type(torch.float)
+            seq_rel = torch.from_numpy(seq_rel).type(torch.float)
+            for norm_lap_matr in [True, False]:
+                self.assertSameGraph(seq_to_graph(seq_, seq_rel, norm_lap_matr), seq_to_graph_loop(seq_, seq_rel, norm_lap_matr))
+
+    def test_normalized_laplacian_matches_networkx(self):
+        rng = np.random.RandomState(1)
+        for trial in range(50):
+            num_nodes = rng.randint(1, 10)
+            A = rng.uniform(0, 3, (3, num_nodes, num_nodes)) * (rng.rand(3, num_nodes, num_nodes) < 0.6)
+            A = (A + np.transpose(A, (0, 2, 1)))/2
+            A[0] = 0 # no edges at all: zero degree
+            expected_laplacian = np.stack([nx.normalized_laplacian_matrix(nx.from_numpy_array(A[s])).toarray() for s in range(len(A))])
+            self.assertTrue(np.allclose(normalized_laplacian(A), expected_laplacian, rtol=1e-12, atol=1e-12))
+
+    def test_trajectories_to_graph_matches_dataset(self):
+        # trajectories_to_graph replaced building a Simulator_TrajectoryDataset from the observations every step
+        # (the dataset needs more than one pedestrian, and the policy doesn't predict a scene of one)
+        rng = np.random.RandomState(2)
+        obs_len = 8
+        for trial in range(30):
+            num_peds = rng.randint(2, 10)
+            positions = random_positions(rng, num_peds, obs_len)
+            data = np.array([[time_ind, agent_ind, positions[agent_ind, 0, time_ind], positions[agent_ind, 1, time_ind]]
+                for time_ind in range(obs_len) for agent_ind in range(num_peds)])
+            with mock.patch.object(utilsv2, 'seq_to_graph', seq_to_graph_loop):
+                expected = Simulator_TrajectoryDataset(data, obs_len=obs_len, skip=1, norm_lap_matr=True)[0]
+            expected_obs_traj, expected_obs_traj_rel, expected_V_obs, expected_A_obs = expected[0], expected[2], expected[6], expected[7]
+
+            obs_traj, obs_traj_rel, V_obs, A_obs = trajectories_to_graph(positions, norm_lap_matr=True)
+            self.assertTrue(torch.equal(obs_traj, expected_obs_traj))
+            self.assertTrue(torch.equal(obs_traj_rel, expected_obs_traj_rel))
+            self.assertSameGraph((V_obs, A_obs), (expected_V_obs, expected_A_obs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import unittest
+import numpy as np
+
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs.policies.TrajectoryHistory import TrajectoryHistory
+
+
+class ListTrajectoryHistory(object):
+    """ The position lists the history-based policies (STGCNN, CVM, SLSTM, SOCIALGAN) kept before TrajectoryHistory:
+    appended every timestep, NaN-padded at the front for agents that joined later, then sliced """
+    def __init__(self):
+        self.agent_pos_x = []
+        self.agent_pos_y = []
+
+    def record(self, agents):
+        while len(self.agent_pos_x) < len(agents):
+            self.agent_pos_x.append(None)
+            self.agent_pos_y.append(None)
+        for i in range(len(agents)):
+            if self.agent_pos_x[i] is None:
+                self.agent_pos_x[i] = [agents[i].pos_global_frame[0]]
+                self.agent_pos_y[i] = [agents[i].pos_global_frame[1]]
+            else:
+                self.agent_pos_x[i] += [agents[i].pos_global_frame[0]]
+                self.agent_pos_y[i] += [agents[i].pos_global_frame[1]]
+
+    def get_recent(self, active_agent_mask, num_obs, stride):
+        for i in range(len(self.agent_pos_x)):
+            length_diff = len(max(self.agent_pos_x, key=len)) - len(self.agent_pos_x[i])
+            for add in range(length_diff):
+                self.agent_pos_x[i].insert(0, np.nan)
+                self.agent_pos_y[i].insert(0, np.nan)
+        observation_x_input = np.array(self.agent_pos_x)[active_agent_mask][:,::-stride][:,::-1][:,-num_obs:]
+        observation_y_input = np.array(self.agent_pos_y)[active_agent_mask][:,::-stride][:,::-1][:,-num_obs:]
+        return observation_x_input, observation_y_input
+
+class Position(object):
+    """ What TrajectoryHistory records of an agent """
+    def __init__(self, rng):
+        self.pos_global_frame = rng.uniform(-10, 10, 2)
+
+
+class TestTrajectoryHistory(unittest.TestCase):
+
+    def assertSameRecent(self, history, list_history, active_agent_mask, num_obs, stride):
+        recent = history.get_recent(np.flatnonzero(active_agent_mask), num_obs, stride)
+        expected_x, expected_y = list_history.get_recent(active_agent_mask, num_obs, stride)
+        self.assertEqual(recent.shape, (np.count_nonzero(active_agent_mask), num_obs, 2))
+        # the lists had fewer than num_obs columns until enough timesteps were recorded, the ring buffer pads them with NaN
+        num_recorded = expected_x.shape[1]
+        np.testing.assert_array_equal(recent[:, num_obs-num_recorded:, 0], expected_x)
+        np.testing.assert_array_equal(recent[:, num_obs-num_recorded:, 1], expected_y)
+        self.assertTrue(np.isnan(recent[:, :num_obs-num_recorded]).all())
+
+    def test_get_recent_matches_lists(self):
+        rng = np.random.RandomState(0)
+        history = TrajectoryHistory(32)
+        for episode in range(3):
+            # a new episode forgets every position (the lists started over with the new policies)
+            history.reset()
+            list_history = ListTrajectoryHistory()
+            agents = [Position(rng) for _ in range(rng.randint(1, 4))]
+            for step in range(100):
+                # agents join mid-episode (e.g., respawn) as new rows: NaN before their first position
+                if step in [10, 45, 46]:
+                    agents.append(Position(rng))
+                for agent in agents:
+                    agent.pos_global_frame = agent.pos_global_frame + rng.uniform(-0.1, 0.1, 2)
+                history.record(agents)
+                list_history.record(agents)
+                active_agent_mask = rng.rand(len(agents)) < 0.8
+                # the positions wrap around the 32 timesteps of the ring buffer after step 31
+                for num_obs, stride in [(8, 4), (8, 1), (1, 1), (3, 15), (32, 1)]:
+                    self.assertSameRecent(history, list_history, active_agent_mask, num_obs, stride)
+
+    def test_agent_replaced(self):
+        # an agent object taking over a row (in place, or after the list shrank) doesn't inherit the positions of the one that was there
+        rng = np.random.RandomState(1)
+        history = TrajectoryHistory(32)
+        agents = [Position(rng) for _ in range(4)]
+        for step in range(40):
+            if step == 30:
+                agents[1] = Position(rng)
+            if step == 31:
+                agents = agents[:2]
+            if step == 34:
+                agents += [Position(rng), Position(rng)]
+            history.record(agents)
+        recent = history.get_recent([0, 1, 2, 3], 8, 4)
+        self.assertFalse(np.isnan(recent[0]).any())
+        self.assertTrue(np.isnan(recent[1, :-3]).all())
+        self.assertTrue(np.isnan(recent[2:, :-2]).all())
+        for row, agent in enumerate(agents):
+            np.testing.assert_array_equal(recent[row, -1], agent.pos_global_frame)
+
+    def test_window_too_short(self):
+        history = TrajectoryHistory(32)
+        history.record([Position(np.random.RandomState(2))])
+        with self.assertRaises(AssertionError):
+            history.get_recent([0], 9, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import imageio
+from PIL import Image
+
+# agents need the settings of an experiment config (e.g., agent_time_out), not just the base Config
+os.environ.setdefault('GYM_CONFIG_CLASS', 'Example')
+from gym_collision_avoidance.envs import Config
+from gym_collision_avoidance.envs import visualize
+from gym_collision_avoidance.envs.agent import Agent
+from gym_collision_avoidance.envs.policies.NonCooperativePolicy import NonCooperativePolicy
+from gym_collision_avoidance.envs.dynamics.UnicycleDynamics import UnicycleDynamics
+from gym_collision_avoidance.envs.sensors.OtherAgentsStatesSensor import OtherAgentsStatesSensor
+from gym_collision_avoidance.envs.collision_avoidance_env import CollisionAvoidanceEnv
+
+
+def head_on_agents():
+    """ Two agents that collide head-on (in the first ~10 steps), and one that doesn't """
+    specs = [((0, 0), (4, 0)), ((4, 0), (0, 0)), ((0, 3), (4, 3))]
+    return [ Agent(start[0], start[1], goal[0], goal[1], 0.2, 1.0, np.arctan2(goal[1]-start[1], goal[0]-start[0]),
+                   NonCooperativePolicy, UnicycleDynamics, [OtherAgentsStatesSensor], i)
+             for i, (start, goal) in enumerate(specs) ]
+
+
+class TestEpisodeAnimator(unittest.TestCase):
+
+    def setUp(self):
+        self.plot_save_dir = tempfile.mkdtemp() + '/'
+        self.saved_config = (Config.ANIMATE_EPISODES, Config.ANIMATION_RENDERER, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS)
+        Config.ANIMATE_EPISODES, Config.ANIMATION_RENDERER, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS = True, "incremental", False, False
+
+    def tearDown(self):
+        Config.ANIMATE_EPISODES, Config.ANIMATION_RENDERER, Config.SAVE_EPISODE_PLOTS, Config.SHOW_EPISODE_PLOTS = self.saved_config
+
+    def run_episode(self, num_steps):
+        env = CollisionAvoidanceEnv()
+        env.set_plot_save_dir(self.plot_save_dir)
+        env.set_agents(head_on_agents())
+        env.reset()
+        expected_num_frames = 0
+        for _ in range(num_steps):
+            env.step({})
+            any_collision = any(agent.in_collision for agent in env.active_agents)
+            if env.episode_step_number % env.animation_period_steps == 0 or any_collision:
+                expected_num_frames += 1
+        return env, expected_num_frames
+
+    def test_streamed_episode(self):
+        self.assertEqual(visualize.matplotlib.get_backend().lower(), 'agg')
+        env, expected_num_frames = self.run_episode(15)
+        animator = env.episode_animator
+        self.assertGreater(len(os.listdir(self.plot_save_dir+"collisions/")), 0) # the episode had collision frames
+        self.assertEqual(animator.num_frames, expected_num_frames)
+        animation_filename = animator.animation_filename
+        env.reset() # closes the gif/mp4
+
+        self.assertTrue(os.path.isfile(animation_filename))
+        self.assertTrue(os.path.isfile(animation_filename[:-4]+".mp4"))
+        num_frames = expected_num_frames + animator.final_frame_repeats
+        with imageio.get_reader(animation_filename[:-4]+".mp4") as reader:
+            self.assertEqual(reader.count_frames(), num_frames)
+        # the gif writer merges identical consecutive frames (e.g., the repeated final frame) into longer ones
+        with Image.open(animation_filename) as gif:
+            durations = []
+            for frame_index in range(gif.n_frames):
+                gif.seek(frame_index)
+                durations.append(gif.info['duration'])
+            self.assertEqual(gif.size, (Config.PLT_FIG_SIZE[0]*animator.dpi, Config.PLT_FIG_SIZE[1]*animator.dpi))
+        self.assertAlmostEqual(sum(durations), num_frames * 1000. / animator.fps, delta=gif.n_frames)
+
+    def test_writer_error_raised_by_finish(self):
+        with mock.patch.object(visualize.imageio, 'get_writer', side_effect=OSError("disk full")):
+            env, _ = self.run_episode(15) # frames keep coming after the writer failed
+            with self.assertRaises(RuntimeError) as context:
+                env.episode_animator.finish()
+        self.assertIsInstance(context.exception.__cause__, OSError)
+        # the next episode streams normally
+        env.set_agents(head_on_agents())
+        env.reset()
+        for _ in range(4):
+            env.step({})
+        self.assertTrue(os.path.isfile(env.episode_animator.finish()))
+
+
+if __name__ == '__main__':
+    unittest.main()